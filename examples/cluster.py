@@ -308,6 +308,8 @@ class RemoteOVSSwitch( RemoteMixin, OVSSwitch ):
     "Remote instance of Open vSwitch"
 
     OVSVersions = {}
+    # Our ovsdb-server is on the remote server, not the local one
+    useOvsdb = False
 
     def __init__( self, *args, **kwargs ):
         # No batch startup yet
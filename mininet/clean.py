@@ -15,19 +15,21 @@
 	from builtins import str
 except ImportError:
 	pass
-from subprocess import ( Popen, PIPE, check_output as co,
-                         CalledProcessError )
-from subprocess import call
-import time
+from subprocess import Popen, PIPE
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, sleep
 import os
-import iptc
+import re
+import signal
+import socket
+import struct
 import ipaddress
 import shlex
 
-from mininet.log import info
+from mininet.log import info, warn
 from mininet.term import cleanUpScreens
-from mininet.util import decode
-from mininet.net import SAP_PREFIX
+from mininet.util import decode, deleteIntfs
+from mininet.ovsdb import OVSDB, OVSDBError, defaultSocket, ovsSet
 
 def sh( cmd ):
     "Print a command and send it to the shell"
@@ -35,60 +37,208 @@ def sh( cmd ):
     result = Popen( [ '/bin/sh', '-c', cmd ], stdout=PIPE ).communicate()[ 0 ]
     return decode( result )
 
-def killprocs( pattern ):
-    "Reliably terminate processes matching a pattern (including args)"
-    sh( 'pkill -9 -f %s' % pattern )
-    # Make sure they are gone
-    while True:
+def procs():
+    "Return list of ( pid, name, command line ) of other processes"
+    result = []
+    for entry in os.listdir( '/proc' ):
+        if not entry.isdigit() or int( entry ) == os.getpid():
+            continue
         try:
-            pids = co( [ 'pgrep', '-f', pattern ] )
-        except CalledProcessError:
-            pids = ''
-        if pids:
-            sh( 'pkill -9 -f %s' % pattern )
-            time.sleep( .5 )
-        else:
-            break
+            with open( '/proc/%s/comm' % entry ) as f:
+                name = f.read().strip()
+            with open( '/proc/%s/cmdline' % entry, 'rb' ) as f:
+                args = decode( f.read() ).split( '\0' )
+        except ( OSError, UnicodeDecodeError ):
+            # Gone already
+            continue
+        result.append( ( int( entry ), name, ' '.join( args ).strip() ) )
+    return result
+
+def running( pid ):
+    "Is process pid still running (and not a zombie)?"
+    try:
+        with open( '/proc/%d/stat' % pid ) as f:
+            stat = f.read()
+    except OSError:
+        return False
+    return stat.rsplit( ')', 1 )[ 1 ].split()[ 0 ] != 'Z'
+
+def killWait( pids, sig=signal.SIGKILL, timeout=1 ):
+    """Send a signal to processes and wait until they exit
+       pids: process ids
+       sig: signal to send (SIGKILL)
+       timeout: seconds to wait at most (1)
+       returns: pids that are still running"""
+    for pid in pids:
+        try:
+            os.kill( pid, sig )
+        except ProcessLookupError:
+            pass
+    deadline = monotonic() + timeout
+    while True:
+        pids = [ pid for pid in pids if running( pid ) ]
+        if not pids or monotonic() >= deadline:
+            return pids
+        sleep( .01 )
+
+def killprocs( pattern, timeout=5 ):
+    """Reliably terminate processes matching a pattern (including args)
+       timeout: seconds to keep trying at most (5)"""
+    regex = re.compile( pattern )
+    deadline = monotonic() + timeout
+    while True:
+        # Look again, in case they started more processes
+        pids = [ pid for pid, _name, args in procs()
+                 if regex.search( args ) ]
+        if not pids:
+            return
+        info( 'kill -9 %s # %s\n' % ( ' '.join( map( str, pids ) ),
+                                       pattern ) )
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            warn( '*** Could not kill %s\n' % pids )
+            return
+        killWait( pids, signal.SIGKILL, remaining )
+
+def intfNames():
+    "Return names of interfaces in our namespace, using rtnetlink"
+    RTM_GETLINK, NLMSG_DONE, NLMSG_ERROR = 18, 3, 2
+    NLM_F_REQUEST, NLM_F_DUMP = 1, 0x300
+    IFLA_IFNAME = 3
+    names = []
+    sock = socket.socket( socket.AF_NETLINK, socket.SOCK_RAW,
+                          socket.NETLINK_ROUTE )
+    with sock:
+        # struct nlmsghdr + struct ifinfomsg
+        sock.send( struct.pack( '=IHHII', 32, RTM_GETLINK,
+                                NLM_F_REQUEST | NLM_F_DUMP, 1, 0 ) +
+                   struct.pack( '=BxHiII', socket.AF_UNSPEC, 0, 0, 0, 0 ) )
+        while True:
+            data = sock.recv( 1 << 16 )
+            offset = 0
+            while offset < len( data ):
+                length, msgType = struct.unpack_from( '=IH', data, offset )
+                if msgType == NLMSG_DONE:
+                    return names
+                if msgType == NLMSG_ERROR:
+                    errno = -struct.unpack_from( '=i', data, offset + 16 )[ 0 ]
+                    raise OSError( errno, os.strerror( errno ) )
+                # Attributes follow the headers
+                pos, end = offset + 32, offset + length
+                while pos + 4 <= end:
+                    attrLen, attrType = struct.unpack_from( '=HH', data, pos )
+                    if attrLen < 4:
+                        break
+                    if attrType == IFLA_IFNAME:
+                        names.append( decode(
+                            data[ pos + 4: pos + attrLen ].rstrip( b'\0' ) ) )
+                        break
+                    pos += ( attrLen + 3 ) & ~3
+                offset += ( length + 3 ) & ~3
 
 class Cleanup( object ):
     "Wrapper for cleanup()"
 
     callbacks = []
 
+    # Processes that we ask to shut down cleanly before killing them
+    zombies = ( 'controller', 'ofprotocol', 'ofdatapath', 'ping',
+                'nox_core', 'lt-nox_core', 'ovs-openflowd', 'ovs-controller',
+                'ovs-testcontroller', 'udpbwtest', 'mnexec', 'ivs',
+                'ryu-manager' )
+
+    # Processes that we kill right away: node shells, tunnels
+    stale = ( 'sudo mnexec', 'mininet:', 'Tunnel=Ethernet', r'\.ssh/mn' )
+
+    # Interfaces that we remove
+    intfPattern = re.compile( r'([-_.a-zA-Z0-9]+-eth[0-9]+|tap9)$' )
+
     @classmethod
     def cleanup( cls):
         """Clean up junk which might be left over from old runs;
-           do fast stuff before slow dp and link removal!"""
+           kill processes first, so that their namespaces go away,
+           then remove datapaths, links, containers and NAT rules
+           in parallel"""
+        start = monotonic()
+        cls.cleanProcs()
+
+        info( "*** Removing junk from /tmp\n" )
+        sh( 'rm -f /tmp/vconn* /tmp/vlogs* /tmp/*.out /tmp/*.log '
+            '~/.ssh/mn/*' )
+
+        info( "*** Removing old X11 tunnels\n" )
+        cleanUpScreens()
+
+        # These don't depend on each other
+        phases = ( cls.cleanDatapaths, cls.cleanLinks, cls.cleanDocker,
+                   cls.cleanSapRules )
+        with ThreadPoolExecutor( len( phases ) ) as pool:
+            for future in [ pool.submit( phase ) for phase in phases ]:
+                future.result()
 
+        # Call any additional cleanup code if necessary
+        for callback in cls.callbacks:
+            callback()
+
+        info( "*** Cleanup complete (%.2fs).\n" % ( monotonic() - start ) )
+
+    @classmethod
+    def cleanProcs( cls, timeout=1 ):
+        """Kill stale Mininet processes
+           timeout: seconds to wait for zombies to shut down (1)"""
         info( "*** Removing excess controllers/ofprotocols/ofdatapaths/"
               "pings/noxes\n" )
-        zombies = ( 'controller ofprotocol ofdatapath ping nox_core'
-                    'lt-nox_core ovs-openflowd ovs-controller'
-                    'ovs-testcontroller udpbwtest mnexec ivs ryu-manager' )
+        # Process names are truncated to 15 characters
+        names = set( name[ :15 ] for name in cls.zombies )
+        pids = [ pid for pid, name, _args in procs() if name in names ]
         # Note: real zombie processes can't actually be killed, since they
         # are already (un)dead. Then again,
         # you can't connect to them either, so they're mostly harmless.
-        # Send SIGTERM first to give processes a chance to shutdown cleanly.
-        sh( 'killall ' + zombies + ' 2> /dev/null' )
-        time.sleep( 1 )
-        sh( 'killall -9 ' + zombies + ' 2> /dev/null' )
-
-        # And kill off sudo mnexec
-        sh( 'pkill -9 -f "sudo mnexec"')
-
-        info( "*** Removing junk from /tmp\n" )
-        sh( 'rm -f /tmp/vconn* /tmp/vlogs* /tmp/*.out /tmp/*.log' )
-
-        info( "*** Removing old X11 tunnels\n" )
-        cleanUpScreens()
+        # Send SIGTERM first to give processes a chance to shutdown cleanly,
+        # but don't wait longer than they need.
+        if pids:
+            info( 'kill %s\n' % ' '.join( map( str, pids ) ) )
+            pids = killWait( pids, signal.SIGTERM, timeout )
+        if pids:
+            info( 'kill -9 %s\n' % ' '.join( map( str, pids ) ) )
+            killWait( pids, signal.SIGKILL, timeout )
+        info( "*** Killing stale mininet node processes and tunnels\n" )
+        killprocs( '|'.join( cls.stale ) )
 
-        info( "*** Removing excess kernel datapaths\n" )
-        dps = sh( "ps ax | egrep -o 'dp[0-9]+' | sed 's/dp/nl:/'"
-                  ).splitlines()
+    @staticmethod
+    def cleanDatapaths():
+        "Remove kernel and OVS datapaths"
+        dps = set( re.findall( r'dp[0-9]+', ' '.join(
+            args for _pid, _name, args in procs() ) ) )
+        if dps:
+            info( "*** Removing excess kernel datapaths\n" )
         for dp in dps:
-            if dp:
-                sh( 'dpctl deldp ' + dp )
+            sh( 'dpctl deldp nl:' + dp[ 2: ] )
         info( "***  Removing OVS datapaths\n" )
+        if not os.path.exists( defaultSocket() ):
+            # ovsdb-server isn't running
+            return
+        try:
+            db = OVSDB( timeout=1 )
+            try:
+                db.monitor( { 'Open_vSwitch': [ 'cur_cfg' ],
+                              'Bridge': [ 'name' ] } )
+                bridges = db.tables[ 'Bridge' ]
+                if bridges:
+                    info( 'del-br %s\n' % ' '.join(
+                        sorted( row[ 'name' ] for row in bridges.values() ) ) )
+                    # Ports and interfaces are garbage collected
+                    db.transact( { 'op': 'mutate', 'table': 'Open_vSwitch',
+                                   'where': [], 'mutations': [
+                                       [ 'bridges', 'delete', ovsSet(
+                                           [ [ 'uuid', uuid ]
+                                             for uuid in bridges ] ) ] ] },
+                                 wait=True )
+            finally:
+                db.close()
+            return
+        except ( OSError, OVSDBError ) as e:
+            info( '*** OVSDB: %s, trying ovs-vsctl\n' % e )
         dps = sh("ovs-vsctl --timeout=1 list-br").strip().splitlines()
         if dps:
             sh( "ovs-vsctl " + " -- ".join( "--if-exists del-br " + dp
@@ -98,41 +248,49 @@ def cleanup( cls):
         for dp in dps:
             sh( 'ovs-vsctl del-br ' + dp )
 
+    @classmethod
+    def cleanLinks( cls ):
+        "Remove all links of the pattern foo-ethX"
         info( "*** Removing all links of the pattern foo-ethX\n" )
-        links = sh( "ip link show | "
-                    "egrep -o '([-_.[:alnum:]]+-eth[[:digit:]]+)'"
-                    ).splitlines()
-        # Delete blocks of links
-        n = 1000  # chunk size
-        for i in range( 0, len( links ), n ):
-            cmd = ';'.join( 'ip link del %s' % link
-                             for link in links[ i : i + n ] )
-            sh( '( %s ) 2> /dev/null' % cmd )
-
-        if 'tap9' in sh( 'ip link show' ):
-            info( "*** Removing tap9 - assuming it's from cluster edition\n" )
-            sh( 'ip link del tap9' )
-
-        info( "*** Killing stale mininet node processes\n" )
-        killprocs( 'mininet:' )
-
-        info( "*** Shutting down stale tunnels\n" )
-        killprocs( 'Tunnel=Ethernet' )
-        killprocs( '.ssh/mn')
-        sh( 'rm -f ~/.ssh/mn/*' )
+        links = [ name for name in intfNames()
+                  if cls.intfPattern.match( name ) ]
+        if links:
+            info( 'ip link del %s\n' % ' '.join( links ) )
+            deleteIntfs( links )
 
-        # Call any additional cleanup code if necessary
-        for callback in cls.callbacks:
-            callback()
+    @staticmethod
+    def cleanDocker( threads=16 ):
+        "Containernet should also cleanup pending Docker containers"
+        info( "*** Removing Containernet containers\n" )
+        # Imported here, as docker is slow to import
+        import docker
+        try:
+            client = docker.from_env()
+            containers = client.containers.list(
+                all=True, filters={ 'label': 'com.containernet' } )
+        except ( docker.errors.DockerException, OSError ):
+            # No docker daemon
+            return
 
-        # Containernet should also cleanup pending Docker
-        cmd =  "docker rm -f $( docker ps --filter 'label=com.containernet' -a -q)"
-        call(cmd, shell=True, stdout=open(os.devnull, 'wb'),  stderr=open(os.devnull, 'wb'))
+        def remove( container ):
+            "Remove one container"
+            info( 'docker rm -f %s\n' % container.name )
+            try:
+                container.remove( force=True )
+            except docker.errors.APIError:
+                pass
 
-        # cleanup any remaining iptables rules from external SAPs with NAT
+        with ThreadPoolExecutor( threads ) as pool:
+            list( pool.map( remove, containers ) )
+
+    @staticmethod
+    def cleanSapRules():
+        "Remove any remaining iptables rules from external SAPs with NAT"
         # we use iptc module to iterate through the loops, but due to a bug, we cannot use iptc to delete the rules
         # we rely on iptables CLI to delete the found rules
         info("***  Removing SAP NAT rules\n")
+        import iptc
+        from mininet.net import SAP_PREFIX
         table = iptc.Table(iptc.Table.NAT)
         chain = iptc.Chain(table, 'POSTROUTING')
 
@@ -164,8 +322,6 @@ def cleanup( cls):
                 info("delete FORWARD rule from SAP: {1} - {0} - {2}\n".format(rule.out_interface, rule.in_interface,
                                                                               src_CIDR))
 
-        info( "*** Cleanup complete.\n" )
-
     @classmethod
     def addCleanupCallback( cls, callback ):
         "Add cleanup callback"
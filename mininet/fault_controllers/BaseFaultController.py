@@ -7,8 +7,6 @@
 from ast import literal_eval
 from multiprocessing import Pipe, Process
 
-import yaml
-
 from mininet import log
 from mininet.faultlogger import FaultLogger
 from mininet.node import Node
@@ -118,6 +116,8 @@ def _get_base_config_dict(self, filepath_to_config_file):
         if filepath_to_config_file is None:
             log.error("Filepath to config file is missing\n")
             return None
+        # Only load yaml when there is a config file to read
+        import yaml
         with open(filepath_to_config_file, 'r') as file:
             config = yaml.safe_load(file)
         return config
@@ -136,9 +136,7 @@ def get_controller_log_dict(self, net: 'Mininet', yml_config: dict) -> dict:
             # This means that the log: key exists, but without any values -
             # So yes to logging, but all defaults
             return {}
-        commands = log_config.get("commands", None)
-        if commands is None:
-            return log_config
+        commands = log_config.get("commands", None) or []
         for i, debug_command in enumerate(commands):
 
             tag = debug_command.get('tag', None)
@@ -149,6 +147,14 @@ def get_controller_log_dict(self, net: 'Mininet', yml_config: dict) -> dict:
             host_string = debug_command.get("host", None)
             node_identifying_tuple = self._get_mininet_agnostic_identifiers_from_identifier_string(net, host_string)
             log_config['commands'][i]['host'] = node_identifying_tuple[0]
+
+        metrics = log_config.get("metrics", None) or []
+        for i, metric in enumerate(metrics):
+            # Collectors need the pid to find the node, and the name to label the metrics
+            host_string = metric.get("host", None)
+            node_identifying_tuple = self._get_mininet_agnostic_identifiers_from_identifier_string(net, host_string)
+            log_config['metrics'][i]['node'] = host_string
+            log_config['metrics'][i]['host'] = node_identifying_tuple[0]
         return log_config
 
 
@@ -360,8 +366,18 @@ def _config_logger(self, config):
             interval = None
         path = log_config.get("path", None)
         commands = log_config.get('commands', [])
-
-        fault_logger = FaultLogger(interval=interval, log_filepath=path, commands=commands)
+        command_timeout = log_config.get('command_timeout', None)
+        tick_deadline = log_config.get('tick_deadline', None)
+        log_format = log_config.get('format', None)
+        metrics = log_config.get('metrics', None)
+        mode = log_config.get('mode', None)
+        events_path = log_config.get('events_path', None)
+        keyframe_interval = log_config.get('keyframe_interval', None)
+
+        fault_logger = FaultLogger(interval=interval, log_filepath=path, commands=commands,
+                                   command_timeout=command_timeout, tick_deadline=tick_deadline,
+                                   log_format=log_format, metrics=metrics, mode=mode,
+                                   events_filepath=events_path, keyframe_interval=keyframe_interval)
         self.fault_logger = fault_logger
 
     def _configByFile(self, config):
@@ -0,0 +1,302 @@
+"""In-process metric collectors for the FaultLogger.
+
+Collectors read system state directly from the kernel, via /proc, /sys and netlink, instead of spawning commands.
+Each collector belongs to one node, identified by the pid of its shell, and returns a flat dict of numeric values
+on every collect() call. Keys have the form 'node:metric_type:object:field', e.g. 'h1:interfaces:h1-eth0:rx_bytes'.
+
+Supported metric types:
+- interfaces: counters of all interfaces in the node's network namespace, from /proc/<pid>/net/dev
+- qdiscs: statistics of all qdiscs in the node's network namespace (bytes, packets, qlen, backlog, drops, requeues,
+  overlimits), via a netlink socket that is opened inside the namespace once
+- cgroup: cpu and memory usage of the node's cgroup, for both cgroup v1 and v2
+- sockets: socket summary of the node's network namespace, from /proc/<pid>/net/sockstat and sockstat6
+"""
+import ctypes
+import os
+import socket
+import struct
+import threading
+
+from mininet import log
+
+CLONE_NEWNET = 0x40000000
+
+NETLINK_ROUTE = 0
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWLINK = 16
+RTM_GETLINK = 18
+RTM_NEWQDISC = 36
+RTM_GETQDISC = 38
+IFLA_IFNAME = 3
+TCA_STATS2 = 7
+TCA_STATS_BASIC = 1
+TCA_STATS_QUEUE = 3
+
+_NLMSGHDR = struct.Struct('=IHHII')
+_RTATTR = struct.Struct('=HH')
+_IFINFOMSG = struct.Struct('=BxHiII')
+_TCMSG = struct.Struct('=BxxxiIII')
+_GNET_STATS_BASIC = struct.Struct('=QI')
+_GNET_STATS_QUEUE = struct.Struct('=IIIII')
+
+_NET_DEV_FIELDS = ['rx_bytes', 'rx_packets', 'rx_errs', 'rx_drop', 'rx_fifo', 'rx_frame', 'rx_compressed',
+                   'rx_multicast', 'tx_bytes', 'tx_packets', 'tx_errs', 'tx_drop', 'tx_fifo', 'tx_colls',
+                   'tx_carrier', 'tx_compressed']
+
+
+def _proc_path(pid):
+    """Returns the /proc directory of the node, or of ourselves for nodes in the root namespace"""
+    return '/proc/self' if pid is None else f'/proc/{pid}'
+
+
+class MetricCollector(object):
+    """Base class for collectors. Subclasses implement collect()"""
+    metric_type = None
+
+    def __init__(self, node_name, pid):
+        self.node_name = node_name if node_name is not None else 'root'
+        self.pid = pid
+
+    def key(self, obj, field):
+        return f"{self.node_name}:{self.metric_type}:{obj}:{field}"
+
+    def collect(self):
+        """Returns a dict of metric keys to numbers"""
+        raise NotImplementedError
+
+    def close(self):
+        return
+
+
+class InterfaceCollector(MetricCollector):
+    metric_type = 'interfaces'
+
+    def collect(self):
+        metrics = {}
+        with open(_proc_path(self.pid) + '/net/dev') as net_dev:
+            lines = net_dev.readlines()[2:]  # Two header lines
+        for line in lines:
+            interface_name, counters = line.split(':', 1)
+            interface_name = interface_name.strip()
+            for field, value in zip(_NET_DEV_FIELDS, counters.split()):
+                metrics[self.key(interface_name, field)] = int(value)
+        return metrics
+
+
+class SocketCollector(MetricCollector):
+    metric_type = 'sockets'
+
+    def collect(self):
+        metrics = {}
+        for filename in ['sockstat', 'sockstat6']:
+            try:
+                with open(_proc_path(self.pid) + '/net/' + filename) as sockstat:
+                    lines = sockstat.readlines()
+            except FileNotFoundError:
+                continue  # No IPv6 support
+            for line in lines:
+                # e.g. "TCP: inuse 5 orphan 0 tw 0 alloc 7 mem 1"
+                protocol, values = line.split(':', 1)
+                values = values.split()
+                for field, value in zip(values[0::2], values[1::2]):
+                    metrics[self.key(protocol, field)] = int(value)
+        return metrics
+
+
+class CgroupCollector(MetricCollector):
+    metric_type = 'cgroup'
+    cgroup_root = '/sys/fs/cgroup'
+
+    def _cgroup_paths(self):
+        """Returns a dict of controller name to path of the node's cgroup. Unified (v2) hierarchy is stored under ''"""
+        paths = {}
+        with open(_proc_path(self.pid) + '/cgroup') as cgroup_file:
+            for line in cgroup_file:
+                _, controllers, path = line.strip().split(':', 2)
+                if controllers == '':
+                    paths[''] = self.cgroup_root + path
+                for controller in controllers.split(','):
+                    paths[controller] = f"{self.cgroup_root}/{controller}{path}"
+        return paths
+
+    @staticmethod
+    def _read_int(path):
+        try:
+            with open(path) as value_file:
+                return int(value_file.read().split()[0])
+        except (FileNotFoundError, ValueError, IndexError):
+            return None
+
+    def collect(self):
+        paths = self._cgroup_paths()
+        cpu_usage_us = None
+        memory_bytes = None
+        if 'cpuacct' in paths:
+            usage_ns = self._read_int(paths['cpuacct'] + '/cpuacct.usage')
+            cpu_usage_us = None if usage_ns is None else usage_ns // 1000
+        if 'memory' in paths:
+            memory_bytes = self._read_int(paths['memory'] + '/memory.usage_in_bytes')
+        if '' in paths:
+            if cpu_usage_us is None:
+                try:
+                    with open(paths[''] + '/cpu.stat') as cpu_stat:
+                        for line in cpu_stat:
+                            field, value = line.split()
+                            if field == 'usage_usec':
+                                cpu_usage_us = int(value)
+                except FileNotFoundError:
+                    pass
+            if memory_bytes is None:
+                memory_bytes = self._read_int(paths[''] + '/memory.current')
+
+        metrics = {}
+        if cpu_usage_us is not None:
+            metrics[self.key('cpu', 'usage_us')] = cpu_usage_us
+        if memory_bytes is not None:
+            metrics[self.key('memory', 'usage_bytes')] = memory_bytes
+        return metrics
+
+
+def _open_netlink_socket_in_namespace(pid):
+    """Opens a NETLINK_ROUTE socket in the network namespace of pid. Sockets stay in the namespace they were
+    created in, so we only need to enter it once. This happens in a short-lived thread, since setns only affects
+    the calling thread, and that way the rest of the process is never moved."""
+    if pid is None:
+        return socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+
+    result = {}
+
+    def open_in_namespace():
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            with open(f'/proc/{pid}/ns/net') as namespace_file:
+                if libc.setns(namespace_file.fileno(), CLONE_NEWNET) != 0:
+                    raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+            result['socket'] = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        except OSError as error:
+            result['error'] = error
+
+    thread = threading.Thread(target=open_in_namespace)
+    thread.start()
+    thread.join()
+    if 'error' in result:
+        raise result['error']
+    return result['socket']
+
+
+def _parse_attributes(data, offset=0):
+    """Returns a dict of rtattr type to payload"""
+    attributes = {}
+    while offset + _RTATTR.size <= len(data):
+        length, attribute_type = _RTATTR.unpack_from(data, offset)
+        if length < _RTATTR.size:
+            break
+        attributes[attribute_type & 0x3fff] = data[offset + _RTATTR.size:offset + length]
+        offset += (length + 3) & ~3
+    return attributes
+
+
+class QdiscCollector(MetricCollector):
+    metric_type = 'qdiscs'
+
+    def __init__(self, node_name, pid):
+        super().__init__(node_name, pid)
+        self.sequence = 0
+        self.netlink_socket = _open_netlink_socket_in_namespace(pid)
+
+    def _dump(self, message_type, payload):
+        """Sends a dump request, and returns a list of (message_type, message_payload) of all responses"""
+        self.sequence += 1
+        request = _NLMSGHDR.pack(_NLMSGHDR.size + len(payload), message_type, NLM_F_REQUEST | NLM_F_DUMP,
+                                 self.sequence, 0) + payload
+        self.netlink_socket.send(request)
+        messages = []
+        while True:
+            data = self.netlink_socket.recv(65536)
+            offset = 0
+            while offset + _NLMSGHDR.size <= len(data):
+                length, response_type, _, sequence, _ = _NLMSGHDR.unpack_from(data, offset)
+                if sequence == self.sequence:
+                    if response_type == NLMSG_DONE:
+                        return messages
+                    if response_type == NLMSG_ERROR:
+                        error = -struct.unpack_from('=i', data, offset + _NLMSGHDR.size)[0]
+                        raise OSError(error, os.strerror(error))
+                    messages.append((response_type, data[offset + _NLMSGHDR.size:offset + length]))
+                offset += (length + 3) & ~3
+
+    def _interface_names(self):
+        names = {}
+        for message_type, payload in self._dump(RTM_GETLINK, _IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)):
+            if message_type != RTM_NEWLINK:
+                continue
+            index = _IFINFOMSG.unpack_from(payload)[2]
+            attributes = _parse_attributes(payload, _IFINFOMSG.size)
+            names[index] = attributes.get(IFLA_IFNAME, b'').rstrip(b'\0').decode()
+        return names
+
+    def collect(self):
+        interface_names = self._interface_names()
+        metrics = {}
+        for message_type, payload in self._dump(RTM_GETQDISC, _TCMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)):
+            if message_type != RTM_NEWQDISC:
+                continue
+            _, index, handle, _, _ = _TCMSG.unpack_from(payload)
+            attributes = _parse_attributes(payload, _TCMSG.size)
+            interface_name = interface_names.get(index, str(index))
+            qdisc = f"{interface_name}:{handle >> 16:x}:{handle & 0xffff:x}"
+            if TCA_STATS2 not in attributes:
+                continue
+            stats = _parse_attributes(attributes[TCA_STATS2])
+            if TCA_STATS_BASIC in stats:
+                sent_bytes, sent_packets = _GNET_STATS_BASIC.unpack_from(stats[TCA_STATS_BASIC])
+                metrics[self.key(qdisc, 'bytes')] = sent_bytes
+                metrics[self.key(qdisc, 'packets')] = sent_packets
+            if TCA_STATS_QUEUE in stats:
+                qlen, backlog, drops, requeues, overlimits = _GNET_STATS_QUEUE.unpack_from(stats[TCA_STATS_QUEUE])
+                metrics[self.key(qdisc, 'qlen')] = qlen
+                metrics[self.key(qdisc, 'backlog')] = backlog
+                metrics[self.key(qdisc, 'drops')] = drops
+                metrics[self.key(qdisc, 'requeues')] = requeues
+                metrics[self.key(qdisc, 'overlimits')] = overlimits
+        return metrics
+
+    def close(self):
+        self.netlink_socket.close()
+
+
+COLLECTOR_CLASSES = {collector_class.metric_type: collector_class for collector_class in
+                     [InterfaceCollector, QdiscCollector, CgroupCollector, SocketCollector]}
+
+
+def make_collectors(metrics_config):
+    """Creates collectors for the 'metrics' list of the log config. Each item has a 'host' (pid, or None for the root
+    namespace), a 'node' name, and a 'type', or a list of 'types'. Collectors that can't be created are skipped."""
+    collectors = []
+    for metric_config in metrics_config or []:
+        metric_types = metric_config.get('types', None) or [metric_config.get('type', None)]
+        for metric_type in metric_types:
+            collector_class = COLLECTOR_CLASSES.get(metric_type, None)
+            if collector_class is None:
+                log.error(f"Unknown metric type {metric_type}, ignoring it\n")
+                continue
+            try:
+                collectors.append(collector_class(metric_config.get('node', None), metric_config.get('host', None)))
+            except OSError as error:
+                log.error(f"Could not create {metric_type} collector for {metric_config.get('node', None)}: {error}\n")
+    return collectors
+
+
+def collect_metrics(collectors):
+    """Runs all collectors, and returns their merged metrics. Failing collectors, e.g. because the node has been
+    stopped, are logged and skipped."""
+    metrics = {}
+    for collector in collectors:
+        try:
+            metrics.update(collector.collect())
+        except OSError as error:
+            log.debug(f"{collector.metric_type} collector for {collector.node_name} failed: {error}\n")
+    return metrics
@@ -0,0 +1,276 @@
+"""Columnar binary storage for FaultLogger entries.
+
+A columnar log stores each field of the log entries as one contiguous array, instead of one JSON object per entry.
+The file layout is:
+- the magic bytes FILE_MAGIC
+- the length of the header, as little-endian uint64
+- the header, as JSON. It describes the columns, the fault tags and the byte order of the file
+- padding, and all columns, each aligned to 8 bytes
+
+Active faults are stored as one bitset per entry, with the bit positions listed under 'fault_tags' in the header.
+Command outputs are stored in a string table: the 'strings' column holds the utf-8 encoded outputs back to back,
+'string_offsets' holds n + 1 offsets into it. Output columns reference the string table by index.
+Identical outputs are only stored once.
+Metrics from the in-process collectors are stored as one float column per metric, named 'metric:<key>', with NaN
+for entries that don't contain the metric.
+
+Since all columns are plain arrays, read_columnar_log memory-maps the file instead of parsing it."""
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+FILE_MAGIC = b'FNCOL1\n'
+# For integer columns, e.g. retcodes of late commands, or outputs of skipped ticks. The lowest int64, since any
+# small negative number can be a retcode, e.g. -1 for a process killed by SIGHUP
+MISSING_VALUE = -2 ** 63
+NAN = float('nan')  # For metric columns
+_ALIGNMENT = 8
+
+
+def _command_column_name(tag, field):
+    return f"command:{tag}:{field}"
+
+
+def _metric_column_name(key):
+    return f"metric:{key}"
+
+
+class _StringTable(object):
+    """Deduplicating table of strings, referenced by index"""
+
+    def __init__(self):
+        self.indices = {}
+        self.encoded = []
+
+    def add(self, string):
+        if string is None:
+            return MISSING_VALUE
+        index = self.indices.get(string)
+        if index is None:
+            index = len(self.encoded)
+            self.indices[string] = index
+            self.encoded.append(string.encode('utf-8'))
+        return index
+
+    def columns(self):
+        offsets = array('Q', [0])
+        for encoded_string in self.encoded:
+            offsets.append(offsets[-1] + len(encoded_string))
+        return array('B', b''.join(self.encoded)), offsets
+
+
+def entries_to_columns(entries):
+    """Converts a list of FaultLogger entries into (columns, header). columns maps column names to arrays,
+    header describes the fault and command tags that the columns refer to."""
+    fault_tags = []
+    fault_types = {}
+    fault_bits = {}
+    command_tags = []
+    metric_keys = {}  # Used as ordered set
+    for entry in entries:
+        for fault in entry.get('active_faults', []):
+            if fault['fault_tag'] not in fault_bits:
+                fault_bits[fault['fault_tag']] = len(fault_tags)
+                fault_tags.append(fault['fault_tag'])
+                fault_types[fault['fault_tag']] = fault['fault_type']
+        for command in entry.get('commands') or []:
+            if command['tag'] not in command_tags:
+                command_tags.append(command['tag'])
+        for key in entry.get('metrics', {}):
+            metric_keys[key] = None
+
+    words_per_entry = (len(fault_tags) + 63) // 64
+    strings = _StringTable()
+    columns = {
+        'time_ms': array('q'),
+        'scheduled_ms': array('q'),
+        'time_since_start_ms': array('q'),
+        'skipped': array('B'),
+        'active_faults': array('Q'),
+    }
+    for tag in command_tags:
+        for field, typecode in (('output', 'q'), ('retcode', 'q'), ('late', 'B'), ('timed_out', 'B')):
+            columns[_command_column_name(tag, field)] = array(typecode)
+    for key in metric_keys:
+        columns[_metric_column_name(key)] = array('d')
+
+    for entry in entries:
+        columns['time_ms'].append(entry['time_ms'])
+        columns['scheduled_ms'].append(entry.get('scheduled_ms', entry['time_ms']))
+        columns['time_since_start_ms'].append(entry['time_since_start_ms'])
+        columns['skipped'].append(int(entry.get('skipped', False)))
+
+        bitset = [0] * words_per_entry
+        for fault in entry.get('active_faults', []):
+            bit = fault_bits[fault['fault_tag']]
+            bitset[bit // 64] |= 1 << (bit % 64)
+        columns['active_faults'].extend(bitset)
+
+        commands_by_tag = {command['tag']: command for command in entry.get('commands') or []}
+        for tag in command_tags:
+            command = commands_by_tag.get(tag, {})
+            retcode = command.get('retcode')
+            columns[_command_column_name(tag, 'output')].append(strings.add(command.get('output')))
+            columns[_command_column_name(tag, 'retcode')].append(MISSING_VALUE if retcode is None else retcode)
+            columns[_command_column_name(tag, 'late')].append(int(command.get('late', False)))
+            columns[_command_column_name(tag, 'timed_out')].append(int(command.get('timed_out', False)))
+
+        metrics = entry.get('metrics', {})
+        for key in metric_keys:
+            columns[_metric_column_name(key)].append(metrics.get(key, NAN))
+
+    columns['strings'], columns['string_offsets'] = strings.columns()
+    header_extras = {
+        'fault_tags': fault_tags,
+        'fault_types': [fault_types[tag] for tag in fault_tags],
+        'command_tags': command_tags,
+        'metric_keys': list(metric_keys),
+    }
+    return columns, header_extras
+
+
+def write_columnar_log(entries, filepath):
+    """Writes a list of FaultLogger entries to filepath, in the columnar format"""
+    columns, header = entries_to_columns(entries)
+    header['entries'] = len(entries)
+    header['byteorder'] = sys.byteorder
+    header['missing_value'] = MISSING_VALUE
+
+    # Offsets are relative to the start of the data section, which directly follows the padded header
+    column_descriptions = []
+    relative_offset = 0
+    for name, column in columns.items():
+        length = len(column) * column.itemsize
+        column_descriptions.append({'name': name, 'typecode': column.typecode,
+                                    'offset': relative_offset, 'length': length})
+        relative_offset += length + (-length % _ALIGNMENT)
+    header['columns'] = column_descriptions
+    encoded_header = json.dumps(header).encode('utf-8')
+    padding = -(len(FILE_MAGIC) + 8 + len(encoded_header)) % _ALIGNMENT
+
+    with open(filepath, 'wb') as log_file:
+        log_file.write(FILE_MAGIC)
+        log_file.write(struct.pack('<Q', len(encoded_header)))
+        log_file.write(encoded_header)
+        log_file.write(b'\0' * padding)
+        for name, column in columns.items():
+            column.tofile(log_file)
+            log_file.write(b'\0' * (-len(column) * column.itemsize % _ALIGNMENT))
+
+
+class ColumnarLog(object):
+    """Read-only view on a columnar log file. Columns are memory-mapped, and returned as memoryviews, so
+    opening even very large logs is cheap. Use as a context manager, or call close() when done."""
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._file = open(filepath, 'rb')
+        magic = self._file.read(len(FILE_MAGIC))
+        if magic != FILE_MAGIC:
+            self._file.close()
+            raise ValueError(f"{filepath} is not a columnar fault log")
+        header_length = struct.unpack('<Q', self._file.read(8))[0]
+        self.header = json.loads(self._file.read(header_length).decode('utf-8'))
+        header_end = len(FILE_MAGIC) + 8 + header_length
+        self._data_start = header_end + (-header_end % _ALIGNMENT)
+        self.fault_tags = self.header['fault_tags']
+        self.fault_types = self.header['fault_types']
+        self.command_tags = self.header['command_tags']
+        self.metric_keys = self.header.get('metric_keys', [])
+        self.entries = self.header['entries']
+        if 'missing_value' not in self.header:
+            # Written before MISSING_VALUE was recorded, when -1 was ambiguous with real retcodes
+            self._file.close()
+            raise ValueError(f"{filepath} was written by an older version, without a missing value")
+        self.missing_value = self.header['missing_value']
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._native_byteorder = self.header['byteorder'] == sys.byteorder
+        self._columns = {}
+        self._views = []
+
+    def column(self, name):
+        """Returns the column as a sequence of numbers. Zero-copy, unless the file was written with a different
+        byte order."""
+        if name in self._columns:
+            return self._columns[name]
+        for description in self.header['columns']:
+            if description['name'] == name:
+                break
+        else:
+            raise KeyError(name)
+        start = self._data_start + description['offset']
+        raw = memoryview(self._mmap)[start:start + description['length']]
+        self._views.append(raw)
+        if self._native_byteorder:
+            column = raw.cast(description['typecode'])
+            self._views.append(column)
+        else:
+            column = array(description['typecode'], raw.tobytes())
+            column.byteswap()
+        self._columns[name] = column
+        return column
+
+    def column_names(self):
+        return [description['name'] for description in self.header['columns']]
+
+    def active_faults(self, row):
+        """Returns the tags of all faults that were active in the given entry"""
+        words_per_entry = (len(self.fault_tags) + 63) // 64
+        bitsets = self.column('active_faults')
+        active = []
+        for word_index in range(words_per_entry):
+            word = bitsets[row * words_per_entry + word_index]
+            for bit in range(64):
+                if word >> bit & 1:
+                    active.append(self.fault_tags[word_index * 64 + bit])
+        return active
+
+    def fault_active(self, tag):
+        """Returns a list of booleans, indicating for each entry whether the given fault was active"""
+        bit = self.fault_tags.index(tag)
+        words_per_entry = (len(self.fault_tags) + 63) // 64
+        bitsets = self.column('active_faults')
+        word_index, mask = bit // 64, 1 << (bit % 64)
+        return [bool(bitsets[row * words_per_entry + word_index] & mask) for row in range(self.entries)]
+
+    def string(self, index):
+        """Returns the string at index in the string table, or None for a missing value"""
+        if index == self.missing_value:
+            return None
+        offsets = self.column('string_offsets')
+        return bytes(self.column('strings')[offsets[index]:offsets[index + 1]]).decode('utf-8')
+
+    def command_outputs(self, tag):
+        """Returns the outputs of the command with the given tag, one per entry"""
+        return [self.string(index) for index in self.column(_command_column_name(tag, 'output'))]
+
+    def command_retcodes(self, tag):
+        """Returns the retcodes of the command with the given tag, one per entry, None where it is missing"""
+        return [None if retcode == self.missing_value else retcode
+                for retcode in self.column(_command_column_name(tag, 'retcode'))]
+
+    def metric(self, key):
+        """Returns the values of the metric with the given key, one per entry, NaN where it is missing"""
+        return self.column(_metric_column_name(key))
+
+    def close(self):
+        # memoryviews into the mmap need to be released before it can be closed
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._columns = {}
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_columnar_log(filepath):
+    """Opens a columnar log written by write_columnar_log"""
+    return ColumnarLog(filepath)
@@ -1,10 +1,14 @@
 import asyncio
 import atexit
+import os
+import signal
 import time
 import queue
 import json
 from mininet import log
-from subprocess import run
+from mininet.faultlogcolumnar import write_columnar_log
+from mininet.faultlogcollectors import make_collectors, collect_metrics
+from subprocess import PIPE
 
 ACTIVE_FAULTS_DICT = dict()
 
@@ -20,27 +24,109 @@ class FaultLogger(object):
 
     def __init__(self, interval=1000,  # in ms
                  log_filepath='faultynet_faultlogfile.json',
-                 commands=[]):
+                 commands=[],
+                 command_timeout=None,  # in ms, commands running longer are killed. Defaults to 5 * interval
+                 tick_deadline=None,  # in ms, results arriving later are marked late. Defaults to 0.8 * interval
+                 log_format='json',  # 'json', or 'columnar' for the binary format from faultlogcolumnar
+                 metrics=None,  # list of metric configs, see faultlogcollectors.make_collectors
+                 mode='snapshots',  # 'snapshots', or 'events' to record fault transitions instead of active faults
+                 events_filepath='faultynet_faultevents.jsonl',  # where 'events' mode writes transitions to
+                 keyframe_interval=60000):  # in ms, how often 'events' mode records the full fault state
         if interval is None:
             interval = 1000
+        if mode is None:
+            mode = 'snapshots'
+        if mode not in ['snapshots', 'events']:
+            log.error(f"Unknown fault log mode {mode}, logging snapshots instead\n")
+            mode = 'snapshots'
+        if events_filepath is None:
+            events_filepath = 'faultynet_faultevents.jsonl'
+        if keyframe_interval is None:
+            keyframe_interval = 60000
+        if log_format is None:
+            log_format = 'json'
+        if log_format not in ['json', 'columnar']:
+            log.error(f"Unknown fault log format {log_format}, writing json instead\n")
+            log_format = 'json'
         if log_filepath is None:
-            log_filepath = 'faultynet_faultlogfile.json'
+            log_filepath = 'faultynet_faultlogfile.json' if log_format == 'json' else 'faultynet_faultlogfile.fncol'
+        if tick_deadline is None:
+            # Leave some headroom, a tick that runs until the next one is due causes that one to be skipped
+            tick_deadline = 0.8 * interval
+        elif tick_deadline >= interval:
+            log.warn("Fault logger tick_deadline is not shorter than interval, ticks will be skipped\n")
+        if command_timeout is None:
+            command_timeout = 5 * interval
 
         self.interval = interval / 1000  # asyncio.sleep expects seconds
         self.log_filepath = log_filepath
+        self.log_format = log_format
         self.commands = commands
+        self.metrics = metrics
+        self.collectors = []  # created in go(), since netlink sockets can't be shared with other processes
+        self.command_timeout = command_timeout / 1000
+        self.tick_deadline = tick_deadline / 1000
+        # Commands that missed their tick deadline. Referenced here so that they aren't garbage collected
+        # while still running, and so that we can wait for them before writing the log
+        self.pending_command_tasks = set()
 
         self.logged_faults = queue.Queue()
         self.start_time_ms = None
         self.active = False
+        self.skipped_ticks = 0
+
+        self.mode = mode
+        self.events_filepath = events_filepath
+        self.keyframe_interval = keyframe_interval / 1000
 
     async def go(self):
+        """Ticks at a fixed rate, based on the monotonic clock. Tick n is scheduled at start + n * interval,
+        independent of how long previous ticks took. If the previous tick is still running when the next one
+        is due, or if we woke up too late, the tick is skipped, and a flagged entry without command outputs is
+        logged in its place. This keeps entries evenly spaced."""
         self.start_time_ms = int(time.time_ns() / 1000000)
+        start_monotonic = time.monotonic()
         self.active = True
-        log_tasks = []
+        self.skipped_ticks = 0
+        self.collectors = make_collectors(self.metrics)
+        if self.mode == 'events':
+            FaultLogger.start_recording_events()
+            last_keyframe = time.monotonic()
+        # In events mode ticks only run commands and collect metrics, so without those we don't need them
+        log_ticks = self.mode == 'snapshots' or bool(self.commands) or bool(self.collectors)
+        tick_number = 0
+        current_tick = None  # Only reference to a running tick, so that it isn't garbage collected mid-task
         while self.active:
-            log_tasks.append(asyncio.create_task(self.log()))  # Store to prevent mid-task garbage collection
-            await asyncio.sleep(self.interval)
+            scheduled_ms = self.start_time_ms + round(tick_number * self.interval * 1000)
+            if self.mode == 'events' and time.monotonic() - last_keyframe >= self.keyframe_interval:
+                FaultLogger.record_keyframe()
+                last_keyframe += self.keyframe_interval
+            if log_ticks:
+                if current_tick is not None and not current_tick.done():
+                    self._log_skipped_tick(scheduled_ms)
+                else:
+                    current_tick = asyncio.create_task(self.log(scheduled_ms))
+            tick_number += 1
+
+            # Ticks whose scheduled time has already passed completely are skipped, instead of being fired in a burst
+            ticks_behind = int((time.monotonic() - start_monotonic) / self.interval) - tick_number
+            for _ in range(max(ticks_behind, 0)):
+                if log_ticks:
+                    self._log_skipped_tick(self.start_time_ms + round(tick_number * self.interval * 1000))
+                tick_number += 1
+
+            await asyncio.sleep(max(start_monotonic + tick_number * self.interval - time.monotonic(), 0))
+        if current_tick is not None:
+            await current_tick
+        if self.mode == 'events':
+            FaultLogger.record_keyframe()
+        for collector in self.collectors:
+            collector.close()
+        if self.skipped_ticks > 0:
+            log.warn(f"Fault logger skipped {self.skipped_ticks} ticks, consider increasing the log interval\n")
+        # Late commands are bounded by command_timeout, so this doesn't block for long
+        if self.pending_command_tasks:
+            await asyncio.gather(*self.pending_command_tasks)
         # Once done, write to file.
         # Others can also call us to write to file, but that's fine: IF they write later we only
         # get additional logs, and nothing is lost
@@ -50,12 +136,20 @@ def stop(self):
         log.debug("Stopping fault logger\n")
         self.active = False
 
+    # Transitions and keyframes of all faults, while a logger in 'events' mode is running. None otherwise.
+    # Class attributes, since injectors report their faults via the classmethods below.
+    fault_events = None
+    # Last fault_type and command recorded per tag. Events only contain those if they changed.
+    last_event_values = {}
+
     @classmethod
     def set_fault_active(cls, tag, fault_type, command, retcode):
         ACTIVE_FAULTS_DICT[tag] = {'fault_tag': tag,
                                    'fault_type': fault_type,
                                    'command': command,
                                    'retcode': retcode}
+        if cls.fault_events is not None:
+            cls._record_transition(tag, True, retcode, fault_type, command)
 
     @classmethod
     def set_fault_inactive(cls, tag):
@@ -63,49 +157,203 @@ def set_fault_inactive(cls, tag):
             del ACTIVE_FAULTS_DICT[tag]
         except KeyError:
             log.warn(f'Could not disable fault {tag}, likely due to duplicate tag, or race condition. Logs may be incorrect.\n')
+            return
+        if cls.fault_events is not None:
+            cls._record_transition(tag, False)
+
+    @classmethod
+    def _record_transition(cls, tag, active, retcode=None, fault_type=None, command=None):
+        event = {'type': 'transition',
+                 'time_ns': time.time_ns(),
+                 'fault_tag': tag,
+                 'active': active}
+        if active:
+            event['retcode'] = retcode
+            last_values = cls.last_event_values.get(tag, {})
+            if last_values.get('fault_type') != fault_type:
+                event['fault_type'] = fault_type
+            if last_values.get('command') != command:
+                event['command'] = command
+            cls.last_event_values[tag] = {'fault_type': fault_type, 'command': command}
+        cls.fault_events.append(event)
+
+    @classmethod
+    def start_recording_events(cls):
+        """Starts recording transitions, beginning with a keyframe of the current state"""
+        cls.fault_events = []
+        cls.record_keyframe()
+
+    @classmethod
+    def record_keyframe(cls):
+        """Records the full state of all active faults. Any point in time can be reconstructed from the
+        last keyframe before it, and the transitions between them."""
+        active_faults = [dict(fault) for fault in ACTIVE_FAULTS_DICT.values()]
+        cls.fault_events.append({'type': 'keyframe',
+                                 'time_ns': time.time_ns(),
+                                 'active_faults': active_faults})
+        # Transitions after a keyframe must not depend on anything before it
+        cls.last_event_values = {fault['fault_tag']: {'fault_type': fault['fault_type'], 'command': fault['command']}
+                                 for fault in active_faults}
 
     def get_active_faults(self):
         return list(ACTIVE_FAULTS_DICT.values())
 
-    async def log(self):
+    async def log(self, scheduled_ms=None):
         timestamp_ms = int(time.time_ns() / 1000000)
+        if scheduled_ms is None:
+            scheduled_ms = timestamp_ms
         ms_since_start = timestamp_ms - self.start_time_ms
         active_faults = self.get_active_faults()
         log.debug("Generating fault log entry...\n")
 
-        debugging_command_output = self.run_debug_commands()
-
         logging_point_in_time = {
             'time_ms': timestamp_ms,
+            'scheduled_ms': scheduled_ms,
             'time_since_start_ms': ms_since_start,
             'active_faults': active_faults,
-            'commands': debugging_command_output
+            'skipped': False,
+            'commands': None
         }
+        if self.mode == 'events':
+            del logging_point_in_time['active_faults']  # Recorded as transitions instead
+        if self.collectors:
+            logging_point_in_time['metrics'] = collect_metrics(self.collectors)
+        # Enqueue before running commands, so that entries stay ordered by their scheduled time
         self.logged_faults.put(logging_point_in_time)
+        logging_point_in_time['commands'] = await self.run_debug_commands()
 
-    def run_debug_commands(self):
-        command_outputs = []
+    def _log_skipped_tick(self, scheduled_ms):
+        """Logs an entry for a tick that couldn't run its commands. Fault state and metrics are still recorded."""
+        timestamp_ms = int(time.time_ns() / 1000000)
+        self.skipped_ticks += 1
+        log.debug("Skipping fault log tick, previous tick is still running\n")
+        logging_point_in_time = {
+            'time_ms': timestamp_ms,
+            'scheduled_ms': scheduled_ms,
+            'time_since_start_ms': timestamp_ms - self.start_time_ms,
+            'active_faults': self.get_active_faults(),
+            'skipped': True,
+            'commands': None
+        }
+        if self.mode == 'events':
+            del logging_point_in_time['active_faults']  # Recorded as transitions instead
+        if self.collectors:
+            logging_point_in_time['metrics'] = collect_metrics(self.collectors)
+        self.logged_faults.put(logging_point_in_time)
+
+    async def run_debug_commands(self):
+        """Runs all debug commands concurrently. Waits at most tick_deadline for their results.
+        Commands that haven't finished by then are marked as late, and their output is filled in
+        once they finish, or once they are killed after command_timeout."""
         if self.commands is None:
             return ""
 
+        command_outputs = []
+        command_tasks = []
         for command in self.commands:
-            if command['host'] is None:
-                full_command = command['command']  # Execute in main namespace
-            else:
-                full_command = f"nsenter --target {str(command['host'])} --net --pid --all " + command['command']
-            completed_process = run(full_command, capture_output=True, text=True, shell=True)
-            all_output = completed_process.stdout + completed_process.stderr
-
             debug_object = {
                 'tag': command['tag'],
                 'command': command['command'],
-                'output': all_output
+                'output': None,
+                'retcode': None,
+                'late': False,
+                'timed_out': False
             }
             command_outputs.append(debug_object)
+            command_tasks.append(asyncio.create_task(self._run_debug_command(command, debug_object)))
+
+        if not command_tasks:
+            return command_outputs
+
+        _, pending = await asyncio.wait(command_tasks, timeout=self.tick_deadline)
+        for task, debug_object in zip(command_tasks, command_outputs):
+            if task in pending:
+                debug_object['late'] = True
+                self.pending_command_tasks.add(task)
+                task.add_done_callback(self.pending_command_tasks.discard)
+        if pending:
+            log.debug(f"{len(pending)} debug commands missed the tick deadline\n")
         return command_outputs
 
+    async def _run_debug_command(self, command, debug_object):
+        """Runs a single debug command, and writes its results into debug_object"""
+        if command['host'] is None:
+            full_command = command['command']  # Execute in main namespace
+        else:
+            full_command = f"nsenter --target {str(command['host'])} --net --pid --all " + command['command']
+        # New session, so that on timeout we can kill the shell and everything it spawned
+        process = await asyncio.create_subprocess_shell(full_command, stdout=PIPE, stderr=PIPE,
+                                                        start_new_session=True)
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=self.command_timeout)
+        except asyncio.TimeoutError:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await process.wait()
+            log.debug(f"Debug command {command['tag']} timed out\n")
+            debug_object['output'] = ""
+            debug_object['retcode'] = process.returncode
+            debug_object['timed_out'] = True
+            return
+
+        debug_object['output'] = stdout.decode(errors='replace') + stderr.decode(errors='replace')
+        debug_object['retcode'] = process.returncode
+
     def write_log_to_file(self):
+        if self.mode == 'events':
+            self.write_events_to_file()
+            if self.logged_faults.empty():
+                return
         log.info(f"Writing fault logs to {self.log_filepath}\n")
         logs = list(self.logged_faults.queue)
+        if self.log_format == 'columnar':
+            write_columnar_log(logs, self.log_filepath)
+            return
         with open(self.log_filepath, 'w') as json_file:
             json.dump(logs, json_file, indent=4)
+
+    def write_events_to_file(self):
+        """Writes fault transitions and keyframes as JSON lines, one compact event per line"""
+        log.info(f"Writing fault events to {self.events_filepath}\n")
+        events = list(FaultLogger.fault_events or [])
+        with open(self.events_filepath, 'w') as events_file:
+            for event in events:
+                events_file.write(json.dumps(event, separators=(',', ':')) + '\n')
+
+
+def read_fault_events(events_filepath):
+    """Reads the events written by a FaultLogger in 'events' mode"""
+    with open(events_filepath, 'r') as events_file:
+        return [json.loads(line) for line in events_file if line.strip()]
+
+
+def active_faults_at(events, time_ns):
+    """Reconstructs the faults that were active at time_ns from events, as returned by read_fault_events.
+    Returns a dict of tag to fault, in the same format as the active_faults of snapshot logs."""
+    start = 0
+    for i, event in enumerate(events):
+        if event['time_ns'] > time_ns:
+            break
+        if event['type'] == 'keyframe':
+            start = i
+
+    active_faults = {}
+    last_values = {}
+    for event in events[start:]:
+        if event['time_ns'] > time_ns:
+            break
+        if event['type'] == 'keyframe':
+            active_faults = {fault['fault_tag']: dict(fault) for fault in event['active_faults']}
+            last_values = {tag: dict(fault) for tag, fault in active_faults.items()}
+        elif event['active']:
+            values = last_values.setdefault(event['fault_tag'], {})
+            values.update({key: event[key] for key in ['fault_type', 'command'] if key in event})
+            active_faults[event['fault_tag']] = {'fault_tag': event['fault_tag'],
+                                                 'fault_type': values.get('fault_type'),
+                                                 'command': values.get('command'),
+                                                 'retcode': event['retcode']}
+        else:
+            active_faults.pop(event['fault_tag'], None)
+    return active_faults
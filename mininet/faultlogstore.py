@@ -0,0 +1,318 @@
+"""Indexed SQLite store for FaultLogger output of many runs.
+
+Ingests snapshot logs (JSON or columnar), event logs (JSON lines), and arbitrary timestamped measurements, e.g.
+controller latencies, into one SQLite database, so that analyses don't need to re-parse and scan every log file.
+Each ingested file becomes one run, identified by a run id.
+
+Usage, from Python:
+    store = ExperimentStore('experiments.sqlite')
+    store.ingest_log('faultynet_faultlogfile.json', run_id='ci-1234')
+    store.ticks_with_fault('link_loss', run_id='ci-1234')
+    store.metric_values('interfaces:s1-eth1:tx_bytes', node='s1', fault_tag='link_loss')
+    store.compare_runs('ci-1234', 'ci-1235')
+
+or from the command line:
+    python -m mininet.faultlogstore experiments.sqlite faultynet_faultlogfile.json [more logs...]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+from mininet.faultlogcolumnar import FILE_MAGIC, read_columnar_log
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    source TEXT,
+    ingested_at_ms INTEGER
+);
+CREATE TABLE IF NOT EXISTS ticks (
+    run_id TEXT NOT NULL,
+    tick INTEGER NOT NULL,
+    time_ms INTEGER NOT NULL,
+    scheduled_ms INTEGER,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (run_id, tick)
+);
+CREATE INDEX IF NOT EXISTS ticks_time ON ticks (run_id, time_ms);
+CREATE TABLE IF NOT EXISTS faults (
+    run_id TEXT NOT NULL,
+    tick INTEGER NOT NULL,
+    fault_tag TEXT NOT NULL,
+    fault_type TEXT,
+    retcode INTEGER
+);
+CREATE INDEX IF NOT EXISTS faults_tag ON faults (fault_tag, run_id, tick);
+CREATE INDEX IF NOT EXISTS faults_tick ON faults (run_id, tick);
+CREATE TABLE IF NOT EXISTS fault_events (
+    run_id TEXT NOT NULL,
+    time_ns INTEGER NOT NULL,
+    fault_tag TEXT NOT NULL,
+    active INTEGER NOT NULL,
+    retcode INTEGER
+);
+CREATE INDEX IF NOT EXISTS fault_events_tag ON fault_events (fault_tag, run_id, time_ns);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id TEXT NOT NULL,
+    tick INTEGER NOT NULL,
+    node TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS metrics_node_name ON metrics (node, name, run_id, tick);
+CREATE INDEX IF NOT EXISTS metrics_tick ON metrics (run_id, tick);
+CREATE TABLE IF NOT EXISTS command_outputs (
+    run_id TEXT NOT NULL,
+    tick INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    output TEXT,
+    retcode INTEGER,
+    late INTEGER,
+    timed_out INTEGER
+);
+CREATE INDEX IF NOT EXISTS command_outputs_tag ON command_outputs (tag, run_id, tick);
+CREATE TABLE IF NOT EXISTS measurements (
+    run_id TEXT NOT NULL,
+    time_ms REAL NOT NULL,
+    node TEXT,
+    name TEXT NOT NULL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS measurements_name ON measurements (name, run_id, time_ms);
+CREATE INDEX IF NOT EXISTS measurements_node ON measurements (node, name, run_id);
+"""
+
+_RUN_TABLES = ['ticks', 'faults', 'fault_events', 'metrics', 'command_outputs', 'measurements', 'runs']
+
+
+def _split_metric_key(key):
+    """'h1:interfaces:h1-eth0:rx_bytes' -> ('h1', 'interfaces:h1-eth0:rx_bytes')"""
+    node, _, name = key.partition(':')
+    return node, name
+
+
+class ExperimentStore(object):
+    """SQLite database of fault logs. Ingesting a run with an existing run id replaces that run."""
+
+    def __init__(self, database_filepath):
+        self.database_filepath = database_filepath
+        self.connection = sqlite3.connect(database_filepath)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _start_run(self, run_id, source):
+        for table in _RUN_TABLES:
+            self.connection.execute(f"DELETE FROM {table} WHERE run_id = ?", (run_id,))
+        self.connection.execute("INSERT INTO runs VALUES (?, ?, ?)", (run_id, source, int(time.time() * 1000)))
+
+    def _ensure_run(self, run_id, source=None):
+        """Creates the run if it doesn't exist yet"""
+        self.connection.execute("INSERT OR IGNORE INTO runs VALUES (?, ?, ?)",
+                                (run_id, source, int(time.time() * 1000)))
+
+    def ingest_log(self, log_filepath, run_id=None):
+        """Ingests a FaultLogger output file. The format (JSON snapshots, columnar, or JSON lines events) is
+        detected from the file contents. run_id defaults to the file name. Returns the run id."""
+        if run_id is None:
+            run_id = os.path.basename(log_filepath)
+        with open(log_filepath, 'rb') as log_file:
+            start = log_file.read(len(FILE_MAGIC))
+        with self.connection:
+            self._start_run(run_id, log_filepath)
+            if start == FILE_MAGIC:
+                self._ingest_columnar(run_id, log_filepath)
+            elif start.lstrip().startswith(b'['):
+                with open(log_filepath, 'r') as json_file:
+                    self._ingest_entries(run_id, json.load(json_file))
+            else:
+                with open(log_filepath, 'r') as events_file:
+                    self._ingest_events(run_id, [json.loads(line) for line in events_file if line.strip()])
+        return run_id
+
+    def ingest_entries(self, run_id, entries):
+        """Ingests FaultLogger snapshot entries, as loaded from a JSON log, as the run run_id. Like ingest_log(),
+        this replaces an existing run with the same id."""
+        with self.connection:
+            self._start_run(run_id, None)
+            self._ingest_entries(run_id, entries)
+
+    def _ingest_entries(self, run_id, entries):
+        ticks, faults, metrics, outputs = [], [], [], []
+        for tick, entry in enumerate(entries):
+            ticks.append((run_id, tick, entry['time_ms'], entry.get('scheduled_ms'), int(entry.get('skipped', False))))
+            for fault in entry.get('active_faults', []):
+                faults.append((run_id, tick, fault['fault_tag'], fault['fault_type'], fault['retcode']))
+            for key, value in entry.get('metrics', {}).items():
+                metrics.append((run_id, tick) + _split_metric_key(key) + (value,))
+            for command in entry.get('commands') or []:
+                outputs.append((run_id, tick, command['tag'], command.get('output'), command.get('retcode'),
+                                int(command.get('late', False)), int(command.get('timed_out', False))))
+        self._insert_rows(ticks, faults, metrics, outputs)
+
+    def _ingest_columnar(self, run_id, log_filepath):
+        ticks, faults, metrics, outputs = [], [], [], []
+        with read_columnar_log(log_filepath) as fault_log:
+            time_ms = fault_log.column('time_ms')
+            scheduled_ms = fault_log.column('scheduled_ms')
+            skipped = fault_log.column('skipped')
+            for tick in range(fault_log.entries):
+                ticks.append((run_id, tick, time_ms[tick], scheduled_ms[tick], skipped[tick]))
+            for bit, tag in enumerate(fault_log.fault_tags):
+                for tick, active in enumerate(fault_log.fault_active(tag)):
+                    if active:
+                        # Retcodes aren't part of the columnar format
+                        faults.append((run_id, tick, tag, fault_log.fault_types[bit], None))
+            for key in fault_log.metric_keys:
+                node, name = _split_metric_key(key)
+                for tick, value in enumerate(fault_log.metric(key)):
+                    if value == value:  # Skip NaN, i.e. missing values
+                        metrics.append((run_id, tick, node, name, value))
+            for tag in fault_log.command_tags:
+                retcodes = fault_log.command_retcodes(tag)
+                late = fault_log.column(f"command:{tag}:late")
+                timed_out = fault_log.column(f"command:{tag}:timed_out")
+                for tick, output in enumerate(fault_log.command_outputs(tag)):
+                    if output is None:
+                        continue
+                    outputs.append((run_id, tick, tag, output, retcodes[tick], late[tick], timed_out[tick]))
+        self._insert_rows(ticks, faults, metrics, outputs)
+
+    def _insert_rows(self, ticks, faults, metrics, outputs):
+        self.connection.executemany("INSERT INTO ticks VALUES (?, ?, ?, ?, ?)", ticks)
+        self.connection.executemany("INSERT INTO faults VALUES (?, ?, ?, ?, ?)", faults)
+        self.connection.executemany("INSERT INTO metrics VALUES (?, ?, ?, ?, ?)", metrics)
+        self.connection.executemany("INSERT INTO command_outputs VALUES (?, ?, ?, ?, ?, ?, ?)", outputs)
+
+    def ingest_events(self, run_id, events):
+        """Ingests the transitions of an events mode log, as the run run_id. Keyframes are redundant with the
+        transitions of a complete log, and are only used for faults that were already active when logging
+        started. Like ingest_log(), this replaces an existing run with the same id."""
+        with self.connection:
+            self._start_run(run_id, None)
+            self._ingest_events(run_id, events)
+
+    def _ingest_events(self, run_id, events):
+        rows = []
+        first_keyframe_seen = False
+        for event in events:
+            if event['type'] == 'keyframe':
+                if not first_keyframe_seen:
+                    for fault in event['active_faults']:
+                        rows.append((run_id, event['time_ns'], fault['fault_tag'], 1, fault['retcode']))
+                first_keyframe_seen = True
+            else:
+                rows.append((run_id, event['time_ns'], event['fault_tag'], int(event['active']), event.get('retcode')))
+        self.connection.executemany("INSERT INTO fault_events VALUES (?, ?, ?, ?, ?)", rows)
+
+    def ingest_measurements(self, run_id, measurements, source=None):
+        """Ingests timestamped measurements that are not part of a fault log, e.g. controller latencies.
+        measurements is an iterable of dicts with time_ms, name, value, and optionally node.
+        Measurements are added to the run, which is created if it doesn't exist yet."""
+        with self.connection:
+            self._ensure_run(run_id, source)
+            self.connection.executemany(
+                "INSERT INTO measurements VALUES (?, ?, ?, ?, ?)",
+                ((run_id, m['time_ms'], m.get('node'), m['name'], m['value']) for m in measurements))
+
+    def runs(self):
+        return [row[0] for row in self.connection.execute("SELECT run_id FROM runs ORDER BY ingested_at_ms, rowid")]
+
+    def ticks_with_fault(self, fault_tag, run_id=None):
+        """Returns (run_id, tick, time_ms) of all ticks in which the fault was active"""
+        query = ("SELECT ticks.run_id, ticks.tick, ticks.time_ms FROM faults "
+                 "JOIN ticks ON ticks.run_id = faults.run_id AND ticks.tick = faults.tick "
+                 "WHERE faults.fault_tag = ?")
+        parameters = [fault_tag]
+        if run_id is not None:
+            query += " AND faults.run_id = ?"
+            parameters.append(run_id)
+        return self.connection.execute(query + " ORDER BY ticks.run_id, ticks.tick", parameters).fetchall()
+
+    def metric_values(self, name, node=None, run_id=None, fault_tag=None):
+        """Returns (run_id, tick, node, value) of a metric, e.g. 'interfaces:s1-eth1:tx_bytes'.
+        Optionally restricted to one node, one run, and to ticks in which fault_tag was active."""
+        query = "SELECT metrics.run_id, metrics.tick, metrics.node, metrics.value FROM metrics"
+        conditions = ["metrics.name = ?"]
+        parameters = [name]
+        if fault_tag is not None:
+            query += " JOIN faults ON faults.run_id = metrics.run_id AND faults.tick = metrics.tick"
+            conditions.append("faults.fault_tag = ?")
+            parameters.append(fault_tag)
+        if node is not None:
+            conditions.append("metrics.node = ?")
+            parameters.append(node)
+        if run_id is not None:
+            conditions.append("metrics.run_id = ?")
+            parameters.append(run_id)
+        query += " WHERE " + " AND ".join(conditions) + " ORDER BY metrics.run_id, metrics.tick"
+        return self.connection.execute(query, parameters).fetchall()
+
+    def fault_intervals(self, fault_tag, run_id):
+        """Returns (start_ns, end_ns) of each period in which the fault was active, based on an events log.
+        end_ns is None if the fault was still active at the end of the log."""
+        intervals = []
+        start = None
+        for time_ns, active in self.connection.execute(
+                "SELECT time_ns, active FROM fault_events WHERE fault_tag = ? AND run_id = ? ORDER BY time_ns",
+                (fault_tag, run_id)):
+            if active and start is None:
+                start = time_ns
+            elif not active and start is not None:
+                intervals.append((start, time_ns))
+                start = None
+        if start is not None:
+            intervals.append((start, None))
+        return intervals
+
+    def run_summary(self, run_id):
+        """Returns a dict with the number of ticks, ticks per active fault, and mean of each metric and
+        measurement of the run"""
+        connection = self.connection
+        return {
+            'ticks': connection.execute("SELECT COUNT(*) FROM ticks WHERE run_id = ?", (run_id,)).fetchone()[0],
+            'fault_ticks': dict(connection.execute(
+                "SELECT fault_tag, COUNT(*) FROM faults WHERE run_id = ? GROUP BY fault_tag", (run_id,))),
+            'metric_means': {f"{node}:{name}": mean for node, name, mean in connection.execute(
+                "SELECT node, name, AVG(value) FROM metrics WHERE run_id = ? GROUP BY node, name", (run_id,))},
+            'measurement_means': {(f"{node}:{name}" if node else name): mean for node, name, mean in connection.execute(
+                "SELECT node, name, AVG(value) FROM measurements WHERE run_id = ? GROUP BY node, name", (run_id,))},
+        }
+
+    def compare_runs(self, run_a, run_b):
+        """Compares two runs. Returns a dict with the summaries of both runs, and for each metric and measurement
+        present in both the difference of their means (b - a)."""
+        summary_a = self.run_summary(run_a)
+        summary_b = self.run_summary(run_b)
+        differences = {}
+        for means in ['metric_means', 'measurement_means']:
+            for key in summary_a[means].keys() & summary_b[means].keys():
+                differences[key] = summary_b[means][key] - summary_a[means][key]
+        return {run_a: summary_a, run_b: summary_b, 'mean_differences': differences}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest FaultLogger output into an SQLite experiment store")
+    parser.add_argument('database', help="SQLite database file, created if missing")
+    parser.add_argument('logs', nargs='+', help="FaultLogger output files, in any supported format")
+    parser.add_argument('--run-id', default=None, help="Run id, only valid with a single log. Defaults to file name")
+    arguments = parser.parse_args()
+    if arguments.run_id is not None and len(arguments.logs) > 1:
+        parser.error("--run-id can only be used with a single log")
+    with ExperimentStore(arguments.database) as store:
+        for log_filepath in arguments.logs:
+            run_id = store.ingest_log(log_filepath, run_id=arguments.run_id)
+            print(f"Ingested {log_filepath} as run {run_id}")
+
+
+if __name__ == '__main__':
+    main()
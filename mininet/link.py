@@ -27,8 +27,8 @@
 import re
 
 from mininet.log import info, error, debug
-from mininet.util import makeIntfPair
-import mininet.node
+from mininet.util import ( makeIntfPair, makeIntfPairs, startBatch,
+                           finishIpBatch, batchErrors, deleteIntfs )
 
 # Make pylint happy:
 # pylint: disable=too-many-arguments
@@ -222,7 +222,9 @@ def delete( self ):
         self.link = None
 
         # call detach if we have a OVSSwitch (just to be sure)
-        if isinstance( self.node, mininet.node.OVSSwitch ):
+        # pylint: disable=import-outside-toplevel,cyclic-import
+        from mininet.node import OVSSwitch
+        if isinstance( self.node, OVSSwitch ):
             self.node.detach(self)
 
     def status( self ):
@@ -328,6 +330,99 @@ def tc( self, cmd, tc='tc' ):
         debug(" *** executing command: %s\n" % c)
         return self.cmd( c )
 
+    # While batching (see startBatch()):
+    # node (None for the root namespace) ->
+    # { intf: ( ethtool command, tc commands ) }
+    batches = None
+    # Maximum number of batch processes running at once
+    batchProcs = 64
+
+    @classmethod
+    def startBatch( cls ):
+        """Defer configuration of TCIntfs until runBatch(), which
+           configures all interfaces in a namespace with one
+           tc -batch, and each interface only once
+           returns: True if this started a batch, False if one
+                    was already in progress"""
+        if TCIntf.batches is not None:
+            return False
+        TCIntf.batches = {}
+        return True
+
+    @classmethod
+    def runBatch( cls ):
+        "Run the configuration deferred since startBatch()"
+        batches, TCIntf.batches = TCIntf.batches, None
+        cls.configBatch( batches or {} )
+
+    def _batch( self, ethtool, cmds ):
+        "Defer configuration until runBatch()"
+        from mininet.node import Node
+        node = self.node
+        # Local nodes outside of a namespace share the root namespace;
+        # nodes with their own popen() (Docker, remote nodes) run
+        # their batch with it
+        if not node.inNamespace and type( node ).popen is Node.popen:
+            node = None
+        TCIntf.batches.setdefault( node, {} )[ self ] = ( ethtool, cmds )
+
+    @classmethod
+    def _finishBatch( cls, lines, popen ):
+        """Report errors of a batch started by configBatch()
+           returns: dict of intf -> list of tc outputs"""
+        output, returncode = finishIpBatch( popen )
+        errors = batchErrors( output )
+        failed = returncode and lines and not errors
+        if failed:
+            # The batch did not run at all, e.g. tc or the node's
+            # namespace is gone, so none of its commands took effect
+            output = output or 'exit status %s\n' % returncode
+            error( '*** Error: tc batch for %s failed: %s' %
+                   ( ' '.join( sorted( set( str( intf ) for intf, _line
+                                            in lines ) ) ), output ) )
+        outputs = {}
+        for n, ( intf, line ) in enumerate( lines, 1 ):
+            out = output if failed else errors.get( n, '' )
+            # Deleting the default qdisc fails harmlessly
+            if ( out and not failed and
+                 not line.startswith( 'qdisc del' ) and
+                 'No such file or directory' not in out ):
+                error( '*** Error: %s: %s\n' % ( line, out ) )
+            outputs.setdefault( intf, [] ).append( out )
+        return outputs
+
+    @classmethod
+    def configBatch( cls, batches ):
+        """Configure interfaces, with one process per namespace
+           batches: node (or None for the root namespace) ->
+                    { intf: ( ethtool command, tc commands ) }
+           returns: dict of intf -> list of tc outputs"""
+        outputs, running = {}, []
+        for node, intfs in batches.items():
+            script, lines = [], []
+            for intf, ( ethtool, cmds ) in intfs.items():
+                # Like config(), ignore ethtool's output and status
+                script.append( ethtool + ' > /dev/null 2>&1 || :' )
+                for cmd in cmds:
+                    line = ' '.join( ( cmd % ( '', intf ) ).split() )
+                    lines.append( ( intf, line ) )
+            if lines:
+                # Keep going after errors, and report them by line
+                script.append( "exec tc -force -batch - << 'EOF'" )
+                script += [ line for _intf, line in lines ] + [ 'EOF' ]
+            # Run by the node, so that e.g. Docker hosts use docker exec
+            popen = startBatch( [ 'sh', '-s' ], script, node=node )
+            if popen is None:
+                error( '*** Error: cannot configure the interfaces of '
+                       '%s\n' % node )
+                continue
+            running.append( ( lines, popen ) )
+            if len( running ) >= cls.batchProcs:
+                outputs.update( cls._finishBatch( *running.pop( 0 ) ) )
+        for lines, popen in running:
+            outputs.update( cls._finishBatch( lines, popen ) )
+        return outputs
+
     # pylint: disable=arguments-differ
     def config( self, bw=None, delay=None, jitter=None, loss=None,
                 gro=False, txo=True, rxo=True,
@@ -360,23 +455,30 @@ def on( isOn ):
             return 'on' if isOn else 'off'
 
         # Set offload parameters with ethool
-        self.cmd( 'ethtool -K', self,
-                  'gro', on( gro ),
-                  'tx', on( txo ),
-                  'rx', on( rxo ) )
+        ethtool = 'ethtool -K %s gro %s tx %s rx %s' % (
+            self, on( gro ), on( txo ), on( rxo ) )
 
         # Optimization: return if nothing else to configure
         # Question: what happens if we want to reset things?
         if ( bw is None and not delay and not loss
              and max_queue_size is None ):
+            if TCIntf.batches is not None:
+                self._batch( ethtool, [] )
+            else:
+                self.cmd( ethtool )
             return None
 
-        # Clear existing configuration
-        tcoutput = self.tc( '%s qdisc show dev %s' )
-        if "priomap" not in tcoutput and "noqueue" not in tcoutput:
+        if TCIntf.batches is not None:
+            # Clear existing configuration; in a batch, it is cheaper
+            # to let tc fail if there is none than to check first
             cmds = [ '%s qdisc del dev %s root' ]
         else:
-            cmds = []
+            self.cmd( ethtool )
+            tcoutput = self.tc( '%s qdisc show dev %s' )
+            if "priomap" not in tcoutput and "noqueue" not in tcoutput:
+                cmds = [ '%s qdisc del dev %s root' ]
+            else:
+                cmds = []
 
         # Bandwidth limits via various methods
         bwcmds, parent = self.bwCmds( bw=bw, speedup=speedup,
@@ -402,6 +504,12 @@ def on( isOn ):
                     if enable_red else [] ) )
         info( '(' + ' '.join( stuff ) + ') ' )
 
+        if TCIntf.batches is not None:
+            # runBatch() runs them with those of the other interfaces
+            self._batch( ethtool, cmds )
+            result[ 'parent' ] = parent
+            return result
+
         # Execute all the commands in our node
         debug("at map stage w/cmds: %s\n" % cmds)
         tcoutputs = [ self.tc(cmd) for cmd in cmds ]
@@ -425,7 +533,7 @@ class Link( object ):
     def __init__( self, node1, node2, port1=None, port2=None,
                   intfName1=None, intfName2=None, addr1=None, addr2=None,
                   intf=Intf, cls1=None, cls2=None, params1=None,
-                  params2=None, fast=True, **params ):
+                  params2=None, fast=True, created=False, **params ):
         """Create veth link to another node, making two new interfaces.
            node1: first node
            node2: second node
@@ -437,6 +545,8 @@ def __init__( self, node1, node2, port1=None, port2=None,
            intfName2: node2  interface name (optional)
            params1: parameters for interface 1 (optional)
            params2: parameters for interface 2 (optional)
+           created: interfaces already exist in their nodes, e.g.
+               from makeIntfPairs() (optional)
            **params: additional parameters for both interfaces"""
 
         # This is a bit awkward; it seems that having everything in
@@ -462,9 +572,13 @@ def __init__( self, node1, node2, port1=None, port2=None,
         params2.update( params )
 
         self.fast = fast
-        if fast:
+        if fast or created:
             params1.setdefault( 'moveIntfFn', self._ignore )
             params2.setdefault( 'moveIntfFn', self._ignore )
+        if created:
+            # Already in their nodes: nothing to create or move
+            pass
+        elif fast:
             self.makeIntfPair( intfName1, intfName2, addr1, addr2,
                                node1, node2, deleteIntfs=False )
         else:
@@ -513,6 +627,16 @@ def makeIntfPair( cls, intfname1, intfname2, addr1=None, addr2=None,
         return makeIntfPair( intfname1, intfname2, addr1, addr2, node1, node2,
                              deleteIntfs=deleteIntfs )
 
+    @classmethod
+    def makeIntfPairs( cls, pairs ):
+        """Create many pairs of interfaces at once, each in its node
+           pairs: list of ( intfname1, intfname2, addr1, addr2,
+               node1, node2 )
+           (override this too if you override makeIntfPair(), or
+           Mininet.addLinks() will create your links one by one)"""
+        assert cls
+        return makeIntfPairs( pairs )
+
     def delete( self ):
         "Delete this link"
         self.intf1.delete()
@@ -524,6 +648,34 @@ def stop( self ):
         "Override to stop and clean up link as needed"
         self.delete()
 
+    # Device group that batchStop() moves interfaces to, to delete
+    # them all at once
+    deleteGroup = 0x6d6e
+
+    @classmethod
+    def batchStop( cls, links ):
+        """Stop many links at once, before their nodes terminate: the
+           ends of veth pairs in the root namespace are deleted with a
+           single ip -batch, the others go away with their namespaces
+           (override this too if you override stop() or delete(), or
+           Mininet.stop() will stop your links one by one)
+           links: links to stop
+           returns: links"""
+        names = []
+        for link in links:
+            for intf in ( link.intf1, link.intf2 ):
+                if not intf.node.inNamespace:
+                    # Deleting one end of a veth pair deletes both
+                    names.append( intf.name )
+                    break
+            for intf in ( link.intf1, link.intf2 ):
+                intf.node.delIntf( intf )
+                intf.link = None
+            link.intf1 = link.intf2 = None
+        if names:
+            deleteIntfs( names, cls.deleteGroup )
+        return links
+
     def status( self ):
         "Return link status as a string"
         return "(%s %s)" % ( self.intf1.status(), self.intf2.status() )
@@ -94,25 +94,28 @@
 import shlex
 import ipaddress
 
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from sys import exit  # pylint: disable=redefined-builtin
-from time import sleep
+from time import sleep, monotonic
 from itertools import chain, groupby
 from math import ceil
 
 from mininet.cli import CLI
-from mininet.fault_controllers.BaseFaultController import BaseFaultControllerStarter
-from mininet.fault_controllers.ConfigFileFaultController import ConfigFileFaultControllerStarter
 from mininet.log import info, error, debug, output, warn
 from mininet.node import ( Node, Docker, Host, OVSKernelSwitch,
                            DefaultController, Controller, OVSSwitch, OVSBridge )
 from mininet.nodelib import NAT
-from mininet.link import Link, Intf
+from mininet.link import Link, Intf, TCIntf
+from mininet.ovsdb import OVSDBError
 from mininet.util import ( quietRun, fixLimits, numCores, ensureRoot,
                            macColonHex, ipStr, ipParse, netParse, ipAdd,
-                           waitListening, BaseString )
+                           waitListening, BaseString, startIpBatch,
+                           finishIpBatch, batchErrors, decode )
 from mininet.term import cleanUpScreens, makeTerms
+from mininet.timing import Timings
 
-from subprocess import Popen
+from subprocess import Popen, STDOUT
 
 # Mininet version: should be consistent with README and LICENSE
 VERSION = "2.3.1b1"
@@ -128,7 +131,7 @@ class Mininet( object ):
     # pylint: disable=too-many-arguments
     def __init__(self, topo=None, switch=OVSKernelSwitch, host=Host,
                  controller=DefaultController, link=Link, intf=Intf,
-                 faultControllerStarter=ConfigFileFaultControllerStarter,
+                 faultControllerStarter=None,
                  build=True, xterms=False, cleanup=False, ipBase='10.0.0.0/8',
                  inNamespace=False,
                  autoSetMacs=False, autoStaticArp=False, autoPinCpus=False,
@@ -140,6 +143,8 @@ def __init__(self, topo=None, switch=OVSKernelSwitch, host=Host,
            controller: default Controller class/constructor
            link: default Link class/constructor
            intf: default Intf class/constructor
+           faultControllerStarter: fault controller starter class, used
+               with faultFilepath (ConfigFileFaultControllerStarter)
            ipBase: base IP address for hosts,
            build: build now from topo?
            xterms: if build now, spawn xterms?
@@ -181,11 +186,17 @@ def __init__(self, topo=None, switch=OVSKernelSwitch, host=Host,
         self.switches = []
         self.controllers = []
         self.links = []
+        # Adjacency index: frozenset of the nodes of a link -> links
+        # between them, in the order they were added
+        self.linkIndex = {}
 
         self.nameToNode = {}  # name to Node (Host/Switch) objects
 
         self.terms = []  # list of spawned xterm processes
 
+        # Time spent in each phase of build() and start()
+        self.timings = Timings()
+
         Mininet.init()  # Initialize Mininet if necessary
 
         self.built = False
@@ -197,32 +208,48 @@ def waitConnected( self, timeout=None, delay=.5 ):
            timeout: time to wait, or None or True to wait indefinitely
            delay: seconds to sleep per iteration
            returns: True if all switches are connected"""
-        info( '*** Waiting for switches to connect\n' )
-        time = 0.0
-        remaining = list( self.switches )
-        # False: 0s timeout; None: wait forever (preserve 2.2 behavior)
-        if isinstance( timeout, bool ):
-            timeout = None if timeout else 0
-        while True:
-            for switch in tuple( remaining ):
-                if switch.connected():
-                    info( '%s ' % switch )
+        with self.timings.span( 'waitConnected',
+                                count=len( self.switches ) ):
+            info( '*** Waiting for switches to connect\n' )
+            start = monotonic()
+            remaining = list( self.switches )
+            # False: 0s timeout; None: wait forever (2.2 behavior)
+            if isinstance( timeout, bool ):
+                timeout = None if timeout else 0
+            while True:
+                for switch in tuple( remaining ):
+                    if switch.connected():
+                        info( '%s ' % switch )
+                        remaining.remove( switch )
+                if not remaining:
+                    info( '\n' )
+                    return True
+                time = monotonic() - start
+                if timeout is not None and time >= timeout:
+                    break
+                wait = ( delay if timeout is None
+                         else min( delay, timeout - time ) )
+                # If ovsdb-server tells us about all remaining switches,
+                # wake up as soon as it reports a change
+                dbs = set( switch.ovsdb() if isinstance( switch, OVSSwitch )
+                           else None for switch in remaining )
+                if None in dbs:
+                    sleep( wait )
+                else:
+                    try:
+                        dbs.pop().run( wait )
+                    except ( OSError, OVSDBError ) as e:
+                        # Poll with ovs-vsctl until we reconnect
+                        OVSSwitch.closeOvsdb( e )
+                        sleep( wait )
+            warn( 'Timed out after %d seconds\n' % time )
+            for switch in remaining:
+                if not switch.connected():
+                    warn( 'Warning: %s is not connected to a controller\n'
+                          % switch.name )
+                else:
                     remaining.remove( switch )
-            if not remaining:
-                info( '\n' )
-                return True
-            if timeout is not None and time >= timeout:
-                break
-            sleep( delay )
-            time += delay
-        warn( 'Timed out after %d seconds\n' % time )
-        for switch in remaining:
-            if not switch.connected():
-                warn( 'Warning: %s is not connected to a controller\n'
-                      % switch.name )
-            else:
-                remaining.remove( switch )
-        return not remaining
+            return not remaining
 
     def getNextIp( self ):
         ip = ipAdd( self.nextIP,
@@ -231,13 +258,9 @@ def getNextIp( self ):
         self.nextIP += 1
         return ip
 
-    def addHost( self, name, cls=None, **params ):
-        """Add host.
-           name: name of host to add
-           cls: custom host class/constructor (optional)
-           params: parameters for host
-           returns: added host"""
-        # Default IP and MAC addresses
+    def _hostParams( self, params ):
+        """Return params for the next host, with its default IP and
+           MAC addresses and cores"""
         defaults = { 'ip': ipAdd( self.nextIP,
                                   ipBaseNum=self.ipBaseNum,
                                   prefixLen=self.prefixLen ) +
@@ -249,13 +272,70 @@ def addHost( self, name, cls=None, **params ):
             self.nextCore = ( self.nextCore + 1 ) % self.numCores
         self.nextIP += 1
         defaults.update( params )
+        return defaults
+
+    def addHost( self, name, cls=None, **params ):
+        """Add host.
+           name: name of host to add
+           cls: custom host class/constructor (optional)
+           params: parameters for host
+           returns: added host"""
+        defaults = self._hostParams( params )
         if not cls:
             cls = self.host
-        h = cls( name, **defaults )
+        with self.timings.span( 'addHosts', cls ):
+            h = cls( name, **defaults )
         self.hosts.append( h )
         self.nameToNode[ name ] = h
         return h
 
+    def addHosts( self, hosts, cls=None, **params ):
+        """Add several hosts, starting their shells concurrently.
+           hosts: list of host names or ( name, params ) tuples
+           cls: custom host class/constructor (optional)
+           params: parameters for all hosts
+           returns: list of added hosts"""
+        added = []
+        for host in hosts:
+            name, hostParams = host if isinstance( host, tuple ) else (
+                host, {} )
+            options = dict( params, waitPrompt=False )
+            options.update( hostParams )
+            added.append( self.addHost( name, cls=cls, **options ) )
+        self.finishShells( added )
+        return added
+
+    def finishShells( self, nodes ):
+        """Wait for the shells of nodes created with waitPrompt=False.
+           All prompts are awaited with a single poller, and each
+           shell is initialized as soon as its prompt appears, so
+           this takes about as long as the slowest shell.
+           nodes: list of nodes"""
+        with self.timings.span( 'startShells', count=len( nodes ) ):
+            poller = select.poll()
+            fdToNode = {}
+            for node in nodes:
+                if node.starting:
+                    fdToNode[ node.stdout.fileno() ] = node
+                    poller.register( node.stdout.fileno(), select.POLLIN )
+            while fdToNode:
+                for fd, event in poller.poll():
+                    node = fdToNode[ fd ]
+                    if event & select.POLLIN:
+                        node.monitor( timeoutms=0 )
+                    else:
+                        error( '*** Error: shell of %s exited\n' % node )
+                        node.starting = node.waiting = False
+                    if node.waiting:
+                        continue
+                    if node.starting:
+                        # Got the prompt: initialize the shell
+                        node.starting = False
+                        node.sendCmd( node.shellInit )
+                    else:
+                        poller.unregister( fd )
+                        del fdToNode[ fd ]
+
     def removeHost( self, name, **params):
         """
         Remove a host from the network at runtime.
@@ -272,6 +352,7 @@ def removeHost( self, name, **params):
                 self.hosts.remove(h)
             if name in self.nameToNode:
                 del self.nameToNode[name]
+            self._forgetLinks( h )
             h.stop( deleteIntfs=True )
             debug("Removed: %s\n" % name)
             return True
@@ -286,6 +367,7 @@ def delNode( self, node, nodes=None):
                       ( self.switches if node in self.switches else
                         ( self.controllers if node in self.controllers else
                           [] ) ) )
+        self._forgetLinks( node )
         node.stop( deleteIntfs=True )
         node.terminate()
         nodes.remove( node )
@@ -306,7 +388,8 @@ def addSwitch( self, name, cls=None, **params ):
         defaults.update( params )
         if not cls:
             cls = self.switch
-        sw = cls( name, **defaults )
+        with self.timings.span( 'addSwitches', cls ):
+            sw = cls( name, **defaults )
         if not self.inNamespace and self.listenPort:
             self.listenPort += 1
         self.switches.append( sw )
@@ -331,7 +414,8 @@ def addController( self, name='c0', controller=None, **params ):
             name = controller_new.name
             # pylint: enable=maybe-no-member
         else:
-            controller_new = controller( name, **params )
+            with self.timings.span( 'addControllers', controller ):
+                controller_new = controller( name, **params )
         # Add new controller to net
         if controller_new:  # allow controller-less setups
             self.controllers.append( controller_new )
@@ -446,18 +530,126 @@ def addLink( self, node1, node2, port1=None, port2=None,
         options.setdefault( 'addr1', self.randMac() )
         options.setdefault( 'addr2', self.randMac() )
         cls = self.link if cls is None else cls
-        link = cls( node1, node2, **options )
+        with self.timings.span( 'addLinks', cls ):
+            link = cls( node1, node2, **options )
 
-        # Allow to add links at runtime
-        # (needs attach method provided by OVSSwitch)
-        if isinstance( node1, OVSSwitch ):
-            node1.attach(link.intf1)
-        if isinstance( node2, OVSSwitch ):
-            node2.attach(link.intf2)
+            # Allow to add links at runtime
+            # (needs attach method provided by OVSSwitch)
+            if isinstance( node1, OVSSwitch ):
+                node1.attach(link.intf1)
+            if isinstance( node2, OVSSwitch ):
+                node2.attach(link.intf2)
 
         self.links.append( link )
+        self.linkIndex.setdefault( frozenset( ( node1, node2 ) ),
+                                   [] ).append( link )
         return link
 
+    def _unindexLink( self, link ):
+        "Remove link from self.links and the adjacency index"
+        self.links.remove( link )
+        key = frozenset( ( link.intf1.node, link.intf2.node ) )
+        if link not in self.linkIndex.get( key, () ):
+            # An interface was moved to another node since addLink()
+            key = next( ( key for key, links in self.linkIndex.items()
+                          if link in links ), None )
+        links = self.linkIndex.get( key )
+        if links:
+            links.remove( link )
+            if not links:
+                del self.linkIndex[ key ]
+
+    def _forgetLinks( self, node ):
+        "Remove the links of node, which is going away, from the index"
+        for intf in node.intfList():
+            link = intf.link
+            if link and link in self.linkIndex.get(
+                    frozenset( ( link.intf1.node, link.intf2.node ) ), () ):
+                self._unindexLink( link )
+
+    # Link params that a partial() link class must not fix, since
+    # addLinks() sets them for batched links
+    batchParams = ( 'fast', 'port1', 'port2', 'intfName1', 'intfName2',
+                    'addr1', 'addr2', 'created' )
+
+    @classmethod
+    def _linkClass( cls, link ):
+        """Return the Link class that link (a class, or a partial() of
+           one) creates, or None if its interfaces can't be batched"""
+        while isinstance( link, partial ):
+            if any( param in link.keywords for param in cls.batchParams ):
+                return None
+            link = link.func
+        return link if isinstance( link, type ) else None
+
+    @staticmethod
+    def _batchLinks( cls ):
+        "Can we create the interfaces of links of class cls in bulk?"
+        if cls is None:
+            return False
+        makePair = getattr( cls.makeIntfPair, '__func__', None )
+        makePairs = getattr( cls.makeIntfPairs, '__func__', None )
+        return ( makePairs is not Link.makeIntfPairs.__func__ or
+                 ( makePair is Link.makeIntfPair.__func__ and
+                   cls.intfName is Link.intfName ) )
+
+    def addLinks( self, links ):
+        """Add several links, creating their interfaces in bulk.
+           Ports, interface names and MACs are assigned exactly as
+           addLink() would, then the veth pairs of each link class are
+           created with a single makeIntfPairs() call, directly in
+           their nodes.
+           links: list of dicts of addLink() params, incl. node1, node2
+           returns: list of added links"""
+        with self.timings.span( 'addLinks', count=len( links ) ):
+            nextPort = {}
+            pending = []
+            pairs = {}
+            for params in links:
+                options = dict( params )
+                node1, node2 = [ node if not isinstance( node, BaseString )
+                                 else self[ node ] for node in
+                                 ( options.pop( 'node1' ),
+                                   options.pop( 'node2' ) ) ]
+                # Allocate the ports of all links like Node.newPort()
+                # would, so that links that addLink() creates later
+                # can't take the ports of batched ones
+                for i, node in ( ( 1, node1 ), ( 2, node2 ) ):
+                    if node not in nextPort:
+                        nextPort[ node ] = node.newPort()
+                    port = options.get( 'port%d' % i )
+                    if port is None:
+                        port = nextPort[ node ]
+                        options[ 'port%d' % i ] = port
+                    nextPort[ node ] = max( nextPort[ node ], port + 1 )
+                cls = self._linkClass( options.get( 'cls' ) or self.link )
+                if options.get( 'fast', True ) and self._batchLinks( cls ):
+                    for i, node in ( ( 1, node1 ), ( 2, node2 ) ):
+                        port = options[ 'port%d' % i ]
+                        # intfName() is an instance method, but only needs
+                        # the node and port
+                        options.setdefault( 'intfName%d' % i,
+                                            Link.intfName( cls, node, port ) )
+                        options.setdefault( 'addr%d' % i, self.randMac() )
+                    options[ 'created' ] = True
+                    pairs.setdefault( cls, [] ).append(
+                        ( options[ 'intfName1' ], options[ 'intfName2' ],
+                          options[ 'addr1' ], options[ 'addr2' ],
+                          node1, node2 ) )
+                pending.append( ( node1, node2, options ) )
+            for cls, clsPairs in pairs.items():
+                # The links themselves are counted by addLink()
+                with self.timings.span( 'addLinks', cls, count=0 ):
+                    cls.makeIntfPairs( clsPairs )
+            # Configure the TCIntfs of all links at once
+            batch = TCIntf.startBatch()
+            try:
+                return [ self.addLink( node1, node2, **options )
+                         for node1, node2, options in pending ]
+            finally:
+                if batch:
+                    TCIntf.runBatch()
+
     def removeLink(self, link=None, node1=None, node2=None):
         """
         Removes a link. Can either be specified by link object,
@@ -475,31 +667,24 @@ def removeLink(self, link=None, node1=None, node2=None):
                 except:
                     error("Host: %s not found.\n" % node2)
             # try to find link by nodes
-            for l in self.links:
-                if l.intf1.node == node1 and l.intf2.node == node2:
-                    link = l
-                    break
-                if l.intf1.node == node2 and l.intf2.node == node1:
-                    link = l
-                    break
+            links = self.linksBetween( node1, node2 )
+            if links:
+                link = links[ 0 ]
         if link is None:
             error("Couldn't find link to be removed.\n")
             return
         # tear down the link
+        self._unindexLink( link )
         link.delete()
-        self.links.remove(link)
 
     def delLink( self, link ):
         "Remove a link from this network"
+        self._unindexLink( link )
         link.delete()
-        self.links.remove( link )
 
     def linksBetween( self, node1, node2 ):
         "Return Links between node1 and node2"
-        return [ link for link in self.links
-                 if ( node1, node2 ) in (
-                    ( link.intf1.node, link.intf2.node ),
-                    ( link.intf2.node, link.intf1.node ) ) ]
+        return list( self.linkIndex.get( frozenset( ( node1, node2 ) ), () ) )
 
     def delLinkBetween( self, node1, node2, index=0, allLinks=False ):
         """Delete link(s) between node1 and node2
@@ -513,23 +698,57 @@ def delLinkBetween( self, node1, node2, index=0, allLinks=False ):
             self.delLink( link )
         return links
 
+    @staticmethod
+    def _recordConfig( host ):
+        """Can configHosts() record the configuration commands of host
+           and send them as a single command line? Only if host and its
+           default interface use the stock config methods, which don't
+           look at the output of cmd() (empty while recording)"""
+        cls, intf = type( host ), host.defaultIntf()
+        if cls.cmd not in ( Node.cmd, Docker.cmd ):
+            return False
+        if any( getattr( cls, method ) is not getattr( Node, method )
+                for method in ( 'configDefault', 'config', 'setParam',
+                                'setMAC', 'setIP', 'setDefaultRoute' ) ):
+            return False
+        return intf is None or all(
+            getattr( type( intf ), method ) is getattr( Intf, method )
+            for method in ( 'cmd', 'ifconfig', 'setMAC', 'setIP' ) )
+
     def configHosts( self ):
-        "Configure a set of hosts."
-        for host in self.hosts:
-            info( host.name + ' ' )
-            intf = host.defaultIntf()
-            if intf:
-                host.configDefault()
-            else:
+        """Configure a set of hosts. The configuration commands of each
+           host are recorded and sent as a single command line, and all
+           hosts are configured in parallel. Hosts with their own config
+           methods are configured one command at a time."""
+        with self.timings.span( 'configHosts', count=len( self.hosts ) ):
+            scripts = {}
+            for host in self.hosts:
+                info( host.name + ' ' )
                 # Don't configure nonexistent intf
-                host.configDefault( ip=None, mac=None )
-            # You're low priority, dude!
-            # BL: do we want to do this here or not?
-            # May not make sense if we have CPU lmiting...
-            # quietRun( 'renice +18 -p ' + repr( host.pid ) )
-            # This may not be the right place to do this, but
-            # it needs to be done somewhere.
-        info( '\n' )
+                params = {} if host.defaultIntf() else dict( ip=None,
+                                                             mac=None )
+                if not self._recordConfig( host ):
+                    host.configDefault( **params )
+                    continue
+                host.startRecording()
+                try:
+                    host.configDefault( **params )
+                finally:
+                    script = host.stopRecording()
+                # Read back the resulting addresses in the same round trip
+                scripts[ host ] = script + ' ip -j address show'
+            for host, result in self.parallel( scripts ).items():
+                if result is not None and not host.updateIntfs( result ):
+                    # ip has no JSON support: read the addresses one by one
+                    for intf in host.intfList():
+                        intf.updateAddr()
+                # You're low priority, dude!
+                # BL: do we want to do this here or not?
+                # May not make sense if we have CPU lmiting...
+                # quietRun( 'renice +18 -p ' + repr( host.pid ) )
+                # This may not be the right place to do this, but
+                # it needs to be done somewhere.
+            info( '\n' )
 
     def buildFromTopo( self, topo=None ): # is this relevant for us?
         """Build mininet from a topology object
@@ -556,29 +775,42 @@ def buildFromTopo( self, topo=None ): # is this relevant for us?
                 else:
                     self.addController( 'c%d' % i, cls )
 
+        # Shells are started in the background, and awaited together
+        # before we need them for the links
         info( '*** Adding hosts:\n' )
-        for hostName in topo.hosts():
-            self.addHost( hostName, **topo.nodeInfo( hostName ) )
-            info( hostName + ' ' )
+        self._addTopoHosts( [ ( hostName, dict( topo.nodeInfo( hostName ) ) )
+                              for hostName in topo.hosts() ] )
 
         info( '\n*** Adding switches:\n' )
         for switchName in topo.switches():
             # A bit ugly: add batch parameter if appropriate
-            params = topo.nodeInfo( switchName)
+            params = dict( topo.nodeInfo( switchName) )
+            params.setdefault( 'waitPrompt', False )
             cls = params.get( 'cls', self.switch )
             #if hasattr( cls, 'batchStartup' ):
             #    params.setdefault( 'batch', True )
             self.addSwitch( switchName, **params )
             info( switchName + ' ' )
 
+        info( '\n*** Starting shells\n' )
+        self.finishShells( self.hosts + self.switches )
+
         info( '\n*** Adding links:\n' )
-        for srcName, dstName, params in topo.links(
-                sort=True, withInfo=True ):
-            self.addLink( **params )
+        self.addLinks( [ params for _src, _dst, params in
+                         topo.iterLinks( withInfo=True, sort=True ) ] )
+        for srcName, dstName in topo.iterLinks( sort=True ):
             info( '(%s, %s) ' % ( srcName, dstName ) )
 
         info( '\n' )
 
+    def _addTopoHosts( self, hosts ):
+        """Add the hosts of a topology, without waiting for their shells
+           hosts: list of ( name, params )"""
+        for name, params in hosts:
+            params.setdefault( 'waitPrompt', False )
+            self.addHost( name, **params )
+            info( name + ' ' )
+
     def configureControlNetwork( self ):
         "Control net config hook: override in subclass"
         raise Exception( 'configureControlNetwork: '
@@ -586,16 +818,17 @@ def configureControlNetwork( self ):
 
     def build( self ):
         "Build mininet."
-        if self.topo:
-            self.buildFromTopo( self.topo )
-        if self.inNamespace:
-            self.configureControlNetwork()
-        info( '*** Configuring hosts\n' )
-        self.configHosts()
-        if self.xterms:
-            self.startTerms()
-        if self.autoStaticArp:
-            self.staticArp()
+        with self.timings.span( 'build' ):
+            if self.topo:
+                self.buildFromTopo( self.topo )
+            if self.inNamespace:
+                self.configureControlNetwork()
+            info( '*** Configuring hosts\n' )
+            self.configHosts()
+            if self.xterms:
+                self.startTerms()
+            if self.autoStaticArp:
+                self.staticArp()
         self.built = True
 
     def startTerms( self ):
@@ -615,43 +848,134 @@ def stopXterms( self ):
             os.kill( term.pid, signal.SIGKILL )
         cleanUpScreens()
 
+    # Maximum number of ip processes that staticArp() runs at once
+    arpBatchProcs = 64
+
+    @staticmethod
+    def _arpIntfs( host ):
+        """Return a function that picks the interface of host that is
+           on the same subnet as a given IP address (default: default
+           interface), like arp -s does"""
+        subnets = []
+        for intf in host.intfList():
+            if intf.IP() and intf.prefixLen is not None:
+                prefixLen = int( intf.prefixLen )
+                mask = ( 0xffffffff << ( 32 - prefixLen ) ) & 0xffffffff
+                subnets.append( ( ipParse( intf.IP() ) & mask, mask,
+                                  intf.name ) )
+        default = host.defaultIntf()
+        default = default.name if default else None
+        if len( subnets ) < 2:
+            return lambda _ip: default
+
+        def arpIntf( ip ):
+            "Return the name of the interface for ip"
+            for net, mask, name in subnets:
+                if ip & mask == net:
+                    return name
+            return default
+        return arpIntf
+
+    def _finishArp( self, src, lines, popen ):
+        "Report errors of an ip -force -batch started by staticArp()"
+        result, returncode = finishIpBatch( popen )
+        errors = batchErrors( result )
+        if returncode and not errors:
+            # The batch did not run at all, e.g. the host is gone
+            error( '*** Error setting ARP entries of %s: %s\n' %
+                   ( src, result or 'exit status %s' % returncode ) )
+        for n, out in sorted( errors.items() ):
+            error( '*** Error setting ARP entry of %s: %s: %s\n' %
+                   ( src, lines[ n - 1 ], out ) )
+
     def staticArp( self ):
-        "Add all-pairs ARP entries to remove the need to handle broadcast."
-        for src in self.hosts:
-            for dst in self.hosts:
-                if src != dst:
-                    src.setARP( ip=dst.IP(), mac=dst.MAC() )
+        """Add all-pairs ARP entries to remove the need to handle broadcast.
+           Each host gets its whole neighbor table from a single
+           ip -force -batch, and the tables of many hosts are set at
+           once."""
+        with self.timings.span( 'staticArp', count=len( self.hosts ) ):
+            dsts = [ ( dst, dst.IP(), ipParse( dst.IP() ), dst.MAC() )
+                     for dst in self.hosts if dst.IP() and dst.MAC() ]
+            pending = []
+            for src in self.hosts:
+                arpIntf = self._arpIntfs( src )
+                lines = []
+                for dst, ip, ipNum, mac in dsts:
+                    intf = arpIntf( ipNum )
+                    if dst != src and intf:
+                        lines.append( 'neigh replace %s lladdr %s dev %s '
+                                      'nud permanent' % ( ip, mac, intf ) )
+                if not lines:
+                    continue
+                # Run by the host, so that e.g. Docker hosts use
+                # docker exec; a failed entry doesn't stop the others
+                popen = startIpBatch( lines, node=src, force=True )
+                if popen is None:
+                    continue
+                pending.append( ( src, lines, popen ) )
+                if len( pending ) >= self.arpBatchProcs:
+                    self._finishArp( *pending.pop( 0 ) )
+            for src, lines, popen in pending:
+                self._finishArp( src, lines, popen )
 
 
     def start( self ):
         "Start controller and switches."
         if not self.built:
             self.build()
-        info( '*** Starting controller\n' )
-        for controller in self.controllers:
-            info( controller.name + ' ')
-            controller.start()
-        info( '\n' )
-        info( '*** Starting %s switches\n' % len( self.switches ) )
-        for switch in self.switches:
-            info( switch.name + ' ')
-            switch.start( self.controllers )
-        started = {}
-        for swclass, switches in groupby(
-                sorted( self.switches,
-                        key=lambda s: str( type( s ) ) ), type ):
-            switches = tuple( switches )
-            if hasattr( swclass, 'batchStartup' ):
-                success = swclass.batchStartup( switches )
-                started.update( { s: s for s in success } )
-        info( '\n' )
-        if self.waitConn:
-            self.waitConnected( self.waitConn )
-        if self.faultFilepath:
-            if not issubclass(self.faultControllerStarter, BaseFaultControllerStarter):
-                error("nets faultControllerStarter is not a BaseFaultControllerStarter. Did you pass in the Controller by accident?\n")
-            self.faultControllerStarter = self.faultControllerStarter(self, self.faultFilepath)
-            self.faultControllerStarter.go()
+        timings = self.timings
+        with timings.span( 'start' ):
+            info( '*** Starting controller\n' )
+            for controller in self.controllers:
+                info( controller.name + ' ')
+                with timings.span( 'startControllers', type( controller ) ):
+                    controller.start()
+            info( '\n' )
+            info( '*** Starting %s switches\n' % len( self.switches ) )
+            for switch in self.switches:
+                info( switch.name + ' ')
+                with timings.span( 'startSwitches', type( switch ) ):
+                    switch.start( self.controllers )
+            started = {}
+            for swclass, switches in groupby(
+                    sorted( self.switches,
+                            key=lambda s: str( type( s ) ) ), type ):
+                switches = tuple( switches )
+                if hasattr( swclass, 'batchStartup' ):
+                    with timings.span( 'batchStartup', swclass,
+                                       count=len( switches ) ):
+                        success = swclass.batchStartup( switches )
+                    started.update( { s: s for s in success } )
+            info( '\n' )
+            if self.waitConn:
+                self.waitConnected( self.waitConn )
+            if self.faultFilepath:
+                # Imported here, as the fault controllers pull in yaml
+                # and multiprocessing
+                from mininet.fault_controllers.BaseFaultController import (
+                    BaseFaultControllerStarter )
+                if self.faultControllerStarter is None:
+                    from mininet.fault_controllers.ConfigFileFaultController \
+                        import ConfigFileFaultControllerStarter
+                    self.faultControllerStarter = (
+                        ConfigFileFaultControllerStarter )
+                if not issubclass(self.faultControllerStarter, BaseFaultControllerStarter):
+                    error("nets faultControllerStarter is not a BaseFaultControllerStarter. Did you pass in the Controller by accident?\n")
+                with timings.span( 'startFaultController' ):
+                    self.faultControllerStarter = self.faultControllerStarter(self, self.faultFilepath)
+                    self.faultControllerStarter.go()
+
+    @staticmethod
+    def _batchMethod( cls, batch, *methods ):
+        """Can we use cls.batch instead of calling methods one node or
+           link at a time? Not if a class overrides one of methods
+           without also overriding batch."""
+        def definer( name ):
+            "Return the class in cls.__mro__ that defines name"
+            return next( base for base in cls.__mro__
+                         if name in vars( base ) )
+        return all( issubclass( definer( batch ), definer( method ) )
+                    for method in methods )
 
     def stop( self ):
         "Stop the controller(s), switches and hosts"
@@ -664,9 +988,22 @@ def stop( self ):
             info( '*** Stopping %i terms\n' % len( self.terms ) )
             self.stopXterms()
         info( '*** Stopping %i links\n' % len( self.links ) )
-        for link in self.links:
-            info( '.' )
-            link.stop()
+        for cls, links in groupby(
+                sorted( self.links, key=lambda l: str( type( l ) ) ), type ):
+            batch, single = [], []
+            canBatch = self._batchMethod( cls, 'batchStop', 'stop', 'delete' )
+            for link in links:
+                if ( canBatch and type( link.intf1 ).delete is Intf.delete
+                     and type( link.intf2 ).delete is Intf.delete ):
+                    batch.append( link )
+                else:
+                    single.append( link )
+            if batch:
+                cls.batchStop( batch )
+                info( '.' * len( batch ) )
+            for link in single:
+                info( '.' )
+                link.stop()
         info( '\n' )
         info( '*** Stopping %i switches\n' % len( self.switches ) )
         stopped = {}
@@ -682,11 +1019,20 @@ def stop( self ):
             if switch not in stopped:
                 switch.stop()
             switch.terminate()
+        # Another network in this process may find a new ovsdb-server
+        OVSSwitch.closeOvsdb()
         info( '\n' )
         info( '*** Stopping %i hosts\n' % len( self.hosts ) )
-        for host in self.hosts:
-            info( host.name + ' ' )
-            host.terminate()
+        for cls, hosts in groupby(
+                sorted( self.hosts, key=lambda h: str( type( h ) ) ), type ):
+            hosts = tuple( hosts )
+            info( ' '.join( host.name for host in hosts ) + ' ' )
+            if self._batchMethod( cls, 'batchTerminate', 'terminate',
+                                  'hangup', 'cleanup' ):
+                cls.batchTerminate( hosts )
+            else:
+                for host in hosts:
+                    host.terminate()
         info( '\n*** Done\n' )
         if self.faultFilepath is not None:
             self.faultControllerStarter.stop()
@@ -723,6 +1069,90 @@ def monitor( self, hosts=None, timeoutms=-1 ):
             if not ready and timeoutms >= 0:
                 yield None, None
 
+    # Seconds that parallel() waits for interrupted commands
+    interruptGrace = 5
+
+    def parallel( self, cmds, timeout=None ):
+        """Run commands on several nodes at once, and wait for all of them.
+           Every command is sent before any output is read, and the
+           shells are multiplexed with a single poller, so this takes
+           about as long as the slowest node.
+           cmds: dict of node (or node name) -> command
+           timeout: (optional) overall timeout in seconds; commands
+               that are still running afterwards are interrupted, and
+               nodes that are not back at the prompt interruptGrace
+               seconds later are abandoned, still waiting
+           returns: dict of the keys of cmds -> output, None for nodes
+               without a shell"""
+        outputs = {}
+        chunks = {}
+        fdToKey = {}
+        poller = select.poll()
+        for key, cmd in cmds.items():
+            node = key if not isinstance( key, BaseString ) else self[ key ]
+            debug( '*** %s : %s\n' % ( node.name, cmd ) )
+            if node.shell:
+                node.sendCmd( cmd )
+            if not node.shell or not node.waiting:
+                warn( '(%s exited - ignoring cmd %s)\n' % ( node, cmd ) )
+                outputs[ key ] = None
+                continue
+            chunks[ key ] = []
+            fdToKey[ node.stdout.fileno() ] = key, node
+            poller.register( node.stdout.fileno(), select.POLLIN )
+        deadline = None if timeout is None else monotonic() + timeout
+        interrupted = False
+        while fdToKey:
+            timeoutms = -1
+            if deadline is not None:
+                timeoutms = max( 0, int( ( deadline - monotonic() ) * 1000 ) )
+            ready = poller.poll( timeoutms )
+            if not ready and interrupted:
+                # Shells that ignore the interrupt would keep us here
+                # forever; leave them waiting, so that their output is
+                # not taken for that of the next command
+                warn( '*** Abandoning after interrupt: %s\n' %
+                      ' '.join( node.name for _key, node
+                                in fdToKey.values() ) )
+                break
+            if not ready:
+                # Timed out: interrupt the stragglers, and collect
+                # their output until they are back at the prompt
+                warn( '*** Timed out after %s seconds waiting for: %s\n' %
+                      ( timeout, ' '.join( node.name for _key, node
+                                           in fdToKey.values() ) ) )
+                for _key, node in fdToKey.values():
+                    node.sendInt()
+                interrupted = True
+                deadline = monotonic() + self.interruptGrace
+                continue
+            for fd, event in ready:
+                key, node = fdToKey[ fd ]
+                if event & select.POLLIN:
+                    chunks[ key ].append( node.monitor( timeoutms=0 ) )
+                else:
+                    # The shell has gone away
+                    error( '*** Error: lost shell of %s\n' % node )
+                    node.waiting = False
+                if not node.waiting:
+                    poller.unregister( fd )
+                    del fdToKey[ fd ]
+        for key, nodeChunks in chunks.items():
+            outputs[ key ] = ''.join( nodeChunks )
+        return outputs
+
+    def cmdAll( self, cmd, nodes=None, timeout=None ):
+        """Run the same command on several nodes at once.
+           cmd: command string
+           nodes: (optional) list of nodes or node names; all hosts
+               by default
+           timeout: (optional) overall timeout in seconds
+           returns: dict of node -> output"""
+        if nodes is None:
+            nodes = self.hosts
+        return self.parallel( { node: cmd for node in nodes },
+                              timeout=timeout )
+
     # XXX These test methods should be moved out of this class.
     # Probably we should create a tests.py for them
 
@@ -760,6 +1190,8 @@ def ping( self, hosts=None, timeout=None, manualdestip=None ):
         if not hosts:
             hosts = self.hosts
             output( '*** Ping: testing ping reachability\n' )
+        if manualdestip is None:
+            results = self.pingResults( hosts, timeout=timeout )
         for node in hosts:
             output( '%s -> ' % node.name )
             if manualdestip is not None:
@@ -780,19 +1212,16 @@ def ping( self, hosts=None, timeout=None, manualdestip=None ):
             else:
                 for dest in hosts:
                     if node != dest:
-                        opts = ''
-                        if timeout:
-                            opts = '-W %s' % timeout
                         if dest.intfs:
-                            result = node.cmd( 'LANG=C ping -c1 %s %s' %
-                                                (opts, dest.IP()) )
-                            sent, received = self._parsePing( result )
+                            result = results.get( ( node, dest ),
+                                                  self._pingErrorTuple )
+                            sent, received = result[ :2 ]
                         else:
                             sent, received = 0, 0
                         packets += sent
                         if received > sent:
                             error( '*** Error: received too many packets' )
-                            error( '%s' % result )
+                            error( '%s' % ( result, ) )
                             node.cmdPrint( 'route' )
                             exit( 1 )
                         lost += sent - received
@@ -808,10 +1237,13 @@ def ping( self, hosts=None, timeout=None, manualdestip=None ):
             output( "*** Warning: No packets sent\n" )
         return ploss
 
+    # Result of a ping that failed or could not be parsed
+    _pingErrorTuple = ( 1, 0, 0, 0, 0, 0 )
+
     @staticmethod
     def _parsePingFull( pingOutput ):
         "Parse ping output and return all data."
-        errorTuple = (1, 0, 0, 0, 0, 0)
+        errorTuple = Mininet._pingErrorTuple
         # Check for downed link
         r = r'[uU]nreachable'
         m = re.search( r, pingOutput )
@@ -850,6 +1282,8 @@ def pingFull( self, hosts=None, timeout=None, manualdestip=None ):
         if not hosts:
             hosts = self.hosts
             output( '*** Ping: testing ping reachability\n' )
+        if manualdestip is None:
+            results = self.pingResults( hosts, timeout=timeout )
         for node in hosts:
             output( '%s -> ' % node.name )
             if manualdestip is not None:
@@ -865,11 +1299,8 @@ def pingFull( self, hosts=None, timeout=None, manualdestip=None ):
             else:
                 for dest in hosts:
                     if node != dest:
-                        opts = ''
-                        if timeout:
-                            opts = '-W %s' % timeout
-                        result = node.cmd( 'ping -c1 %s %s' % (opts, dest.IP()) )
-                        outputs = self._parsePingFull( result )
+                        outputs = results.get( ( node, dest ),
+                                               self._pingErrorTuple )
                         sent, received, rttmin, rttavg, rttmax, rttdev = outputs
                         all_outputs.append( (node, dest, outputs) )
                         output( ( '%s ' % dest.name ) if received else 'X ' )
@@ -882,6 +1313,92 @@ def pingFull( self, hosts=None, timeout=None, manualdestip=None ):
                     (rttmin, rttavg, rttmax, rttdev) )
         return all_outputs
 
+    # pingResults() runs this many sources at once, and each source
+    # this many pings at once
+    pingSourceProcs = 32
+    pingDestProcs = 32
+
+    def _pingScript( self, ips, timeout=None ):
+        """Return a shell script that pings all ips, pingDestProcs at a
+           time, and prints one line per ip: the ip, then the output
+           of its ping"""
+        opts = '-W %s ' % timeout if timeout else ''
+        # Unquoted $( ... ) joins the lines of ping's output
+        return ( 'n=0; for ip in %s; do '
+                 '( echo "$ip" $( LANG=C ping -c1 %s"$ip" 2>&1 ) ) & '
+                 'if [ $(( ++n %% %d )) -eq 0 ]; then wait; fi; '
+                 'done; wait' % ( ' '.join( ips ), opts,
+                                  self.pingDestProcs ) )
+
+    def pingResults( self, hosts=None, timeout=None ):
+        """Ping between all pairs of hosts concurrently: each source
+           pings all destinations at once from a single script, and
+           pingSourceProcs sources run in parallel.
+           hosts: list of hosts (all hosts by default)
+           timeout: time to wait for a response, as string
+           returns: dict of ( src, dst ) -> ( sent, received, rttmin,
+               rttavg, rttmax, rttdev ), for all pairs where dst has
+               an interface"""
+        hosts = hosts or self.hosts
+        ipToHosts = {}
+        for dst in hosts:
+            if dst.intfs:
+                ipToHosts.setdefault( dst.IP(), [] ).append( dst )
+        results = {}
+        pending = list( hosts )
+        running = {}  # fd -> src, popen, chunks
+        poller = select.poll()
+        while pending or running:
+            while pending and len( running ) < self.pingSourceProcs:
+                src = pending.pop( 0 )
+                ips = [ ip for ip, dsts in ipToHosts.items()
+                        if dsts != [ src ] ]
+                popen = src.popen( [ 'bash', '-c',
+                                     self._pingScript( ips, timeout ) ],
+                                   stderr=STDOUT ) if ips else None
+                if popen:
+                    running[ popen.stdout.fileno() ] = src, popen, []
+                    poller.register( popen.stdout, select.POLLIN )
+            for fd, _event in poller.poll():
+                src, popen, chunks = running[ fd ]
+                data = os.read( fd, 65536 )
+                if data:
+                    chunks.append( data )
+                    continue
+                poller.unregister( fd )
+                del running[ fd ]
+                popen.stdout.close()
+                popen.wait()
+                for line in decode( b''.join( chunks ) ).splitlines():
+                    ip, _, pingOutput = line.strip().partition( ' ' )
+                    for dst in ipToHosts.get( ip, [] ):
+                        if dst != src:
+                            results[ src, dst ] = self._parsePingFull(
+                                pingOutput )
+        return results
+
+    def pingMatrix( self, hosts=None, timeout=None ):
+        """Ping between all pairs of hosts concurrently.
+           hosts: list of hosts (all hosts by default)
+           timeout: time to wait for a response, as string
+           returns: hosts, loss, rtt: loss[ i ][ j ] is the fraction
+               of pings from hosts[ i ] to hosts[ j ] that were lost,
+               rtt[ i ][ j ] their average rtt in ms; both are None
+               where nothing was sent, and rtt is None without reply"""
+        hosts = hosts or self.hosts
+        results = self.pingResults( hosts, timeout=timeout )
+        loss, rtt = [], []
+        for src in hosts:
+            loss.append( [] )
+            rtt.append( [] )
+            for dst in hosts:
+                sent, received, _rttmin, rttavg, _rttmax, _rttdev = (
+                    results.get( ( src, dst ), ( 0, 0, 0, 0, 0, 0 ) ) )
+                loss[ -1 ].append( 1.0 - float( received ) / sent
+                                   if sent else None )
+                rtt[ -1 ].append( rttavg if received else None )
+        return hosts, loss, rtt
+
     def pingAll( self, timeout=None ):
         """Ping between all hosts.
            returns: ploss packet loss percentage"""
@@ -1067,7 +1584,12 @@ class Containernet( Mininet ):
     This class is not more than API beautification.
     """
 
-    def __init__(self, **params):
+    def __init__(self, dockerThreads=16, **params):
+        """dockerThreads: number of containers that addDockers() and
+               build() create and start at once (1: one at a time)
+           params: Mininet parameters"""
+        # Set before Mininet.__init__, which may build the network
+        self.dockerThreads = dockerThreads
         # call original Mininet.__init__ with build=False
         # still provide any topo objects and init node lists
         Mininet.__init__(self, **params)
@@ -1080,6 +1602,71 @@ def addDocker( self, name, cls=Docker, **params ):
         """
         return self.addHost( name, cls=cls, **params)
 
+    @staticmethod
+    def _isDocker( cls ):
+        "Is cls (or the class that a partial() creates) a Docker class?"
+        while isinstance( cls, partial ):
+            cls = cls.func
+        return isinstance( cls, type ) and issubclass( cls, Docker )
+
+    def _newHost( self, name, cls, params ):
+        "Create a host, timed per class as by addHost()"
+        with self.timings.span( 'addHosts', cls ):
+            return cls( name, **params )
+
+    def addDockers( self, dockers, cls=Docker, **params ):
+        """Add several Docker containers as hosts. Up to dockerThreads
+           containers are created and started at once, and their
+           shells are awaited together once all of them are up.
+           Hosts of other classes are created one at a time meanwhile.
+           dockers: list of names or ( name, params ) tuples; params
+               may include cls
+           cls: default host class (Docker)
+           params: parameters for all containers
+           returns: list of added hosts"""
+        specs = []
+        for docker in dockers:
+            name, dockerParams = docker if isinstance( docker, tuple ) else (
+                docker, {} )
+            options = dict( params, waitPrompt=False )
+            options.update( dockerParams )
+            hostCls = options.pop( 'cls', None ) or cls or self.host
+            # IPs, MACs and cores are assigned in order, as by addHost()
+            specs.append( ( name, hostCls, self._hostParams( options ) ) )
+        nodes, errors = {}, []
+        with self.timings.span( 'addHosts', count=len( specs ) ):
+            with ThreadPoolExecutor( max( self.dockerThreads, 1 ) ) as pool:
+                futures = {}
+                for name, hostCls, options in specs:
+                    if self._isDocker( hostCls ) and self.dockerThreads > 1:
+                        futures[ name ] = pool.submit( self._newHost, name,
+                                                       hostCls, options )
+                        continue
+                    try:
+                        nodes[ name ] = self._newHost( name, hostCls, options )
+                    except Exception as e:  # pylint: disable=broad-except
+                        errors.append( e )
+                for name, future in futures.items():
+                    try:
+                        nodes[ name ] = future.result()
+                    except Exception as e:  # pylint: disable=broad-except
+                        errors.append( e )
+        # Keep the hosts that we created, so that stop() removes them
+        added = [ nodes[ name ] for name, _cls, _options in specs
+                  if name in nodes ]
+        for host in added:
+            self.hosts.append( host )
+            self.nameToNode[ host.name ] = host
+        self.finishShells( added )
+        if errors:
+            raise errors[ 0 ]
+        return added
+
+    def _addTopoHosts( self, hosts ):
+        "Add the hosts of a topology, creating containers concurrently"
+        for host in self.addDockers( hosts, cls=self.host ):
+            info( host.name + ' ' )
+
     def removeDocker( self, name, **params):
         """
         Wrapper for removeHost. Just to be complete.
@@ -57,12 +57,12 @@
 import re
 import signal
 import select
-import docker
+from concurrent.futures import ThreadPoolExecutor
 import json
-from distutils.version import StrictVersion
 from re import findall
 from subprocess import Popen, PIPE, check_output
 from sys import exit  # pylint: disable=redefined-builtin
+from threading import Lock, Thread
 from time import sleep
 
 from mininet.log import info, error, warn, debug
@@ -71,6 +71,8 @@
                            encode, getincrementaldecoder, Python3, which )
 from mininet.moduledeps import moduleDeps, pathCheck, TUN
 from mininet.link import Link, Intf, TCIntf, OVSIntf
+from mininet.ovsdb import OVSDB, OVSDBError, ovsSet, ovsMap, ovsUUIDs
+from mininet.clean import addCleanupCallback
 
 
 # pylint: disable=too-many-arguments
@@ -82,10 +84,22 @@ class Node( object ):
 
     portBase = 0  # Nodes always start with eth0/port0, even in OF 1.0
 
+    # Maximum number of bytes to read from the shell at once
+    readSize = 65536
+    # Seconds that acmd() waits for a command that it has interrupted
+    interruptGrace = 5
+    # monitor() looks for these in every chunk of output, so compile them once
+    jobPidRe = re.compile( rb'\[\d+\] \d+\r\n' )
+    pidMarkerRe = re.compile( rb'\x01(\d+)\r\n' )
+    # Run in every new shell; +m: disable job control notification
+    shellInit = 'unset HISTFILE; stty -echo; set +m'
+
     def __init__( self, name, inNamespace=True, **params ):
         """name: name of node
            inNamespace: in network namespace?
            privateDirs: list of private directory strings or tuples
+           waitPrompt: wait for the shell to start? (True) If False,
+               the shell starts in the background; see finishStartShell()
            params: Node parameters (see config() for details)"""
 
         # Make sure class actually works
@@ -108,6 +122,10 @@ def __init__( self, name, inNamespace=True, **params ):
         # todo: replace with Port objects, eventually ?
         self.ports = {}
 
+        # Lowest and highest port in self.intfs, updated by addIntf()
+        # and recomputed only when one of them goes away
+        self.minPort = self.maxPort = None
+
         self.nameToIntf = {}  # dict of interface names to Intfs
 
         # Make pylint happy
@@ -115,7 +133,12 @@ def __init__( self, name, inNamespace=True, **params ):
             self.lastPid, self.lastCmd, self.pollOut ) = (
                 None, None, None, None, None, None, None, None )
         self.waiting = False
-        self.readbuf = ''
+        # Shell has been spawned, but finishStartShell() hasn't run yet
+        self.starting = False
+        # Commands recorded by startRecording(), or None
+        self.recorded = None
+        # Raw bytes that have been read from the shell, but not returned yet
+        self.readbuf = bytearray()
 
         # Incremental decoder for buffered reading
         self.decoder = getincrementaldecoder()
@@ -178,16 +201,24 @@ def startShell( self, mnopts=None ):
         self.execed = False
         self.lastCmd = None
         self.lastPid = None
-        self.readbuf = ''
-        # Wait for prompt
-        while True:
-            data = self.read( 1024 )
-            if data[ -1 ] == chr( 127 ):
-                break
-            self.pollOut.poll()
-        self.waiting = False
-        # +m: disable job control notification
-        self.cmd( 'unset HISTFILE; stty -echo; set +m' )
+        self.readbuf = bytearray()
+        # The prompt is our sentinel, so we wait for it like for the
+        # output of a command
+        self.waiting = True
+        self.starting = True
+        if self.params.get( 'waitPrompt', True ):
+            self.finishStartShell()
+
+    def finishStartShell( self ):
+        """Wait for the shell spawned by startShell() to come up, and
+           initialize it. Nodes created with waitPrompt=False do this
+           when they run their first command, or all at once in
+           Mininet.finishShells()."""
+        if not self.starting:
+            return
+        self.waitOutput()
+        self.starting = False
+        self.cmd( self.shellInit )
 
     def mountPrivateDirs( self ):
         "mount private directories"
@@ -251,33 +282,45 @@ def cleanup( self ):
 
     # Subshell I/O, commands and control
 
+    def _fill( self ):
+        """Read whatever the shell has written into readbuf, potentially
+           blocking. Only reads if readbuf is empty.
+           returns: number of bytes now available"""
+        if not self.readbuf:
+            # This line blocks if you try to reuse the shell
+            self.readbuf += os.read( self.stdout.fileno(), self.readSize )
+        return len( self.readbuf )
+
+    def _readBytes( self ):
+        "Return and consume all buffered bytes, reading if necessary."
+        self._fill()
+        data = bytes( self.readbuf )
+        self.readbuf.clear()
+        return data
+
     def read( self, size=1024 ):
         """Buffered read from node, potentially blocking.
-           size: maximum number of characters to return"""
-        count = len( self.readbuf )
-        if count < size:
-            data = os.read( self.stdout.fileno(), size - count ) # This line blocks if you try to reuse the shell
-            self.readbuf += self.decoder.decode( data )
-        if size >= len( self.readbuf ):
-            result = self.readbuf
-            self.readbuf = ''
-        else:
-            result = self.readbuf[ :size ]
-            self.readbuf = self.readbuf[ size: ]
-        return result
+           size: maximum number of bytes to return"""
+        self._fill()
+        data = bytes( self.readbuf[ :size ] )
+        # Deleting from the front of a bytearray doesn't copy the rest
+        del self.readbuf[ :size ]
+        return self.decoder.decode( data )
 
     def readline( self ):
         """Buffered readline from node, potentially blocking.
            returns: line (minus newline) or None"""
-
-        self.readbuf += self.read( 1024 )
-
-        if '\n' not in self.readbuf:
-            return None
-        pos = self.readbuf.find( '\n' )
-        line = self.readbuf[ 0: pos ]
-        self.readbuf = self.readbuf[ pos + 1: ]
-        return line
+        pos = self.readbuf.find( b'\n' )
+        if pos < 0:
+            # Only scan what we haven't scanned yet
+            start = len( self.readbuf )
+            self.readbuf += os.read( self.stdout.fileno(), self.readSize )
+            pos = self.readbuf.find( b'\n', start )
+            if pos < 0:
+                return None
+        line = bytes( self.readbuf[ :pos ] )
+        del self.readbuf[ :pos + 1 ]
+        return self.decoder.decode( line )
 
     def write( self, data ):
         """Write data to node.
@@ -286,6 +329,11 @@ def write( self, data ):
 
     def terminate( self ):
         "Send kill signal to Node and clean up after it."
+        self.hangup()
+        self.cleanup()
+
+    def hangup( self ):
+        "Unmount private directories and send kill signal to our shell"
         self.unmountPrivateDirs()
         if self.shell:
             if self.shell.poll() is None:
@@ -294,7 +342,18 @@ def terminate( self ):
                 # If a command starts just one process, its PID and PGID are the same.
                 os.killpg( self.shell.pid, signal.SIGHUP )
 
-        self.cleanup()
+    @classmethod
+    def batchTerminate( cls, nodes ):
+        """Terminate nodes, signaling all of them before waiting for
+           any, so that their shells exit (and their namespaces and
+           interfaces go away) in parallel
+           nodes: nodes to terminate
+           returns: nodes"""
+        for node in nodes:
+            node.hangup()
+        for node in nodes:
+            node.cleanup()
+        return nodes
 
     def stop( self, deleteIntfs=False ):
         """Stop node.
@@ -311,11 +370,30 @@ def waitReadable( self, timeoutms=None ):
             return self.pollOut.poll( timeoutms )
         return None
 
+    @staticmethod
+    def _cmdString( *args ):
+        """Internal method: return the command line for cmd() args
+           args: command and arguments, list, or string"""
+        # Allow sendCmd( [ list ] )
+        if len( args ) == 1 and isinstance( args[ 0 ], list ):
+            cmd = args[ 0 ]
+        # Allow sendCmd( cmd, arg1, arg2... )
+        elif len( args ) > 0:
+            cmd = args
+        # Convert to string
+        if not isinstance( cmd, str ):
+            cmd = ' '.join( [ str( c ) for c in cmd ] )
+        if not re.search( r'\w', cmd ):
+            # Replace empty commands with something harmless
+            cmd = 'echo -n'
+        return cmd
+
     def sendCmd( self, *args, **kwargs ):
         """Send a command, followed by a command to echo a sentinel,
            and return without waiting for the command to complete.
            args: command and arguments, or string
            printPid: print command's PID? (False)"""
+        self.finishStartShell()
         # be a bit more relaxed here and allow to wait 120s for the shell
         cnt = 0
         while (self.waiting and cnt < 5 * 120):
@@ -327,18 +405,7 @@ def sendCmd( self, *args, **kwargs ):
                  .format(float(cnt)/5))
         assert self.shell and not self.waiting
         printPid = kwargs.get( 'printPid', False )
-        # Allow sendCmd( [ list ] )
-        if len( args ) == 1 and isinstance( args[ 0 ], list ):
-            cmd = args[ 0 ]
-        # Allow sendCmd( cmd, arg1, arg2... )
-        elif len( args ) > 0:
-            cmd = args
-        # Convert to string
-        if not isinstance( cmd, str ):
-            cmd = ' '.join( [ str( c ) for c in cmd ] )
-        if not re.search( r'\w', cmd ):
-            # Replace empty commands with something harmless
-            cmd = 'echo -n'
+        cmd = self._cmdString( *args )
         self.lastCmd = cmd
         # if a builtin command is backgrounded, it still yields a PID
         if len( cmd ) > 0 and cmd[ -1 ] == '&':
@@ -362,31 +429,52 @@ def monitor( self, timeoutms=None, findPid=True ):
            timeoutms: timeout in ms or None to wait indefinitely
            findPid: look for PID from mnexec -p"""
         ready = self.waitReadable( timeoutms )
-        if not ready:
+        if not ready and not self.readbuf:
             return ''
-        data = self.read( 1024 )
-        pidre = r'\[\d+\] \d+\r\n'
+        data = self._readBytes()
         # Look for PID
-        marker = chr( 1 ) + r'\d+\r\n'
-        if findPid and chr( 1 ) in data:
+        if findPid and b'\x01' in data:
             # suppress the job and PID of a backgrounded command
-            if re.findall( pidre, data ):
-                data = re.sub( pidre, '', data )
+            data = self.jobPidRe.sub( b'', data )
             # Marker can be read in chunks; continue until all of it is read
-            while not re.findall( marker, data ):
-                data += self.read( 1024 )
-            markers = re.findall( marker, data )
-            if markers:
-                self.lastPid = int( markers[ 0 ][ 1: ] )
-                data = re.sub( marker, '', data )
+            start = data.find( b'\x01' )
+            while not self.pidMarkerRe.search( data, start ):
+                data += self._readBytes()
+            marker = self.pidMarkerRe.search( data, start )
+            self.lastPid = int( marker.group( 1 ) )
+            data = self.pidMarkerRe.sub( b'', data )
+        return self._endOutput( data )
+
+    def _endOutput( self, data ):
+        """Internal method: remove the sentinel from data, and decode it.
+           Set self.waiting to False if command has completed."""
         # Look for sentinel/EOF
-        if len( data ) > 0 and data[ -1 ] == chr( 127 ):
+        if len( data ) > 0 and data[ -1 ] == 127:
             self.waiting = False
             data = data[ :-1 ]
-        elif chr( 127 ) in data:
+        elif b'\x7f' in data:
             self.waiting = False
-            data = data.replace( chr( 127 ), '' )
-        return data
+            data = data.replace( b'\x7f', b'' )
+        return self.decoder.decode( data )
+
+    def _takeOutput( self, findPid=True ):
+        """Internal method: like monitor(), but return only the output
+           in readbuf and never block; an incomplete PID marker is
+           left in readbuf until the rest of it arrives.
+           findPid: look for PID from mnexec -p"""
+        data = bytes( self.readbuf )
+        self.readbuf.clear()
+        if findPid and b'\x01' in data:
+            data = self.jobPidRe.sub( b'', data )
+            start = data.find( b'\x01' )
+            marker = self.pidMarkerRe.search( data, start )
+            if not marker:
+                self.readbuf += data[ start: ]
+                data = data[ :start ]
+            else:
+                self.lastPid = int( marker.group( 1 ) )
+                data = self.pidMarkerRe.sub( b'', data )
+        return self._endOutput( data )
 
     def waitOutput( self, verbose=False, findPid=True ):
         """Wait for a command to complete.
@@ -395,16 +483,19 @@ def waitOutput( self, verbose=False, findPid=True ):
            the output, including trailing newline.
            verbose: print output interactively"""
         log = info if verbose else debug
-        output = ''
+        output = []
         while self.waiting:
             data = self.monitor( findPid=findPid )
-            output += data
+            output.append( data )
             log( data )
-        return output
+        return ''.join( output )
 
     def cmd( self, *args, **kwargs ):
         """Send a command, wait for output, and return it.
            cmd: string"""
+        if self.recorded is not None:
+            self.recorded.append( self._cmdString( *args ) )
+            return ''
         verbose = kwargs.get( 'verbose', False )
         log = info if verbose else debug
         log( '*** %s : %s\n' % ( self.name, args ) )
@@ -420,15 +511,28 @@ def cmd( self, *args, **kwargs ):
             warn( '(%s exited - ignoring cmd%s)\n' % ( self, args ) )
         return None
 
+    def startRecording( self ):
+        """Record the commands of cmd() instead of running them, e.g.
+           to send a whole configuration in a single round trip.
+           While recording, cmd() returns ''."""
+        self.recorded = []
+
+    def stopRecording( self ):
+        """Stop recording commands.
+           returns: recorded commands as a single command line"""
+        cmds, self.recorded = self.recorded or [], None
+        return ' '.join( cmd if cmd.rstrip().endswith( '&' ) else cmd + ';'
+                         for cmd in cmds )
+
     def cmdPrint( self, *args):
         """Call cmd and printing its output
            cmd: string"""
         return self.cmd( *args, **{ 'verbose': True } )
 
-    def popen( self, *args, **kwargs ):
-        """Return a Popen() object in our namespace
-           args: Popen() args, single list, or string
-           kwargs: Popen() keyword args"""
+    def _popenArgs( self, *args, **kwargs ):
+        """Internal method: build the command line and keyword args
+           for popen() and apopen()
+           returns: cmd (list), params"""
         defaults = { 'stdout': PIPE, 'stderr': PIPE,
                      'mncmd':
                      [ 'mnexec', '-da', str( self.pid ) ] }
@@ -450,7 +554,14 @@ def popen( self, *args, **kwargs ):
             cmd = [ os.environ[ 'SHELL' ], '-c' ] + [ ' '.join( cmd ) ]
         # Attach to our namespace  using mnexec -a
         cmd = defaults.pop( 'mncmd' ) + cmd
-        popen = self._popen( cmd, **defaults )
+        return cmd, defaults
+
+    def popen( self, *args, **kwargs ):
+        """Return a Popen() object in our namespace
+           args: Popen() args, single list, or string
+           kwargs: Popen() keyword args"""
+        cmd, params = self._popenArgs( *args, **kwargs )
+        popen = self._popen( cmd, **params )
         return popen
 
     def pexec( self, *args, **kwargs ):
@@ -463,6 +574,148 @@ def pexec( self, *args, **kwargs ):
         exitcode = popen.wait()
         return decode( out ), decode( err ), exitcode
 
+    # Asyncio command support: the same sentinel protocol as cmd(),
+    # but waiting in the event loop instead of in poll(). asyncio is
+    # imported by these methods, as their callers have imported it
+    # already, and most scripts never do
+
+    async def _aoutput( self, onData ):
+        """Internal method: pass the output of the running command to
+           onData as it arrives, until the command completes.
+           Output is handed over from the reader callback itself, so
+           none of it is lost if we are cancelled."""
+        import asyncio
+        if self.waiting and self.readbuf:
+            # Output that monitor() or readline() have buffered, which
+            # may already include the sentinel, won't make fd readable
+            data = self._takeOutput()
+            if data:
+                onData( data )
+        if not self.waiting:
+            return
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        fd = self.stdout.fileno()
+
+        def readable():
+            # A single read, as the fd is readable: monitor() could
+            # block the event loop waiting for the rest of a PID marker
+            try:
+                data = os.read( fd, self.readSize )
+                if not data:
+                    raise OSError( errno.EIO, 'EOF from shell' )
+                self.readbuf += data
+                data = self._takeOutput()
+            except OSError as e:
+                # The shell has gone away
+                self.waiting = False
+                loop.remove_reader( fd )
+                if not done.done():
+                    done.set_exception( e )
+                return
+            if data:
+                onData( data )
+            if not self.waiting:
+                loop.remove_reader( fd )
+                if not done.done():
+                    done.set_result( None )
+
+        loop.add_reader( fd, readable )
+        try:
+            await done
+        finally:
+            loop.remove_reader( fd )
+
+    async def astream( self, *args, **kwargs ):
+        """Send a command, and asynchronously yield its output as it
+           arrives, until the command completes. Leaving the loop early
+           leaves the command running; interrupt it with sendInt() and
+           collect the rest with awaitOutput().
+           args: command and arguments, or string
+           printPid: print command's PID? (False)"""
+        import asyncio
+        self.sendCmd( *args, **kwargs )
+        chunks = asyncio.Queue()
+        reader = asyncio.ensure_future( self._aoutput( chunks.put_nowait ) )
+        reader.add_done_callback( lambda _reader: chunks.put_nowait( None ) )
+        try:
+            while True:
+                data = await chunks.get()
+                if data is None:
+                    break
+                yield data
+            # Raise errors of the reader, if any
+            await reader
+        finally:
+            if not reader.done():
+                reader.cancel()
+
+    async def awaitOutput( self, verbose=False ):
+        """Asynchronous waitOutput(): wait for the running command to
+           complete and return its output.
+           verbose: print output interactively"""
+        log = info if verbose else debug
+        output = []
+
+        def onData( data ):
+            output.append( data )
+            log( data )
+
+        await self._aoutput( onData )
+        return ''.join( output )
+
+    async def acmd( self, *args, **kwargs ):
+        """Asynchronous cmd(): send a command and return its output,
+           without blocking the event loop.
+           args: command and arguments, or string
+           timeout: (optional) seconds after which the command is
+               interrupted; its output so far is returned. If it is
+               not back at the prompt interruptGrace seconds later,
+               the shell is hung up on
+           verbose: print output interactively"""
+        import asyncio
+        timeout = kwargs.pop( 'timeout', None )
+        verbose = kwargs.get( 'verbose', False )
+        log = info if verbose else debug
+        log( '*** %s : %s\n' % ( self.name, args ) )
+        if not self.shell:
+            warn( '(%s exited - ignoring cmd%s)\n' % ( self, args ) )
+            return None
+        self.sendCmd( *args, **kwargs )
+        output = []
+
+        def onData( data ):
+            output.append( data )
+            log( data )
+
+        try:
+            await asyncio.wait_for( self._aoutput( onData ), timeout )
+        except asyncio.TimeoutError:
+            warn( '*** %s: interrupting %s after %s seconds\n' %
+                  ( self.name, self.lastCmd, timeout ) )
+            self.sendInt()
+            try:
+                await asyncio.wait_for( self._aoutput( onData ),
+                                        self.interruptGrace )
+            except asyncio.TimeoutError:
+                # The command ignores SIGINT, or the shell is wedged
+                warn( '*** %s: hanging up on %s\n' %
+                      ( self.name, self.lastCmd ) )
+                self.hangup()
+                self.waiting = False
+        return ''.join( output )
+
+    async def apopen( self, *args, **kwargs ):
+        """Asynchronous popen(): return an asyncio Process in our
+           namespace
+           args: command and arguments, single list, or string
+           kwargs: asyncio.create_subprocess_exec() keyword args"""
+        import asyncio
+        cmd, params = self._popenArgs( *args, **kwargs )
+        process = await asyncio.create_subprocess_exec( *cmd, **params )
+        debug( '_apopen', cmd, process.pid )
+        return process
+
     # Interface management, configuration, and routing
 
     # BL notes: This might be a bit redundant or over-complicated.
@@ -471,10 +724,19 @@ def pexec( self, *args, **kwargs ):
     # the real interfaces are created as veth pairs, so we can't
     # make a single interface at a time.
 
+    def updatePortRange( self ):
+        """Recompute minPort and maxPort if their interfaces have been
+           deleted (by delIntf() or otherwise)"""
+        if self.minPort not in self.intfs or self.maxPort not in self.intfs:
+            ports = self.intfs.keys()
+            self.minPort = min( ports ) if ports else None
+            self.maxPort = max( ports ) if ports else None
+
     def newPort( self ):
         "Return the next port number to allocate."
-        if len( self.ports ) > 0:
-            return max( self.ports.values() ) + 1
+        self.updatePortRange()
+        if self.maxPort is not None:
+            return self.maxPort + 1
         return self.portBase
 
     def addIntf( self, intf, port=None, moveIntfFn=moveIntf ):
@@ -487,6 +749,10 @@ def addIntf( self, intf, port=None, moveIntfFn=moveIntf ):
         self.intfs[ port ] = intf
         self.ports[ intf ] = port
         self.nameToIntf[ intf.name ] = intf
+        if self.minPort is None or port < self.minPort:
+            self.minPort = port
+        if self.maxPort is None or port > self.maxPort:
+            self.maxPort = port
         debug( '\n' )
         debug( 'added intf %s (%d) to node %s\n' % (
                 intf, port, self.name ) )
@@ -505,9 +771,9 @@ def delIntf( self, intf ):
 
     def defaultIntf( self ):
         "Return interface for lowest port"
-        ports = self.intfs.keys()
-        if ports:
-            return self.intfs[ min( ports ) ]
+        self.updatePortRange()
+        if self.minPort is not None:
+            return self.intfs[ self.minPort ]
         else:
             warn( '*** defaultIntf: warning:', self.name,
                   'has no interfaces\n' )
@@ -611,6 +877,35 @@ def intfIsUp( self, intf=None ):
         "Check if an interface is up."
         return self.intf( intf ).isUp()
 
+    def updateIntfs( self, addrs=None ):
+        """Update IP and MAC addresses of all interfaces at once.
+           addrs: output of ip -j address show (optional; run if None)
+           returns: True if the addresses could be parsed"""
+        if addrs is None:
+            addrs = self.cmd( 'ip -j address show' )
+        # Ignore any output that precedes the JSON line
+        lines = addrs.strip().splitlines()
+        try:
+            entries = json.loads( lines[ -1 ] ) if lines else None
+        except ValueError:
+            entries = None
+        if not isinstance( entries, list ):
+            debug( '*** %s: cannot parse addresses: %s\n' % ( self, addrs ) )
+            return False
+        for entry in entries:
+            intf = self.nameToIntf.get( entry.get( 'ifname' ) )
+            if intf is None:
+                continue
+            intf.mac = entry.get( 'address', intf.mac )
+            inet = [ addr for addr in entry.get( 'addr_info', [] )
+                     if addr.get( 'family' ) == 'inet' ]
+            if inet:
+                intf.ip = inet[ 0 ][ 'local' ]
+                intf.prefixLen = inet[ 0 ][ 'prefixlen' ]
+            else:
+                intf.ip = None
+        return True
+
     # The reason why we configure things in this way is so
     # That the parameters can be listed and documented in
     # the config method.
@@ -721,6 +1016,94 @@ class Docker ( Host ):
     We use the docker-py client library to control docker.
     """
 
+    # Image -> lock held while checking for or pulling it, so that
+    # containers that are created at once pull each image only once
+    imageLocks = {}
+    # Image -> inspect_image() result
+    imageInfo = {}
+    # Docker client that all containers share, see getClient()
+    dockerClient = None
+    clientLock = Lock()
+    # Connections that the shared client keeps open; enough for the
+    # threads of addDockers() and batchTerminate()
+    clientPoolSize = 32
+    # Container Id -> whether it runs, as seen on the docker events
+    # stream; None while the stream is not available
+    containerStates = None
+    # Events that start or stop a container
+    eventStates = { 'start': True, 'unpause': True,
+                    'die': False, 'pause': False, 'destroy': False }
+
+    @classmethod
+    def imageLock( cls, image ):
+        "Return the lock of image"
+        # dict.setdefault() is atomic
+        return cls.imageLocks.setdefault( image, Lock() )
+
+    @classmethod
+    def getClient( cls ):
+        """Return the docker client that all containers share, and
+           start watching container events when it is created"""
+        with cls.clientLock:
+            if cls.dockerClient is None:
+                # the docker SDK takes long to import, so only
+                # containers load it
+                import docker
+                from inspect import signature
+                params = {}
+                # Older docker SDKs, such as the 4.1.0 that setup.py
+                # allows, have no max_pool_size and a fixed pool size
+                if 'max_pool_size' in signature(
+                        docker.APIClient ).parameters:
+                    params[ 'max_pool_size' ] = cls.clientPoolSize
+                cls.dockerClient = docker.from_env( **params )
+                cls.watchContainers()
+        return cls.dockerClient
+
+    @classmethod
+    def watchContainers( cls ):
+        """Track the state of our containers from the docker events
+           stream, so that we need not ask docker for it"""
+        try:
+            # The request is made here, so we see the events of all
+            # containers that are created from now on
+            events = cls.dockerClient.api.events(
+                decode=True, filters={ 'type': 'container',
+                                       'label': 'com.containernet' } )
+        except Exception as e:  # pylint: disable=broad-except
+            warn( '*** Cannot watch docker events: %s\n' % e )
+            return
+        cls.containerStates = {}
+        Thread( target=cls._followEvents, args=( events, ),
+                daemon=True ).start()
+
+    @classmethod
+    def _followEvents( cls, events ):
+        "Update containerStates from events until the stream ends"
+        try:
+            for event in events:
+                running = cls.eventStates.get( event.get( 'Action' ) )
+                if running is not None:
+                    cls.containerStates[
+                        event.get( 'Actor', {} ).get( 'ID' ) ] = running
+        except Exception as e:  # pylint: disable=broad-except
+            debug( '*** Docker events stream failed: %s\n' % e )
+        # States would go stale from now on, so we poll again
+        cls.containerStates = None
+        with cls.clientLock:
+            cls.dockerClient = None
+
+    @classmethod
+    def inspectImage( cls, image ):
+        """Return the inspect_image() result of image, which is
+           cached for all containers
+           image: image name or Id"""
+        imgd = cls.imageInfo.get( image )
+        if imgd is None:
+            imgd = cls.getClient().api.inspect_image( image )
+            cls.imageInfo[ image ] = imgd
+        return imgd
+
     def __init__(self, name, dimage=None, dcmd=None, build_params={},
                  **kwargs):
         """
@@ -802,8 +1185,7 @@ def __init__(self, name, dimage=None, dcmd=None, build_params={},
         self.storage_opt = defaults['storage_opt']
 
         # setup docker client
-        # self.dcli = docker.APIClient(base_url='unix://var/run/docker.sock')
-        self.d_client = docker.from_env()
+        self.d_client = self.getClient()
         self.dcli = self.d_client.api
 
         _id = None
@@ -819,7 +1201,8 @@ def __init__(self, name, dimage=None, dcmd=None, build_params={},
             info(output)
 
         # pull image if it does not exist
-        self._check_image_exists(dimage, True, _id=None)
+        with self.imageLock(dimage):
+            self._check_image_exists(dimage, True, _id=None)
 
         # for DEBUG
         debug("Created docker container object %s\n" % name)
@@ -883,6 +1266,11 @@ def __init__(self, name, dimage=None, dcmd=None, build_params={},
         # fetch information about new container
         self.dcinfo = self.dcli.inspect_container(self.dc)
         self.did = self.dcinfo.get("Id")
+        states = self.containerStates
+        if states is not None:
+            # Events that we have seen meanwhile are newer than dcinfo
+            states.setdefault(
+                self.did, self.dcinfo.get("State", {}).get("Running", False))
 
         # call original Node.__init__
         Host.__init__(self, name, **kwargs)
@@ -895,6 +1283,8 @@ def __init__(self, name, dimage=None, dcmd=None, build_params={},
 
     def build(self, **kwargs):
         image, output = self.d_client.images.build(**kwargs)
+        # the tag now names the new image
+        self.imageInfo.pop(kwargs.get("tag"), None)
         output_str = parse_build_output(output)
         return image.id, output_str
 
@@ -930,13 +1320,14 @@ def get_cmd_field(self, imagename):
         anyhow.
         """
         try:
-            imgd = self.dcli.inspect_image(imagename)
+            imgd = self.inspectImage(imagename)
             cmd = imgd.get("Config", {}).get("Cmd")
             assert isinstance(cmd, list)
             # filter the default case: a single "/bin/bash"
             if "/bin/bash" in cmd and len(cmd) == 1:
                 return None
-            return cmd
+            # copy, since start() changes it
+            return list(cmd)
         except BaseException as ex:
             error("Error during image inspection of {}:{}"
                   .format(imagename, ex))
@@ -949,11 +1340,11 @@ def get_entrypoint_field(self, imagename):
         Returns list or None.
         """
         try:
-            imgd = self.dcli.inspect_image(imagename)
+            imgd = self.inspectImage(imagename)
             ep = imgd.get("Config", {}).get("Entrypoint")
             if isinstance(ep, list) and len(ep) < 1:
                 return None
-            return ep
+            return list(ep) if isinstance(ep, list) else ep
         except BaseException as ex:
             error("Error during image inspection of {}:{}"
                   .format(imagename, ex))
@@ -994,16 +1385,13 @@ def startShell( self, *args, **kwargs ):
         self.execed = False
         self.lastCmd = None
         self.lastPid = None
-        self.readbuf = ''
-        # Wait for prompt
-        while True:
-            data = self.read( 1024 )
-            if data[ -1 ] == chr( 127 ):
-                break
-            self.pollOut.poll()
-        self.waiting = False
-        # +m: disable job control notification
-        self.cmd( 'unset HISTFILE; stty -echo; set +m' )
+        self.readbuf = bytearray()
+        # The prompt is our sentinel, so we wait for it like for the
+        # output of a command
+        self.waiting = True
+        self.starting = True
+        if self.params.get( 'waitPrompt', True ):
+            self.finishStartShell()
 
     def _get_volume_mount_name(self, volume_str):
         """ Helper to extract mount names from volume specification strings """
@@ -1012,14 +1400,31 @@ def _get_volume_mount_name(self, volume_str):
             return None
         return parts[1]
 
+    # Number of containers that batchTerminate() removes at once
+    terminateThreads = 16
+
+    @classmethod
+    def batchTerminate( cls, nodes ):
+        "Remove the containers of nodes concurrently"
+        with ThreadPoolExecutor( cls.terminateThreads ) as pool:
+            for future in [ pool.submit( node.terminate )
+                            for node in nodes ]:
+                future.result()
+        return nodes
+
     def terminate( self ):
         """ Stop docker container """
         if not self._is_container_running():
             return
+        import docker
         try:
             self.dcli.remove_container(self.dc, force=True, v=True)
         except docker.errors.APIError as e:
             warn("Warning: API error during container removal.\n")
+        states = self.containerStates
+        if states is not None:
+            # don't wait for the events to tell us
+            states[self.did] = False
 
         self.cleanup()
 
@@ -1031,6 +1436,13 @@ def sendCmd( self, *args, **kwargs ):
             return
         Host.sendCmd( self, *args, **kwargs )
 
+    def _popenArgs( self, *args, **kwargs ):
+        "Run popen() and apopen() commands via docker exec"
+        # with a tty, docker exec would not pass our stdin on
+        opt = "-i" if kwargs.get("stdin") is not None else "-t"
+        mncmd = ["docker", "exec", opt, "%s.%s" % (self.dnameprefix, self.name)]
+        return Host._popenArgs( self, *args, mncmd=mncmd, **kwargs )
+
     def popen( self, *args, **kwargs ):
         """Return a Popen() object in node's namespace
            args: Popen() args, single list, or string
@@ -1038,12 +1450,23 @@ def popen( self, *args, **kwargs ):
         if not self._is_container_running():
             error( "ERROR: Can't connect to Container \'%s\'' for docker host \'%s\'!\n" % (self.did, self.name) )
             return
-        mncmd = ["docker", "exec", "-t", "%s.%s" % (self.dnameprefix, self.name)]
-        return Host.popen( self, *args, mncmd=mncmd, **kwargs )
+        return Host.popen( self, *args, **kwargs )
+
+    async def apopen( self, *args, **kwargs ):
+        """Return an asyncio Process in node's namespace
+           args: command and arguments, single list, or string
+           kwargs: asyncio.create_subprocess_exec() keyword args"""
+        if not self._is_container_running():
+            error( "ERROR: Can't connect to Container \'%s\'' for docker host \'%s\'!\n" % (self.did, self.name) )
+            return
+        return await Host.apopen( self, *args, **kwargs )
 
     def cmd(self, *args, **kwargs ):
         """Send a command, wait for output, and return it.
            cmd: string"""
+        if self.recorded is not None:
+            self.recorded.append( self._cmdString( *args ) )
+            return ''
         verbose = kwargs.get( 'verbose', False )
         log = info if verbose else debug
         log( '*** %s : %s\n' % ( self.name, args ) )
@@ -1077,6 +1500,9 @@ def _check_shell(self):
 
     def _is_container_running(self):
         """Verify if container is alive"""
+        states = self.containerStates
+        if states is not None and self.did in states:
+            return states[self.did]
         container_list = self.dcli.containers(filters={"id": self.did, "status": "running"})
         if len(container_list) == 0:
             return False;
@@ -1113,17 +1539,19 @@ def _image_exists(self, repo, tag, _id=None):
         :return: True if the image exists locally. Else false.
         """
         debug("Checking if the image exists locally.")
-        images = self.dcli.images()
+        import docker
         imageTag = "%s:%s" % (repo, tag)
-        for image in images:
-            if image.get("RepoTags", None):
-                if imageTag in image.get("RepoTags", []):
-                    debug("Image '{}' exists.\n".format(imageTag))
-                    return True
-            if image.get("Id", None):
-                debug("; ".join([str(repo), str(tag), str(_id), str(image.get("Id"))]))
-                if image.get("Id") == _id:
-                    return True
+        for image in (imageTag, _id):
+            if not image:
+                continue
+            try:
+                # cached, so that containers of the same image do not
+                # list all images
+                self.inspectImage(image)
+            except docker.errors.APIError:
+                continue
+            debug("Image '{}' exists.\n".format(image))
+            return True
         return False
 
     def _pull_image(self, repository, tag):
@@ -1312,8 +1740,8 @@ def cgroupDel( self ):
         # deletes the group; next attempt will give "no such file"
         return exitcode == 0 or ( 'no such file' in _err.lower() )
 
-    def popen( self, *args, **kwargs ):
-        """Return a Popen() object in node's namespace
+    def _popenArgs( self, *args, **kwargs ):
+        """Build popen() and apopen() commands that run in our cgroup
            args: Popen() args, single list, or string
            kwargs: Popen() keyword args"""
         # Tell mnexec to execute command in our cgroup
@@ -1327,13 +1755,29 @@ def popen( self, *args, **kwargs ):
             else:
                 debug( '*** error: not enough cpu time available for %s.' %
                        self.name, 'Using cfs scheduler for subprocess\n' )
-        return Host.popen( self, *args, mncmd=mncmd, **kwargs )
+        return Host._popenArgs( self, *args, mncmd=mncmd, **kwargs )
 
     def cleanup( self ):
         "Clean up Node, then clean up our cgroup"
         super( CPULimitedHost, self ).cleanup()
         retry( retries=3, delaySecs=.1, fn=self.cgroupDel )
 
+    @classmethod
+    def batchTerminate( cls, nodes ):
+        "Terminate nodes, then delete their cgroups with one cgdelete"
+        for node in nodes:
+            node.hangup()
+        for node in nodes:
+            Host.cleanup( node )
+        if nodes:
+            _out, _err, exitcode = errRun(
+                [ 'cgdelete', '-r' ] + [ node.cgroup for node in nodes ] )
+            if exitcode:
+                # Some groups may still be busy: retry one by one
+                for node in nodes:
+                    retry( retries=3, delaySecs=.1, fn=node.cgroupDel )
+        return nodes
+
     _rtGroupSched = False   # internal class var: Is CONFIG_RT_GROUP_SCHED set?
 
     @classmethod
@@ -1705,8 +2149,46 @@ def setup( cls ):
     @classmethod
     def isOldOVS( cls ):
         "Is OVS ersion < 1.10?"
-        return ( StrictVersion( cls.OVSVersion ) <
-                 StrictVersion( '1.10' ) )
+        return ( tuple( int( v ) for v in cls.OVSVersion.split( '.' ) ) <
+                 ( 1, 10 ) )
+
+    # Talk to the local ovsdb-server directly instead of running
+    # ovs-vsctl where possible; subclasses whose switches don't use
+    # the local ovsdb-server should set this to False
+    useOvsdb = True
+    _ovsdb = None  # shared connection, False if unavailable
+
+    @classmethod
+    def ovsdb( cls ):
+        "Return shared OVSDB connection, or None if we can't use one"
+        if not cls.useOvsdb:
+            return None
+        if OVSSwitch._ovsdb is None:
+            try:
+                db = OVSDB()
+                db.monitor( { 'Open_vSwitch': [ 'cur_cfg' ],
+                              'Bridge': [ 'name', 'controller' ],
+                              'Port': [ 'name' ],
+                              'Controller': [ 'is_connected' ] } )
+                OVSSwitch._ovsdb = db
+                addCleanupCallback( OVSSwitch.closeOvsdb )
+            except ( OSError, OVSDBError ) as e:
+                debug( '*** Cannot connect to ovsdb-server, using '
+                       'ovs-vsctl: %s\n' % e )
+                OVSSwitch._ovsdb = False
+        return OVSSwitch._ovsdb or None
+
+    @classmethod
+    def closeOvsdb( cls, reason=None ):
+        """Close the shared OVSDB connection; ovsdb() opens a new one
+           reason: (optional) error that broke the connection"""
+        db = OVSSwitch._ovsdb
+        OVSSwitch._ovsdb = None
+        if db:
+            if reason is not None:
+                debug( '*** Lost connection to ovsdb-server: %s\n' %
+                       reason )
+            db.close()
 
     def dpctl( self, *args ):
         "Run ovs-ofctl command"
@@ -1731,7 +2213,16 @@ def TCReapply( intf ):
 
     def attach( self, intf ):
         "Connect a data port"
-        self.vsctl( 'add-port', self.deployed_name, intf )
+        db = self.ovsdb()
+        if db and not self.batch:
+            port, ops = self._dbPortOps( db, { 'name': str( intf ) } )
+            ops.append( { 'op': 'mutate', 'table': 'Bridge',
+                          'where': [ [ 'name', '==', self.deployed_name ] ],
+                          'mutations': [ [ 'ports', 'insert',
+                                           ovsSet( [ port ] ) ] ] } )
+            db.transact( *ops, wait=True )
+        else:
+            self.vsctl( 'add-port', self.deployed_name, intf )
         self.cmd( 'ifconfig', intf, 'up' )
         self.TCReapply( intf )
 
@@ -1747,11 +2238,37 @@ def attachInternalIntf(self, intf_name, net):
 
     def detach( self, intf ):
         "Disconnect a data port"
-        self.vsctl( 'del-port', self.deployed_name, intf )
+        db = self.ovsdb()
+        if db and not self.batch:
+            db.run()
+            ports = [ [ 'uuid', uuid ]
+                      for uuid in db.find( 'Port', 'name', str( intf ) ) ]
+            if ports:
+                db.transact( { 'op': 'mutate', 'table': 'Bridge',
+                               'where': [ [ 'name', '==',
+                                            self.deployed_name ] ],
+                               'mutations': [ [ 'ports', 'delete',
+                                                ovsSet( ports ) ] ] },
+                             wait=True )
+        else:
+            self.vsctl( 'del-port', self.deployed_name, intf )
 
     def controllerUUIDs( self, update=False ):
         """Return ovsdb UUIDs for our controllers
            update: update cached value"""
+        db = self.ovsdb()
+        if db:
+            try:
+                # Always current, since ovsdb-server updates the db cache
+                db.run()
+                return [ uuid for bridge in db.find( 'Bridge', 'name',
+                                                     self.deployed_name )
+                         for uuid in ovsUUIDs(
+                             db.row( 'Bridge', bridge )[ 'controller' ] ) ]
+            except ( OSError, OVSDBError ) as e:
+                # e.g. ovsdb-server restarted; use ovs-vsctl this time
+                self.closeOvsdb( e )
+                update = True
         if not self._uuids or update:
             controllers = self.cmd( 'ovs-vsctl -- get Bridge', self.deployed_name,
                                     'Controller' ).strip()
@@ -1764,9 +2281,15 @@ def controllerUUIDs( self, update=False ):
 
     def connected( self ):
         "Are we connected to at least one of our controllers?"
-        for uuid in self.controllerUUIDs():
-            if 'true' in self.vsctl( '-- get Controller',
-                                     uuid, 'is_connected' ):
+        uuids = self.controllerUUIDs()
+        # controllerUUIDs() has updated the db cache, or dropped it
+        db = self.ovsdb()
+        for uuid in uuids:
+            if db:
+                if db.row( 'Controller', uuid ).get( 'is_connected' ):
+                    return True
+            elif 'true' in self.vsctl( '-- get Controller',
+                                       uuid, 'is_connected' ):
                 return True
         return self.failMode == 'standalone'
 
@@ -1798,24 +2321,140 @@ def bridgeOpts( self ):
         opts += ' other-config:dp-desc=%s' % self.name
         return opts
 
+    def intfColumns( self, intf ):
+        "Return OVS Interface columns for intf, as in intfOpts()"
+        columns = { 'name': str( intf ),
+                    'ofport_request': self.ports[ intf ] }
+        if isinstance( intf, OVSIntf ):
+            intf1, intf2 = intf.link.intf1, intf.link.intf2
+            peer = intf1 if intf1 != intf else intf2
+            columns.update( type='patch',
+                            options=ovsMap( { 'peer': str( peer ) } ) )
+        return columns
+
+    def bridgeColumns( self ):
+        "Return OVS Bridge columns, as in bridgeOpts()"
+        otherConfig = { 'datapath-id': self.dpid, 'dp-desc': self.name }
+        columns = { 'fail_mode': self.failMode }
+        if not self.inband:
+            otherConfig[ 'disable-in-band' ] = 'true'
+        if self.datapath == 'user':
+            columns[ 'datapath_type' ] = 'netdev'
+        if self.protocols:
+            columns[ 'protocols' ] = ovsSet( self.protocols.split( ',' ) )
+        if self.stp and self.failMode == 'standalone':
+            columns[ 'stp_enable' ] = True
+        columns[ 'other_config' ] = ovsMap( otherConfig )
+        return columns
+
+    @staticmethod
+    def _dbPortOps( db, columns ):
+        """Return named uuid of a new port and the OVSDB operations
+           that create it with one interface
+           columns: columns of the interface"""
+        intf, port = db.uuidName(), db.uuidName()
+        ops = [ { 'op': 'insert', 'table': 'Interface', 'row': columns,
+                  'uuid-name': intf },
+                { 'op': 'insert', 'table': 'Port', 'uuid-name': port,
+                  'row': { 'name': columns[ 'name' ],
+                           'interfaces': [ 'named-uuid', intf ] } } ]
+        return [ 'named-uuid', port ], ops
+
+    def _dbDelBridgeOps( self, db ):
+        "Return OVSDB operations that delete our bridge, if it exists"
+        db.run()
+        bridges = [ [ 'uuid', uuid ]
+                    for uuid in db.find( 'Bridge', 'name',
+                                         self.deployed_name ) ]
+        if not bridges:
+            return []
+        # Its ports, interfaces and controllers are garbage collected
+        return [ { 'op': 'mutate', 'table': 'Open_vSwitch', 'where': [],
+                   'mutations': [ [ 'bridges', 'delete',
+                                    ovsSet( bridges ) ] ] } ]
+
+    def _dbStartOps( self, db, clist ):
+        """Return OVSDB operations that (re)create our bridge
+           clist: list of ( name, target ) for controllers"""
+        ops = self._dbDelBridgeOps( db )
+        controllers = []
+        for _name, target in clist:
+            row = { 'target': target }
+            if self.reconnectms:
+                row[ 'max_backoff' ] = self.reconnectms
+            controller = db.uuidName()
+            ops.append( { 'op': 'insert', 'table': 'Controller',
+                          'row': row, 'uuid-name': controller } )
+            controllers.append( [ 'named-uuid', controller ] )
+        ports = []
+        intfs = [ { 'name': self.deployed_name, 'type': 'internal' } ]
+        intfs += [ self.intfColumns( intf ) for intf in self.intfList()
+                   if self.ports[ intf ] and not intf.IP() ]
+        for columns in intfs:
+            port, portOps = self._dbPortOps( db, columns )
+            ports.append( port )
+            ops += portOps
+        row = self.bridgeColumns()
+        row.update( name=self.deployed_name, ports=ovsSet( ports ),
+                    controller=ovsSet( controllers ) )
+        bridge = db.uuidName()
+        ops += [ { 'op': 'insert', 'table': 'Bridge', 'row': row,
+                   'uuid-name': bridge },
+                 { 'op': 'mutate', 'table': 'Open_vSwitch', 'where': [],
+                   'mutations': [ [ 'bridges', 'insert',
+                                    ovsSet( [ [ 'named-uuid',
+                                                bridge ] ] ) ] ] } ]
+        return ops
+
+    def _startOvsdb( self ):
+        "Return OVSDB connection if start() can use it, or None"
+        cls = type( self )
+        # Subclasses may add ovs-vsctl options
+        if ( cls.bridgeOpts is not OVSSwitch.bridgeOpts or
+             cls.intfOpts is not OVSSwitch.intfOpts or self.isOldOVS() ):
+            return None
+        return self.ovsdb()
+
     def start( self, controllers ):
         "Start up a new OVS OpenFlow switch using ovs-vsctl"
         if self.inNamespace:
             raise Exception(
                 'OVS kernel switch does not work in a namespace' )
         int( self.dpid, 16 )  # DPID must be a hex string
-        # Command to add interfaces
-        intfs = ''.join( ' -- add-port %s %s' % ( self.deployed_name, intf ) +
-                         self.intfOpts( intf )
-                         for intf in self.intfList()
-                         if self.ports[ intf ] and not intf.IP() )
-        # Command to create controller entries
+        # Controller entries
         clist = [ ( self.deployed_name + c.name, '%s:%s:%d' %
                   ( c.protocol, c.IP(), c.port ) )
                   for c in controllers ]
         if self.listenPort:
             clist.append( ( self.deployed_name + '-listen',
                             'ptcp:%s' % self.listenPort ) )
+        db = self._startOvsdb()
+        if db:
+            ops = self._dbStartOps( db, clist )
+            if self.batch:
+                # batchStartup() runs them in one transaction
+                self.commands += ops
+            else:
+                db.transact( *ops, wait=True )
+        else:
+            self.vsctlStart( clist )
+        # If necessary, restore TC config overwritten by OVS
+        if not self.batch:
+            batch = TCIntf.startBatch()
+            for intf in self.intfList():
+                self.TCReapply( intf )
+            if batch:
+                TCIntf.runBatch()
+
+    def vsctlStart( self, clist ):
+        """Start switch using ovs-vsctl
+           clist: list of ( name, target ) for controllers"""
+        # Command to add interfaces
+        intfs = ''.join( ' -- add-port %s %s' % ( self.deployed_name, intf ) +
+                         self.intfOpts( intf )
+                         for intf in self.intfList()
+                         if self.ports[ intf ] and not intf.IP() )
+        # Command to create controller entries
         ccmd = '-- --id=@%s create Controller target=\\"%s\\"'
         if self.reconnectms:
             ccmd += ' max_backoff=%d' % self.reconnectms
@@ -1832,10 +2471,6 @@ def start( self, controllers ):
                     ' -- set bridge %s controller=[%s]' % ( self.deployed_name, cids  ) +
                     self.bridgeOpts() +
                     intfs )
-        # If necessary, restore TC config overwritten by OVS
-        if not self.batch:
-            for intf in self.intfList():
-                self.TCReapply( intf )
 
     # This should be ~ int( quietRun( 'getconf ARG_MAX' ) ),
     # but the real limit seems to be much lower
@@ -1847,33 +2482,50 @@ def batchStartup( cls, switches, run=errRun ):
            switches: switches to start up
            run: function to run commands (errRun)"""
         info( '...' )
+        # Operations queued by switches that use the native client
+        ops = [ cmd for switch in switches for cmd in switch.commands
+                if isinstance( cmd, dict ) ]
+        if ops:
+            cls.ovsdb().transact( *ops, wait=True )
         cmds = 'ovs-vsctl'
         for switch in switches:
             if switch.isOldOVS():
                 # Ideally we'd optimize this also
                 run( 'ovs-vsctl del-br %s' % switch )
             for cmd in switch.commands:
+                if isinstance( cmd, dict ):
+                    continue
                 cmd = cmd.strip()
                 # Don't exceed ARG_MAX
                 if len( cmds ) + len( cmd ) >= cls.argmax:
                     run( cmds, shell=True )
                     cmds = 'ovs-vsctl'
                 cmds += ' ' + cmd
-                switch.cmds = []
-                switch.batch = False
-        if cmds:
+            switch.commands = []
+            switch.batch = False
+        if cmds != 'ovs-vsctl':
             run( cmds, shell=True )
-        # Reapply link config if necessary...
+        # Reapply link config if necessary, in one pass for all
+        # local switches
+        batch = run is errRun and TCIntf.startBatch()
         for switch in switches:
             for intf in switch.intfs.values():
                 if isinstance( intf, TCIntf ):
                     intf.config( **intf.params )
+        if batch:
+            TCIntf.runBatch()
         return switches
 
     def stop( self, deleteIntfs=True ):
         """Terminate OVS switch.
            deleteIntfs: delete interfaces? (True)"""
-        self.cmd( 'ovs-vsctl del-br', self.deployed_name )
+        db = self.ovsdb()
+        if db:
+            ops = self._dbDelBridgeOps( db )
+            if ops:
+                db.transact( *ops, wait=True )
+        else:
+            self.cmd( 'ovs-vsctl del-br', self.deployed_name )
         if self.datapath == 'user':
             self.cmd( 'ip link del', self.deployed_name )
         super( OVSSwitch, self ).stop( deleteIntfs )
@@ -1885,8 +2537,15 @@ def batchShutdown( cls, switches, run=errRun ):
         if switches and not switches[ 0 ].isOldOVS():
             delcmd = '--if-exists ' + delcmd
         # First, delete them all from ovsdb
-        run( 'ovs-vsctl ' +
-             ' -- '.join( delcmd % s.deployed_name for s in switches ), shell=True )
+        db = cls.ovsdb() if run is errRun else None
+        if db:
+            ops = [ op for s in switches for op in s._dbDelBridgeOps( db ) ]
+            if ops:
+                db.transact( *ops, wait=True )
+        else:
+            run( 'ovs-vsctl ' +
+                 ' -- '.join( delcmd % s.deployed_name for s in switches ),
+                 shell=True )
         # Next, shut down all of the processes
         pids = ' '.join( str( switch.pid ) for switch in switches )
 
@@ -0,0 +1,230 @@
+"""
+Minimal OVSDB client for Open vSwitch.
+
+ovsdb-server speaks JSON-RPC (RFC 7047) on a unix socket. OVSDB keeps
+one connection to it open, so that reading or changing the switch
+configuration does not cost an ovs-vsctl process each time:
+
+- transact() runs a list of OVSDB operations as one transaction, and
+  can wait for ovs-vswitchd to apply it, like ovs-vsctl does.
+
+- monitor() keeps a local copy of the given columns of some tables,
+  which ovsdb-server updates as they change. run() processes these
+  updates, and can block until the next one arrives, so callers can
+  wait for a column (e.g. Controller is_connected) to change without
+  polling.
+
+Values use the OVSDB JSON notation, e.g. [ 'uuid', '...' ] or
+[ 'set', [ ... ] ]; the helpers below convert to and from it.
+"""
+
+import json
+import os
+import socket
+
+from select import select
+from time import monotonic
+
+from mininet.log import debug
+from mininet.util import encode, getincrementaldecoder
+
+
+class OVSDBError( Exception ):
+    "Error reported by ovsdb-server, or lost connection"
+    pass
+
+
+def defaultSocket():
+    "Return the path of the local ovsdb-server socket"
+    rundir = os.environ.get( 'OVS_RUNDIR', '/var/run/openvswitch' )
+    return os.path.join( rundir, 'db.sock' )
+
+
+def ovsSet( values ):
+    "Return OVSDB set of values"
+    return [ 'set', list( values ) ]
+
+
+def ovsMap( pairs ):
+    "Return OVSDB map of dict pairs"
+    return [ 'map', [ [ k, v ] for k, v in pairs.items() ] ]
+
+
+def ovsUUIDs( value ):
+    "Return list of uuid strings in an OVSDB uuid or set of uuids"
+    if value[ 0 ] == 'set':
+        return [ uuid for _tag, uuid in value[ 1 ] ]
+    return [ value[ 1 ] ]
+
+
+class OVSDB( object ):
+    "Connection to ovsdb-server"
+
+    database = 'Open_vSwitch'
+
+    def __init__( self, path=None, timeout=10 ):
+        """path: ovsdb-server unix socket (defaultSocket())
+           timeout: seconds to wait for replies"""
+        self.path = path or defaultSocket()
+        self.timeout = timeout
+        self.sock = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+        try:
+            self.sock.connect( self.path )
+        except socket.error:
+            self.sock.close()
+            raise
+        self.decoder = getincrementaldecoder()
+        self.json = json.JSONDecoder()
+        self.readbuf = ''
+        self.lastId = 0
+        self.lastName = 0
+        self.replies = {}
+        # Monitored tables: table -> uuid -> row
+        self.tables = {}
+
+    def close( self ):
+        "Close connection"
+        self.sock.close()
+
+    def send( self, msg ):
+        "Send JSON-RPC message"
+        self.sock.sendall( encode( json.dumps( msg ) ) )
+
+    def handle( self, msg ):
+        "Handle incoming JSON-RPC message"
+        method = msg.get( 'method' )
+        if method == 'echo':
+            # Keepalive from the server
+            self.send( { 'id': msg[ 'id' ], 'result': msg[ 'params' ],
+                         'error': None } )
+        elif method == 'update':
+            self.update( msg[ 'params' ][ 1 ] )
+        elif method is None:
+            self.replies[ msg[ 'id' ] ] = msg
+        else:
+            debug( '*** OVSDB: ignoring %s request\n' % method )
+
+    def run( self, timeout=0 ):
+        """Process incoming messages
+           timeout: seconds to wait for the first one (0)
+           returns: True if any message was processed"""
+        readable, _, _ = select( [ self.sock ], [], [], timeout )
+        if not readable:
+            return False
+        data = self.sock.recv( 65536 )
+        if not data:
+            raise OVSDBError( 'connection to %s closed' % self.path )
+        self.readbuf += self.decoder.decode( data )
+        count = 0
+        while True:
+            # Messages are concatenated JSON objects
+            buf = self.readbuf.lstrip()
+            try:
+                msg, end = self.json.raw_decode( buf )
+            except ValueError:
+                # Incomplete message
+                self.readbuf = buf
+                break
+            self.readbuf = buf[ end: ]
+            self.handle( msg )
+            count += 1
+        return count > 0
+
+    def call( self, method, *params ):
+        "Call method and return its result"
+        self.lastId += 1
+        msgId = self.lastId
+        self.send( { 'id': msgId, 'method': method, 'params': params } )
+        deadline = monotonic() + self.timeout
+        while msgId not in self.replies:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                raise OVSDBError( 'timed out waiting for %s reply'
+                                  % method )
+            self.run( remaining )
+        reply = self.replies.pop( msgId )
+        if reply.get( 'error' ) is not None:
+            raise OVSDBError( '%s failed: %s' % ( method, reply[ 'error' ] ) )
+        return reply[ 'result' ]
+
+    def uuidName( self ):
+        "Return new uuid-name for a row inserted by a transaction"
+        self.lastName += 1
+        return 'row%d' % self.lastName
+
+    def transact( self, *ops, **kwargs ):
+        """Run operations as one transaction
+           wait: wait for ovs-vswitchd to apply it (False); this
+                 requires monitoring Open_vSwitch cur_cfg
+           returns: list of results, one per operation"""
+        wait = kwargs.pop( 'wait', False )
+        ops = list( ops )
+        count = len( ops )
+        if wait:
+            ops += [ { 'op': 'mutate', 'table': 'Open_vSwitch',
+                       'where': [],
+                       'mutations': [ [ 'next_cfg', '+=', 1 ] ] },
+                     { 'op': 'select', 'table': 'Open_vSwitch',
+                       'where': [], 'columns': [ 'next_cfg' ] } ]
+        results = self.call( 'transact', self.database, *ops )
+        for op, result in zip( ops + [ None ], results ):
+            if result and 'error' in result:
+                raise OVSDBError( '%s: %s (%s)' % (
+                    op[ 'op' ] if op else 'commit',
+                    result[ 'error' ], result.get( 'details', '' ) ) )
+        if wait:
+            nextCfg = results[ -1 ][ 'rows' ][ 0 ][ 'next_cfg' ]
+            if not self.waitFor( lambda: self.curCfg() >= nextCfg ):
+                raise OVSDBError( 'timed out waiting for ovs-vswitchd' )
+        return results[ :count ]
+
+    def monitor( self, tables ):
+        """Monitor tables
+           tables: dict of table -> list of columns"""
+        requests = { table: { 'columns': columns }
+                     for table, columns in tables.items() }
+        monitorId = ','.join( sorted( tables ) )
+        for table in tables:
+            self.tables[ table ] = {}
+        self.update( self.call( 'monitor', self.database, monitorId,
+                                requests ) )
+
+    def update( self, updates ):
+        "Apply table updates to monitored tables"
+        for table, rows in updates.items():
+            cache = self.tables.setdefault( table, {} )
+            for uuid, change in rows.items():
+                if change.get( 'new' ) is None:
+                    cache.pop( uuid, None )
+                else:
+                    cache[ uuid ] = change[ 'new' ]
+
+    def waitFor( self, condition, timeout=None ):
+        """Process updates until condition() is true
+           timeout: seconds to wait (self.timeout)
+           returns: condition()"""
+        if timeout is None:
+            timeout = self.timeout
+        deadline = monotonic() + timeout
+        self.run()
+        while not condition():
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                return False
+            self.run( remaining )
+        return True
+
+    def find( self, table, column, value ):
+        "Return uuids of monitored rows where column == value"
+        return [ uuid for uuid, row in self.tables.get( table, {} ).items()
+                 if row.get( column ) == value ]
+
+    def row( self, table, uuid ):
+        "Return monitored row, or {} if there is none"
+        return self.tables.get( table, {} ).get( uuid, {} )
+
+    def curCfg( self ):
+        "Return configuration version applied by ovs-vswitchd"
+        rows = self.tables.get( 'Open_vSwitch' )
+        return max( row.get( 'cur_cfg', 0 )
+                    for row in rows.values() ) if rows else 0
@@ -0,0 +1,20 @@
+"""
+Mininet scaling benchmarks
+
+Run them with
+
+    # mn --bench [--benchmax hosts] [--benchout file.json]
+    #     [--benchbase before.json]
+
+or with pytest (mininet/test/test_bench.py), or from Python:
+
+    from mininet.test.bench import benchCases, runSuite
+    runSuite( benchCases( topos=[ 'linear' ], maxHosts=64 ), 'out.json' )
+
+See suite.py for what is measured.
+"""
+
+from mininet.test.bench.suite import ( TOPOS, HOSTS, LINKS, SWITCHES,
+                                       PHASES, IMPORTS, IMPORT_BUDGET,
+                                       importTimes, benchCases, runCase,
+                                       runSuite, save, load, compare )
@@ -0,0 +1,287 @@
+"""
+Scaling benchmarks for building, starting and stopping networks.
+
+Each case builds one topology at one size with one host, link and
+switch class, and measures each phase (build, start, pingAll and
+stop):
+
+seconds: wall clock time
+processes: processes created on the whole machine (from /proc/stat),
+    so the machine should be otherwise idle
+peakRssKb: peak resident set size of this (Mininet) process
+
+The net.timings of each case are saved too, to see which part of
+build and start got faster or slower. runSuite() saves the results
+as JSON, so that runs on different commits can be compared with
+compare().
+
+runSuite() also measures how long short-lived mn and Python processes
+take to start (see IMPORTS), mostly importing modules, and warns when
+they exceed IMPORT_BUDGET.
+
+Switches run without a controller, in standalone mode; topologies
+with loops use STP and wait until all switches forward.
+"""
+
+import json
+import os
+import platform
+import sys
+import time
+
+from contextlib import contextmanager
+from itertools import product
+from subprocess import CalledProcessError, DEVNULL, call, check_output
+from time import monotonic
+
+from mininet.clean import cleanup
+from mininet.link import Link, TCLink
+from mininet.log import info, warn, error, output
+from mininet.net import Mininet, CONTAINERNET_VERSION
+from mininet.node import Host, CPULimitedHost, OVSSwitch
+from mininet.nodelib import LinuxBridge
+from mininet.topo import LinearTopo
+from mininet.topolib import TreeTopo, TorusTopo, FatTreeTopo
+from mininet.util import specialClass, numCores, decode
+
+
+# name: ( Topo class, list of params for increasing sizes, has loops? )
+TOPOS = {
+    'linear': ( LinearTopo, [ dict( k=k ) for k in ( 4, 16, 64, 256 ) ],
+                False ),
+    'tree': ( TreeTopo, [ dict( depth=depth, fanout=2 )
+                          for depth in ( 2, 4, 6, 8 ) ], False ),
+    'torus': ( TorusTopo, [ dict( x=x, y=x ) for x in ( 3, 4, 8, 16 ) ],
+               True ),
+    'fattree': ( FatTreeTopo, [ dict( k=k ) for k in ( 4, 6, 8, 12 ) ],
+                 True ) }
+
+HOSTS = { 'Host': Host, 'CPULimitedHost': CPULimitedHost }
+
+LINKS = { 'Link': Link,
+          'TCLink': specialClass( TCLink, defaults=dict( bw=100 ) ) }
+
+SWITCHES = { 'OVSSwitch': specialClass(
+                 OVSSwitch, defaults=dict( failMode='standalone' ) ),
+             'LinuxBridge': LinuxBridge }
+
+PHASES = ( 'build', 'start', 'pingAll', 'stop' )
+
+# Seconds to wait for STP in topologies with loops
+stpTimeout = 120
+
+# name: command whose run time is mostly spent importing modules
+IMPORTS = {
+    'import': [ sys.executable, '-c', 'from mininet.net import Mininet' ],
+    'version': [ sys.executable, '-m', 'mininet', '--version' ],
+    'clean': [ sys.executable, '-m', 'mininet', '-c' ] }
+
+# name: seconds that IMPORTS[ name ] may take, beyond starting Python
+IMPORT_BUDGET = { 'import': 0.25, 'version': 0.3, 'clean': 0.5 }
+
+
+def forks():
+    "Return number of processes created on this machine since boot"
+    with open( '/proc/stat' ) as f:
+        for line in f:
+            if line.startswith( 'processes ' ):
+                return int( line.split()[ 1 ] )
+    return 0
+
+
+def peakRss():
+    "Return peak RSS of this process in kB"
+    with open( '/proc/self/status' ) as f:
+        for line in f:
+            if line.startswith( 'VmHWM:' ):
+                return int( line.split()[ 1 ] )
+    return 0
+
+
+def resetPeakRss():
+    "Reset peak RSS of this process to its current RSS"
+    try:
+        with open( '/proc/self/clear_refs', 'w' ) as f:
+            f.write( '5' )
+    except OSError:
+        # Linux < 4.0: peakRssKb is the peak so far
+        pass
+
+
+@contextmanager
+def measure( phases, phase ):
+    """Measure the code in a with block
+       phases: dict to store the results of phase in"""
+    resetPeakRss()
+    start, startForks = monotonic(), forks()
+    yield
+    phases[ phase ] = { 'seconds': monotonic() - start,
+                        'processes': forks() - startForks,
+                        'peakRssKb': peakRss() }
+
+
+def importTimes( names=None, repeat=3 ):
+    """Return dict of name -> seconds that IMPORTS[ name ] takes, less
+       the time to start Python itself; the best of repeat runs
+       names: names in IMPORTS (default: all; clean needs root)"""
+    # Run the commands with this Mininet source tree
+    root = os.path.dirname( os.path.dirname( os.path.dirname(
+        os.path.dirname( os.path.abspath( __file__ ) ) ) ) )
+    path = os.environ.get( 'PYTHONPATH' )
+    env = dict( os.environ,
+                PYTHONPATH=root + ( ':' + path if path else '' ) )
+
+    def best( cmd ):
+        "Return the shortest run time of cmd"
+        times = []
+        for _ in range( repeat ):
+            start = monotonic()
+            call( cmd, stdout=DEVNULL, stderr=DEVNULL, env=env )
+            times.append( monotonic() - start )
+        return min( times )
+
+    python = best( [ sys.executable, '-c', 'pass' ] )
+    return { name: max( best( IMPORTS[ name ] ) - python, 0.0 )
+             for name in names or sorted( IMPORTS ) }
+
+
+def benchCases( topos=None, hosts=None, links=None, switches=None,
+                maxHosts=None ):
+    """Return list of benchmark cases: every combination of the given
+       topologies, at each size, and classes
+       topos, hosts, links, switches: lists of names in TOPOS, HOSTS,
+           LINKS and SWITCHES (default: all)
+       maxHosts: skip sizes with more hosts (optional)"""
+    cases = []
+    for topo in topos or sorted( TOPOS ):
+        topoCls, sizes, loops = TOPOS[ topo ]
+        for params in sizes:
+            nhosts = len( topoCls( **params ).hosts() )
+            if maxHosts and nhosts > maxHosts:
+                continue
+            for host, link, switch in product(
+                    hosts or sorted( HOSTS ), links or sorted( LINKS ),
+                    switches or sorted( SWITCHES ) ):
+                cases.append( dict( topo=topo, params=params, hosts=nhosts,
+                                    host=host, link=link, switch=switch,
+                                    stp=loops ) )
+    return cases
+
+
+def caseName( case ):
+    "Return short description of case"
+    return '%s%s %s/%s/%s' % (
+        case[ 'topo' ], ','.join( str( v ) for _k, v in
+                                  sorted( case[ 'params' ].items() ) ),
+        case[ 'host' ], case[ 'link' ], case[ 'switch' ] )
+
+
+def runCase( case ):
+    """Run one benchmark case
+       returns: dict of case, phases, timings and error, if any"""
+    topoCls, _sizes, _loops = TOPOS[ case[ 'topo' ] ]
+    switch = SWITCHES[ case[ 'switch' ] ]
+    if case[ 'stp' ]:
+        switch = specialClass( switch, defaults=dict( stp=True ) )
+    result = dict( case, phases={} )
+    phases = result[ 'phases' ]
+    net = Mininet( topo=topoCls( **case[ 'params' ] ),
+                   host=HOSTS[ case[ 'host' ] ],
+                   link=LINKS[ case[ 'link' ] ], switch=switch,
+                   controller=None, build=False,
+                   waitConnected=stpTimeout if case[ 'stp' ] else False )
+    try:
+        with measure( phases, 'build' ):
+            net.build()
+        with measure( phases, 'start' ):
+            net.start()
+        with measure( phases, 'pingAll' ):
+            loss = net.pingAll()
+        phases[ 'pingAll' ][ 'loss' ] = loss
+        with measure( phases, 'stop' ):
+            net.stop()
+    except Exception as e:  # pylint: disable=broad-except
+        error( '*** %s failed: %s\n' % ( caseName( case ), e ) )
+        result[ 'error' ] = str( e )
+        cleanup()
+    result[ 'timings' ] = net.timings
+    return result
+
+
+def gitCommit():
+    "Return commit of the Mininet source tree, if it is a git checkout"
+    path = os.path.dirname( os.path.abspath( __file__ ) )
+    try:
+        return decode( check_output(
+            [ 'git', '-C', path, 'describe', '--always', '--dirty' ],
+            stderr=DEVNULL ) ).strip()
+    except ( OSError, CalledProcessError ):
+        return None
+
+
+def runSuite( cases, filename=None ):
+    """Run benchmark cases
+       cases: list of cases (see benchCases())
+       filename: save results as JSON to filename after each case
+       returns: dict of results"""
+    results = dict( version=CONTAINERNET_VERSION, commit=gitCommit(),
+                    date=time.strftime( '%Y-%m-%dT%H:%M:%S' ),
+                    hostname=platform.node(), kernel=platform.release(),
+                    cores=numCores(), cases=[] )
+    info( '*** Measuring startup times\n' )
+    results[ 'imports' ] = importTimes()
+    for name, seconds in sorted( results[ 'imports' ].items() ):
+        if seconds > IMPORT_BUDGET[ name ]:
+            warn( '*** %s took %.3fs, more than its budget of %.3fs\n'
+                  % ( ' '.join( IMPORTS[ name ][ 1: ] ), seconds,
+                      IMPORT_BUDGET[ name ] ) )
+    for i, case in enumerate( cases ):
+        info( '*** Benchmark %d/%d: %s\n' % ( i + 1, len( cases ),
+                                             caseName( case ) ) )
+        results[ 'cases' ].append( runCase( case ) )
+        if filename:
+            save( results, filename )
+    return results
+
+
+def save( results, filename ):
+    "Save results as JSON to filename"
+    with open( filename, 'w' ) as f:
+        json.dump( results, f, indent=1 )
+        f.write( '\n' )
+
+
+def load( filename ):
+    "Return results saved with save()"
+    with open( filename ) as f:
+        return json.load( f )
+
+
+def compare( before, after ):
+    """Print seconds and processes per phase of the cases that both
+       results have, before -> after"""
+    def key( case ):
+        "Identify case"
+        return ( case[ 'topo' ], sorted( case[ 'params' ].items() ),
+                 case[ 'host' ], case[ 'link' ], case[ 'switch' ] )
+    old = { repr( key( case ) ): case for case in before[ 'cases' ] }
+    output( 'Comparing %s with %s\n' % ( before.get( 'commit' ),
+                                        after.get( 'commit' ) ) )
+    for name, seconds in sorted( after.get( 'imports', {} ).items() ):
+        if name in before.get( 'imports', {} ):
+            output( '%-10s %8.3fs -> %8.3fs\n' % (
+                name, before[ 'imports' ][ name ], seconds ) )
+    for case in after[ 'cases' ]:
+        oldCase = old.get( repr( key( case ) ) )
+        if not oldCase:
+            continue
+        output( '%s:\n' % caseName( case ) )
+        for phase in PHASES:
+            a = oldCase[ 'phases' ].get( phase )
+            b = case[ 'phases' ].get( phase )
+            if not a or not b:
+                continue
+            output( '  %-8s %8.3fs -> %8.3fs (%5.2fx) %7d -> %7d processes\n'
+                    % ( phase, a[ 'seconds' ], b[ 'seconds' ],
+                        a[ 'seconds' ] / max( b[ 'seconds' ], 1e-6 ),
+                        a[ 'processes' ], b[ 'processes' ] ) )
@@ -0,0 +1,35 @@
+import os
+import unittest
+
+import pytest
+
+from mininet.test.bench import PHASES, benchCases, runSuite
+from mininet.util import quietRun
+
+
+class testBench( unittest.TestCase ):
+    """Run the smallest benchmarks; set MN_BENCH_OUTPUT to save the
+       results, and use mn --bench for larger networks"""
+
+    @pytest.mark.skipif(os.geteuid() != 0 or not quietRun('which ovs-vsctl'),
+                        reason='needs root and Open vSwitch')
+    def testSmallNetworks(self):
+        cases = benchCases(topos=['linear', 'tree'], hosts=['Host'],
+                           switches=['OVSSwitch'], maxHosts=4)
+        self.assertEqual(len(cases), 4)
+        results = runSuite(cases, os.environ.get('MN_BENCH_OUTPUT'))
+        for result in results['cases']:
+            self.assertNotIn('error', result)
+            self.assertEqual(tuple(result['phases']), PHASES)
+            self.assertEqual(result['phases']['pingAll']['loss'], 0)
+            self.assertGreater(result['phases']['build']['processes'], 0)
+            self.assertIn('addLinks', result['timings'])
+
+    def testFatTreeCases(self):
+        cases = benchCases(topos=['fattree'], maxHosts=54)
+        self.assertEqual(set(case['hosts'] for case in cases), {16, 54})
+        self.assertTrue(all(case['stp'] for case in cases))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import signal
+import subprocess
+import unittest
+
+from time import monotonic
+
+from mininet.clean import Cleanup, intfNames, killWait, procs
+
+
+class testClean( unittest.TestCase ):
+
+    def testIntfNames(self):
+        self.assertIn('lo', intfNames())
+
+    def testIntfPattern(self):
+        for name in ('s1-eth1', 'h1_a.b-eth10', 'tap9'):
+            self.assertTrue(Cleanup.intfPattern.match(name))
+        for name in ('eth0', 's1-eth1x', 'lo'):
+            self.assertFalse(Cleanup.intfPattern.match(name))
+
+    def testKillWait(self):
+        proc = subprocess.Popen(['sleep', '60'])
+        self.assertIn(proc.pid, [pid for pid, _name, _args in procs()])
+        start = monotonic()
+        # Exiting (and becoming a zombie) is enough
+        self.assertEqual(killWait([proc.pid], signal.SIGTERM, timeout=5), [])
+        self.assertLess(monotonic() - start, 2)
+        proc.wait()
+
+
+if __name__ == '__main__':
+    unittest.main()
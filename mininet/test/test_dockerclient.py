@@ -0,0 +1,101 @@
+import sys
+import types
+import unittest
+
+from unittest.mock import Mock, patch
+
+from mininet.node import Docker
+
+
+class APIClient( object ):
+    "docker.APIClient of docker 4.1.0"
+
+    def __init__(self, base_url=None, version=None, timeout=60, tls=False,
+                 user_agent=None, num_pools=None, credstore_env=None):
+        pass
+
+
+class PooledAPIClient( object ):
+    "docker.APIClient of docker >= 4.3.0"
+
+    def __init__(self, base_url=None, version=None, timeout=60, tls=False,
+                 user_agent=None, num_pools=None, credstore_env=None,
+                 use_ssh_client=False, max_pool_size=10):
+        pass
+
+
+def dockerModule(apiClient):
+    "Return a docker module whose from_env() records its kwargs"
+    module = types.ModuleType('docker')
+    module.APIClient = apiClient
+    module.calls = []
+
+    def from_env(**kwargs):
+        # Like docker 4.1.0, which passes unknown kwargs on to
+        # kwargs_from_env()
+        if 'max_pool_size' in kwargs and apiClient is APIClient:
+            raise TypeError("kwargs_from_env() got an unexpected keyword "
+                            "argument 'max_pool_size'")
+        module.calls.append(kwargs)
+        return object()
+
+    module.from_env = from_env
+    return module
+
+
+class testDockerClient( unittest.TestCase ):
+
+    def client(self, apiClient):
+        "Return the kwargs that getClient() creates the client with"
+        docker = dockerModule(apiClient)
+        with patch.dict(sys.modules, docker=docker), \
+                patch.object(Docker, 'dockerClient', None), \
+                patch.object(Docker, 'watchContainers') as watch:
+            client = Docker.getClient()
+            self.assertIs(Docker.getClient(), client)
+            watch.assert_called_once_with()
+        return docker.calls
+
+    def testPinnedSDK(self):
+        self.assertEqual(self.client(APIClient), [{}])
+
+    def testPoolSize(self):
+        self.assertEqual(self.client(PooledAPIClient),
+                         [{'max_pool_size': Docker.clientPoolSize}])
+
+
+class testContainerStates( unittest.TestCase ):
+
+    def testEvents(self):
+        seen = []
+
+        def events():
+            for action, did in (('start', 'a'), ('start', 'b'),
+                                ('exec_start', 'a'), ('die', 'b')):
+                yield {'Action': action, 'Actor': {'ID': did}}
+            seen.append(dict(Docker.containerStates))
+
+        with patch.object(Docker, 'containerStates', {}), \
+                patch.object(Docker, 'dockerClient', object()):
+            Docker._followEvents(events())
+            self.assertEqual(seen, [{'a': True, 'b': False}])
+            # once the stream ends, states and client are renewed
+            self.assertIsNone(Docker.containerStates)
+            self.assertIsNone(Docker.dockerClient)
+
+    def testIsRunning(self):
+        node = Docker.__new__(Docker)
+        node.did, node.dcli = 'a', Mock()
+        with patch.object(Docker, 'containerStates', {'a': False}):
+            self.assertFalse(node._is_container_running())
+        node.dcli.containers.assert_not_called()
+        # without events, docker is asked
+        node.dcli.containers.return_value = [{'Id': 'a'}]
+        with patch.object(Docker, 'containerStates', None):
+            self.assertTrue(node._is_container_running())
+        node.dcli.containers.assert_called_once_with(
+            filters={'id': 'a', 'status': 'running'})
+
+
+if __name__ == '__main__':
+    unittest.main()
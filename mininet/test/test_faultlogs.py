@@ -0,0 +1,319 @@
+import asyncio
+import json
+import os
+import signal
+import struct
+import tempfile
+import time
+import unittest
+
+from math import isnan
+
+from mininet.faultlogcolumnar import FILE_MAGIC, write_columnar_log, read_columnar_log
+from mininet.faultlogcollectors import make_collectors, collect_metrics
+from mininet.faultlogger import FaultLogger, ACTIVE_FAULTS_DICT, active_faults_at
+from mininet.faultlogstore import ExperimentStore
+
+
+def make_log_entries(count=200, fault_count=70):
+    """Returns FaultLogger style entries, with overlapping faults, one debug command, and a metric in every other entry"""
+    entries = []
+    for i in range(count):
+        active_faults = [{'fault_tag': 'f%d' % j, 'fault_type': 'loss', 'command': 'tc ...', 'retcode': 0}
+                         for j in range(fault_count) if (i + j) % 3 == 0]
+        skipped = i % 50 == 0
+        commands = None if skipped else [{'tag': 'c1', 'command': 'ip a', 'output': 'out%d' % (i % 7),
+                                          'retcode': -1 if i % 11 == 0 else 0, 'late': False,
+                                          'timed_out': False}]
+        entries.append({'time_ms': 1000 + i * 100,
+                        'scheduled_ms': 1000 + i * 100,
+                        'time_since_start_ms': i * 100,
+                        'active_faults': active_faults,
+                        'skipped': skipped,
+                        'commands': commands})
+        if i % 2 == 0:
+            entries[-1]['metrics'] = {'h1:interfaces:h1-eth0:rx_bytes': i * 1000}
+    return entries
+
+
+class testColumnarLog( unittest.TestCase ):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'log.fncol')
+        self.entries = make_log_entries()
+        write_columnar_log(self.entries, self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testTimestamps(self):
+        with read_columnar_log(self.path) as fault_log:
+            self.assertEqual(fault_log.entries, len(self.entries))
+            self.assertEqual(list(fault_log.column('time_ms')), [e['time_ms'] for e in self.entries])
+            self.assertEqual(list(fault_log.column('skipped')), [int(e['skipped']) for e in self.entries])
+
+    def testActiveFaults(self):
+        with read_columnar_log(self.path) as fault_log:
+            for row, entry in enumerate(self.entries):
+                self.assertEqual(sorted(fault_log.active_faults(row)),
+                                 sorted(f['fault_tag'] for f in entry['active_faults']))
+            self.assertEqual(fault_log.fault_active('f69'), [(i + 69) % 3 == 0 for i in range(len(self.entries))])
+
+    def testCommandOutputs(self):
+        with read_columnar_log(self.path) as fault_log:
+            expected = [None if e['commands'] is None else e['commands'][0]['output'] for e in self.entries]
+            self.assertEqual(fault_log.command_outputs('c1'), expected)
+
+    def testCommandRetcodes(self):
+        with read_columnar_log(self.path) as fault_log:
+            # -1 is a retcode, not a missing value
+            expected = [None if e['commands'] is None else e['commands'][0]['retcode'] for e in self.entries]
+            self.assertEqual(fault_log.command_retcodes('c1'), expected)
+
+    def testMetrics(self):
+        with read_columnar_log(self.path) as fault_log:
+            values = fault_log.metric('h1:interfaces:h1-eth0:rx_bytes')
+            self.assertEqual(values[0], 0)
+            self.assertEqual(values[10], 10000)
+            self.assertTrue(isnan(values[11]))
+
+    def testRejectsOtherFiles(self):
+        with open(self.path, 'w') as log_file:
+            log_file.write('[]')
+        with self.assertRaises(ValueError):
+            read_columnar_log(self.path)
+
+    def testRejectsLogsWithoutMissingValue(self):
+        with open(self.path, 'rb') as log_file:
+            data = log_file.read()
+        header_length = struct.unpack('<Q', data[len(FILE_MAGIC):len(FILE_MAGIC) + 8])[0]
+        header_start = len(FILE_MAGIC) + 8
+        header = json.loads(data[header_start:header_start + header_length])
+        del header['missing_value']
+        # Same length, so that the columns stay where they are
+        encoded = json.dumps(header).encode('utf-8').ljust(header_length)
+        with open(self.path, 'wb') as log_file:
+            log_file.write(data[:len(FILE_MAGIC)] + struct.pack('<Q', len(encoded)) + encoded +
+                           data[header_start + header_length:])
+        with self.assertRaisesRegex(ValueError, 'older version'):
+            read_columnar_log(self.path)
+
+
+class testMetricCollectors( unittest.TestCase ):
+
+    def testRootNamespaceCollectors(self):
+        """Collectors without a host read from our own namespace, which always has a loopback interface"""
+        collectors = make_collectors([{'node': None, 'host': None, 'types': ['interfaces', 'sockets']}])
+        metrics = collect_metrics(collectors)
+        self.assertIn('root:interfaces:lo:rx_bytes', metrics)
+        self.assertIn('root:sockets:TCP:inuse', metrics)
+        self.assertTrue(all(isinstance(value, int) for value in metrics.values()))
+
+    def testUnknownMetricType(self):
+        self.assertEqual(make_collectors([{'node': 'h1', 'host': None, 'type': 'unknown'}]), [])
+
+
+class testFaultEvents( unittest.TestCase ):
+
+    def setUp(self):
+        ACTIVE_FAULTS_DICT.clear()
+        FaultLogger.set_fault_active('persistent', 'delay', 'tc delay', 0)
+        FaultLogger.start_recording_events()
+
+    def tearDown(self):
+        ACTIVE_FAULTS_DICT.clear()
+        FaultLogger.fault_events = None
+
+    def testTransitionsAreDeltaEncoded(self):
+        FaultLogger.set_fault_active('burst', 'loss', 'tc loss', 0)
+        FaultLogger.set_fault_inactive('burst')
+        FaultLogger.set_fault_active('burst', 'loss', 'tc loss', 0)
+        transitions = [e for e in FaultLogger.fault_events if e['type'] == 'transition']
+        self.assertEqual([e['active'] for e in transitions], [True, False, True])
+        self.assertEqual(transitions[0]['command'], 'tc loss')
+        self.assertNotIn('command', transitions[2])
+
+    def testReconstruction(self):
+        FaultLogger.set_fault_active('burst', 'loss', 'tc loss 1', 0)
+        first_burst = FaultLogger.fault_events[-1]['time_ns']
+        FaultLogger.set_fault_inactive('burst')
+        FaultLogger.record_keyframe()
+        FaultLogger.set_fault_inactive('persistent')
+        FaultLogger.set_fault_active('burst', 'loss', 'tc loss 1', 1)
+        events = list(FaultLogger.fault_events)
+
+        self.assertEqual(set(active_faults_at(events, first_burst)), {'persistent', 'burst'})
+        at_end = active_faults_at(events, events[-1]['time_ns'])
+        self.assertEqual(set(at_end), {'burst'})
+        # Transitions after a keyframe never rely on values recorded before it
+        self.assertEqual(at_end['burst']['command'], 'tc loss 1')
+        self.assertEqual(at_end['burst']['retcode'], 1)
+
+
+def process_alive(pid):
+    """Whether pid runs. Orphans that were killed may linger as zombies, if nobody reaps them"""
+    try:
+        with open('/proc/%d/stat' % pid) as stat:
+            return stat.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return False
+
+
+class testFaultLogger( unittest.TestCase ):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testDebugCommandDeadlines(self):
+        pid_path = os.path.join(self.directory.name, 'pid')
+        commands = [{'tag': 'fast', 'command': 'echo fast', 'host': None},
+                    {'tag': 'late', 'command': 'sleep 0.5; echo late', 'host': None},
+                    # Leaves a child behind, which has to be killed with the shell
+                    {'tag': 'hung', 'command': 'sleep 30 & echo $! > %s; wait' % pid_path, 'host': None}]
+        logger = FaultLogger(commands=commands, tick_deadline=200, command_timeout=1500)
+
+        async def run():
+            outputs = await logger.run_debug_commands()
+            at_deadline = [dict(output) for output in outputs]
+            await asyncio.gather(*list(logger.pending_command_tasks))
+            return at_deadline, outputs
+
+        start = time.monotonic()
+        at_deadline, outputs = asyncio.run(run())
+        # The child holds on to the output pipe, so this only returns early if it was killed too
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertEqual([o['late'] for o in at_deadline], [False, True, True])
+        self.assertEqual(at_deadline[0]['output'], 'fast\n')
+        self.assertIsNone(at_deadline[1]['output'])
+        # Late outputs are filled in once the commands finish
+        self.assertEqual(outputs[1]['output'], 'late\n')
+        self.assertEqual([o['timed_out'] for o in outputs], [False, False, True])
+        self.assertEqual([o['retcode'] for o in outputs], [0, 0, -signal.SIGKILL])
+        self.assertEqual(outputs[2]['output'], '')
+        self.assertFalse(logger.pending_command_tasks)
+        with open(pid_path) as pid_file:
+            self.assertFalse(process_alive(int(pid_file.read())))
+
+    def run_ticks(self, log_duration, blocking=False):
+        """Runs a logger with a 100ms interval for 750ms, whose first tick takes log_duration seconds.
+        Returns the logger, the scheduled_ms of ticks that ran, and the logged entries of skipped ticks."""
+        logger = FaultLogger(interval=100, log_filepath=os.path.join(self.directory.name, 'log.json'))
+        ran = []
+
+        async def log(scheduled_ms=None):
+            ran.append(scheduled_ms)
+            if len(ran) == 1:
+                if blocking:
+                    time.sleep(log_duration)
+                else:
+                    await asyncio.sleep(log_duration)
+
+        logger.log = log
+
+        async def run():
+            task = asyncio.create_task(logger.go())
+            await asyncio.sleep(0.75)
+            logger.stop()
+            await task
+
+        asyncio.run(run())
+        return logger, ran, list(logger.logged_faults.queue)
+
+    def assertEvenlySpaced(self, logger, ran, skipped):
+        scheduled = sorted(ran + [entry['scheduled_ms'] for entry in skipped])
+        self.assertEqual(scheduled[0], logger.start_time_ms)
+        self.assertEqual(scheduled, [logger.start_time_ms + 100 * n for n in range(len(scheduled))])
+        self.assertTrue(all(entry['skipped'] and entry['commands'] is None for entry in skipped))
+        self.assertEqual(logger.skipped_ticks, len(skipped))
+
+    def testOverrunningTickIsSkipped(self):
+        logger, ran, skipped = self.run_ticks(0.25)
+        self.assertEvenlySpaced(logger, ran, skipped)
+        # Ticks 1 and 2 are due while tick 0 still runs
+        self.assertEqual([entry['scheduled_ms'] for entry in skipped],
+                         [logger.start_time_ms + 100, logger.start_time_ms + 200])
+
+    def testMissedTicksAreSkipped(self):
+        # Blocks the event loop, so that the logger wakes up after several ticks were due
+        logger, ran, skipped = self.run_ticks(0.35, blocking=True)
+        self.assertEvenlySpaced(logger, ran, skipped)
+        # The tick that is due on wakeup still runs, the ones that passed completely before it are skipped
+        self.assertEqual(ran[1], logger.start_time_ms + 100)
+        self.assertIn(logger.start_time_ms + 200, [entry['scheduled_ms'] for entry in skipped])
+
+
+class testExperimentStore( unittest.TestCase ):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.entries = make_log_entries()
+        self.json_path = os.path.join(self.directory.name, 'log.json')
+        self.columnar_path = os.path.join(self.directory.name, 'log.fncol')
+        with open(self.json_path, 'w') as json_file:
+            json.dump(self.entries, json_file)
+        write_columnar_log(self.entries, self.columnar_path)
+        self.store = ExperimentStore(os.path.join(self.directory.name, 'store.sqlite'))
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def testFormatsAreEquivalent(self):
+        self.store.ingest_log(self.json_path, run_id='json')
+        self.store.ingest_log(self.columnar_path, run_id='columnar')
+        self.assertEqual(self.store.runs(), ['json', 'columnar'])
+        json_ticks = [row[1:] for row in self.store.ticks_with_fault('f1', run_id='json')]
+        columnar_ticks = [row[1:] for row in self.store.ticks_with_fault('f1', run_id='columnar')]
+        self.assertEqual(json_ticks, columnar_ticks)
+        self.assertEqual(len(json_ticks), len([e for e in self.entries
+                                               if 'f1' in [f['fault_tag'] for f in e['active_faults']]]))
+
+    def testMetricsDuringFault(self):
+        self.store.ingest_log(self.json_path, run_id='run')
+        values = self.store.metric_values('interfaces:h1-eth0:rx_bytes', node='h1', fault_tag='f0')
+        # Metrics exist in even entries, f0 is active in every third entry
+        self.assertEqual([tick for _, tick, _, _ in values], list(range(0, len(self.entries), 6)))
+
+    def testReingestReplacesRun(self):
+        self.store.ingest_log(self.json_path, run_id='run')
+        self.store.ingest_log(self.json_path, run_id='run')
+        self.assertEqual(self.store.run_summary('run')['ticks'], len(self.entries))
+
+    def testDirectIngestIsCommitted(self):
+        self.store.ingest_entries('entries', self.entries)
+        self.store.ingest_entries('entries', self.entries)
+        self.store.ingest_events('events', [{'type': 'transition', 'time_ns': 10, 'fault_tag': 'b',
+                                             'active': True, 'retcode': 0}])
+        self.store.close()
+        self.store = ExperimentStore(os.path.join(self.directory.name, 'store.sqlite'))
+        self.assertEqual(self.store.runs(), ['entries', 'events'])
+        self.assertEqual(self.store.run_summary('entries')['ticks'], len(self.entries))
+        self.assertEqual(self.store.fault_intervals('b', 'events'), [(10, None)])
+
+    def testCompareRuns(self):
+        self.store.ingest_log(self.json_path, run_id='a')
+        self.store.ingest_log(self.json_path, run_id='b')
+        self.store.ingest_measurements('a', [{'time_ms': 0, 'name': 'controller_latency_ms', 'value': 2.0}])
+        self.store.ingest_measurements('b', [{'time_ms': 0, 'name': 'controller_latency_ms', 'value': 5.0}])
+        comparison = self.store.compare_runs('a', 'b')
+        self.assertEqual(comparison['mean_differences']['controller_latency_ms'], 3.0)
+        self.assertEqual(comparison['mean_differences']['h1:interfaces:h1-eth0:rx_bytes'], 0)
+
+    def testFaultIntervals(self):
+        events = [{'type': 'keyframe', 'time_ns': 0, 'active_faults': [
+                      {'fault_tag': 'p', 'fault_type': 'delay', 'command': 'tc', 'retcode': 0}]},
+                  {'type': 'transition', 'time_ns': 10, 'fault_tag': 'b', 'active': True, 'retcode': 0},
+                  {'type': 'transition', 'time_ns': 20, 'fault_tag': 'b', 'active': False},
+                  {'type': 'transition', 'time_ns': 30, 'fault_tag': 'p', 'active': False}]
+        self.store.ingest_events('events', events)
+        self.assertEqual(self.store.runs(), ['events'])
+        self.assertEqual(self.store.fault_intervals('b', 'events'), [(10, 20)])
+        self.assertEqual(self.store.fault_intervals('p', 'events'), [(0, 30)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+import unittest
+
+import pytest
+
+from mininet.test.bench import IMPORT_BUDGET, importTimes
+
+
+class testImports( unittest.TestCase ):
+
+    def loaded(self, statement, modules):
+        "Return which of modules statement imports"
+        out = subprocess.check_output([
+            sys.executable, '-c', '%s; import sys; print(" ".join('
+            'm for m in %r if m in sys.modules))' % (statement, modules)])
+        return out.decode().split()
+
+    def testNoHeavyImports(self):
+        heavy = ('docker', 'iptc', 'yaml', 'distutils', 'asyncio',
+                 'mininet.examples.cluster', 'mininet.fault_controllers')
+        self.assertEqual(self.loaded('from mininet.net import Mininet',
+                                     heavy), [])
+        self.assertEqual(self.loaded('import mininet.clean', heavy), [])
+
+    def testImportTimes(self):
+        times = importTimes(['import', 'version'], repeat=1)
+        self.assertEqual(set(times), {'import', 'version'})
+
+    # Wall clock budgets are flaky on loaded machines; mn --bench warns
+    # about them anyway
+    @pytest.mark.skipif(not os.environ.get('MN_IMPORT_BUDGET'),
+                        reason='set MN_IMPORT_BUDGET to check the budgets')
+    def testImportBudget(self):
+        for name, seconds in importTimes(['import', 'version']).items():
+            self.assertLess(seconds, IMPORT_BUDGET[name], name)
+
+
+if __name__ == '__main__':
+    unittest.main()
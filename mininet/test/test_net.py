@@ -0,0 +1,459 @@
+import asyncio
+import os
+import time
+import unittest
+
+from functools import partial
+from subprocess import DEVNULL, PIPE, Popen
+from threading import Lock
+from unittest.mock import patch
+
+import pytest
+
+from mininet.link import Intf, OVSIntf, TCIntf, OVSLink, TCLink
+from mininet.net import Containernet, Mininet
+from mininet.node import Docker, Host, CPULimitedHost, OVSBridge
+from mininet.util import ( batchErrors, deleteIntfs, finishIpBatch,
+                           makeIntfPairs, quietRun, startIpBatch )
+
+
+def bareNode(cls, intfCls=None, name='h1'):
+    """Return a cls instance without a shell, with an interface of
+       class intfCls if given"""
+    node = cls.__new__(cls)
+    node.name = name
+    node.intfs, node.nameToIntf = {}, {}
+    if intfCls:
+        intf = intfCls.__new__(intfCls)
+        intf.name, intf.node = name + '-eth0', node
+        intf.ip = intf.mac = intf.prefixLen = None
+        node.intfs[0] = node.nameToIntf[intf.name] = intf
+    node.defaultIntf = lambda: node.intfs.get(0)
+    return node
+
+
+def batchPopen(output='', returncode=0):
+    "Return a popen() for a batch process that prints output"
+    def popen(_cmd, **params):
+        return Popen(['sh', '-c', 'cat > /dev/null; printf "%s"; exit %d' %
+                      (output, returncode)], **params)
+    return popen
+
+
+class testConfigHosts( unittest.TestCase ):
+
+    def testRecordConfig(self):
+        class ParsingHost(Host):
+            def config(self, **params):
+                self.cmd('ip link show').split()
+                return Host.config(self, **params)
+        self.assertTrue(Mininet._recordConfig(bareNode(Host)))
+        self.assertTrue(Mininet._recordConfig(bareNode(Host, Intf)))
+        self.assertTrue(Mininet._recordConfig(bareNode(Host, TCIntf)))
+        # Config overrides may parse the output of cmd()
+        self.assertFalse(Mininet._recordConfig(bareNode(Host, OVSIntf)))
+        self.assertFalse(Mininet._recordConfig(bareNode(ParsingHost)))
+        self.assertFalse(
+            Mininet._recordConfig(bareNode(CPULimitedHost, Intf)))
+
+    def testRecording(self):
+        host = bareNode(Host, Intf)
+        host.startRecording()
+        host.setIP('10.0.0.1/8')
+        self.assertEqual(host.cmd('sleep 1 &'), '')
+        self.assertEqual(host.stopRecording(),
+                         'ip address flush dev h1-eth0; '
+                         'ip address add 10.0.0.1/8 dev h1-eth0; sleep 1 &')
+        self.assertEqual(host.IP(), '10.0.0.1')
+
+    def testUpdateIntfs(self):
+        host = bareNode(Host, Intf)
+        addrs = ('some output\n'
+                 '[{"ifname":"lo","address":"00:00:00:00:00:00"},'
+                 '{"ifname":"h1-eth0","address":"00:00:00:00:00:01",'
+                 '"addr_info":[{"family":"inet6","local":"fe80::1"},'
+                 '{"family":"inet","local":"10.0.0.1","prefixlen":8}]}]\n')
+        self.assertTrue(host.updateIntfs(addrs))
+        intf = host.defaultIntf()
+        self.assertEqual((intf.IP(), intf.MAC(), intf.prefixLen),
+                         ('10.0.0.1', '00:00:00:00:00:01', 8))
+        # ip versions without JSON support leave the addresses alone
+        self.assertFalse(host.updateIntfs('Option "-j" is unknown, '
+                                          'try "ip -help".\n'))
+        self.assertEqual(intf.IP(), '10.0.0.1')
+
+
+class FakeDocker( Docker ):
+    "Docker host without container or shell, which takes a while to create"
+
+    lock = Lock()
+    running = peak = 0
+
+    def __init__(self, name, **params):
+        self.name, self.params, self.starting = name, params, False
+        with self.lock:
+            FakeDocker.running += 1
+            FakeDocker.peak = max(FakeDocker.peak, FakeDocker.running)
+        time.sleep(0.2)
+        with self.lock:
+            FakeDocker.running -= 1
+        if params.get('fail'):
+            raise Exception('cannot create %s' % name)
+
+
+class testAddDockers( unittest.TestCase ):
+
+    def setUp(self):
+        FakeDocker.peak = 0
+
+    def testConcurrent(self):
+        net = Containernet(controller=None, build=False, dockerThreads=4)
+        dockers = net.addDockers(['d0', 'd1', ('d2', {'ip': '10.0.0.99'}),
+                                  'd3'], cls=FakeDocker, dimage='ubuntu')
+        self.assertEqual(FakeDocker.peak, 4)
+        self.assertEqual([d.name for d in dockers], ['d0', 'd1', 'd2', 'd3'])
+        self.assertEqual(net.hosts, dockers)
+        self.assertEqual([d.params['ip'] for d in dockers],
+                         ['10.0.0.1/8', '10.0.0.2/8', '10.0.0.99',
+                          '10.0.0.4/8'])
+        self.assertTrue(all(d.params['dimage'] == 'ubuntu' and
+                            d.params['waitPrompt'] is False
+                            for d in dockers))
+
+    def testOneAtATime(self):
+        net = Containernet(controller=None, build=False, dockerThreads=1)
+        net.addDockers(['d0', 'd1'], cls=FakeDocker)
+        self.assertEqual(FakeDocker.peak, 1)
+
+    def testError(self):
+        net = Containernet(controller=None, build=False)
+        with self.assertRaisesRegex(Exception, 'cannot create d1'):
+            net.addDockers(['d0', ('d1', {'fail': True}), 'd2'],
+                           cls=FakeDocker)
+        # the others are kept, so that stop() removes them
+        self.assertEqual([d.name for d in net.hosts], ['d0', 'd2'])
+
+
+class testIpBatch( unittest.TestCase ):
+
+    def testMakeIntfPairs(self):
+        class Ns(object):
+            def __init__(self, pid):
+                self.pid = pid
+        with patch('mininet.util.ipBatch', return_value=('', 0)) as ipBatch:
+            makeIntfPairs([])
+            ipBatch.assert_not_called()
+            makeIntfPairs([('h1-eth0', 's1-eth1', None, None, Ns(10), None),
+                           ('h2-eth0', 'h3-eth0', '00:00:00:00:00:02',
+                            '00:00:00:00:00:03', Ns(20), Ns(30))])
+        ipBatch.assert_called_once_with([
+            'link add name h1-eth0 netns 10 type veth peer name s1-eth1',
+            'link add name h2-eth0 address 00:00:00:00:00:02 netns 20 '
+            'type veth peer name h3-eth0 address 00:00:00:00:00:03 netns 30'])
+        error = 'RTNETLINK answers: File exists\nCommand failed -:1\n'
+        with patch('mininet.util.ipBatch', return_value=(error, 1)):
+            with self.assertRaisesRegex(Exception, 'File exists'):
+                makeIntfPairs([('h1-eth0', 's1-eth1', None, None, None,
+                                None)])
+
+    def testBatchErrors(self):
+        output = ('Error: Exclusivity flag on, cannot modify.\n'
+                  'Command failed -:2\n'
+                  'RTNETLINK answers: No such file or directory\n'
+                  'We have an error talking to the kernel\n'
+                  'Command failed -:5\n')
+        self.assertEqual(batchErrors(output), {
+            2: 'Error: Exclusivity flag on, cannot modify.',
+            5: 'RTNETLINK answers: No such file or directory\n'
+               'We have an error talking to the kernel'})
+        self.assertEqual(batchErrors(''), {})
+
+    def testStartIpBatch(self):
+        host = bareNode(Host)
+        calls = []
+
+        def popen(cmd, **params):
+            "Echo the commands that ip would read"
+            calls.append(cmd)
+            return Popen(['cat'], **params)
+
+        host.popen = popen
+        lines = ['link set lo up', 'neigh flush all']
+        for force in (False, True):
+            output, returncode = finishIpBatch(
+                startIpBatch(lines, node=host, force=force))
+            self.assertEqual((output, returncode),
+                             ('link set lo up\nneigh flush all\n', 0))
+        self.assertEqual(calls, [['ip', '-batch', '-'],
+                                 ['ip', '-force', '-batch', '-']])
+        host.popen = lambda cmd, **params: None
+        self.assertIsNone(startIpBatch(lines, node=host))
+
+    def testDeleteIntfs(self):
+        def delete(output, returncode):
+            "Return the lines and result of deleteIntfs() with ip's output"
+            popen = batchPopen(output, returncode)
+            with patch('mininet.util.startIpBatch',
+                       side_effect=lambda lines, **params: popen(
+                           None, stdin=DEVNULL, stdout=PIPE)) as start:
+                result = deleteIntfs(['h1-eth0', 'h2-eth0'], group=7)
+            self.assertEqual(start.call_args[1], {'force': True})
+            return start.call_args[0][0], result
+
+        lines, result = delete('', 0)
+        self.assertEqual(lines, ['link set dev h1-eth0 group 7',
+                                 'link set dev h2-eth0 group 7',
+                                 'link del group 7'])
+        self.assertEqual(result, ('', 0))
+        # Interfaces that are gone, and so the empty group, are fine
+        gone = ('Cannot find device "h1-eth0"\nCommand failed -:1\n'
+                'Cannot find device "h2-eth0"\nCommand failed -:2\n'
+                'RTNETLINK answers: No such device\nCommand failed -:3\n')
+        self.assertEqual(delete(gone, 1)[1], ('', 0))
+        # Other errors are returned with their lines
+        busy = 'RTNETLINK answers: Device or resource busy\n'
+        self.assertEqual(delete(busy + 'Command failed -:3\n', 1)[1],
+                         ('link del group 7: ' + busy, 1))
+        self.assertEqual(delete('ip: not found\n', 127)[1],
+                         ('ip: not found\n', 127))
+
+    def testStaticArp(self):
+        net = Mininet(build=False)
+        net.hosts = [bareNode(Host, Intf, 'h%d' % i) for i in range(1, 4)]
+        for i, host in enumerate(net.hosts, 1):
+            intf = host.defaultIntf()
+            intf.ip, intf.prefixLen = '10.0.0.%d' % i, 8
+            intf.mac = '00:00:00:00:00:0%d' % i
+            host.intfList = lambda intf=intf: [intf]
+            host.popen = batchPopen()
+        # The second entry of h1 fails
+        net.hosts[0].popen = batchPopen('RTNETLINK answers: Invalid argument\n'
+                                        'Command failed -:2\n', 1)
+        with patch('mininet.net.startIpBatch', wraps=startIpBatch) as start, \
+                patch('mininet.net.error') as error:
+            net.staticArp()
+        self.assertEqual(start.call_count, 3)
+        self.assertEqual(start.call_args_list[0], (([
+            'neigh replace 10.0.0.2 lladdr 00:00:00:00:00:02 dev h1-eth0 '
+            'nud permanent',
+            'neigh replace 10.0.0.3 lladdr 00:00:00:00:00:03 dev h1-eth0 '
+            'nud permanent'],), {'node': net.hosts[0], 'force': True}))
+        error.assert_called_once_with(
+            '*** Error setting ARP entry of h1: neigh replace 10.0.0.3 '
+            'lladdr 00:00:00:00:00:03 dev h1-eth0 nud permanent: '
+            'RTNETLINK answers: Invalid argument\n')
+
+
+class PingHost( object ):
+    "Host whose ping script prints canned output"
+
+    def __init__(self, name, ip, output):
+        self.name, self.ip, self.output = name, ip, output
+        self.intfs = {0: name + '-eth0'} if ip else {}
+        self.scripts = []
+
+    def IP(self):
+        return self.ip
+
+    def popen(self, cmd, **params):
+        self.scripts.append(cmd[-1])
+        return Popen(['printf', '%s', self.output], stdout=PIPE, **params)
+
+
+class testPingResults( unittest.TestCase ):
+
+    def testParse(self):
+        ping = 'PING %s (%s) 56(84) bytes of data. '
+        h1 = PingHost('h1', '10.0.0.1', (
+            '10.0.0.2 ' + ping % (('10.0.0.2',) * 2) +
+            '64 bytes from 10.0.0.2: icmp_seq=1 ttl=64 time=0.060 ms '
+            '--- 10.0.0.2 ping statistics --- 1 packets transmitted, '
+            '1 received, 0% packet loss, time 0ms '
+            'rtt min/avg/max/mdev = 0.060/0.060/0.060/0.000 ms\n'
+            '10.0.0.3 ' + ping % (('10.0.0.3',) * 2) +
+            '--- 10.0.0.3 ping statistics --- 1 packets transmitted, '
+            '0 received, 100% packet loss, time 0ms\n'))
+        h2 = PingHost('h2', '10.0.0.2', (
+            '10.0.0.1 ' + ping % (('10.0.0.1',) * 2) +
+            'From 10.0.0.2 icmp_seq=1 Destination Host Unreachable\n'))
+        h3 = PingHost('h3', '10.0.0.3', '')
+        # Hosts without interfaces ping, but aren't pinged
+        h4 = PingHost('h4', None, '')
+        hosts = [h1, h2, h3, h4]
+        net = Mininet(build=False)
+        results = net.pingResults(hosts, timeout='1')
+        self.assertIn('for ip in 10.0.0.2 10.0.0.3;', h1.scripts[0])
+        self.assertIn('-W 1 ', h1.scripts[0])
+        self.assertIn('for ip in 10.0.0.1 10.0.0.2 10.0.0.3;',
+                      h4.scripts[0])
+        self.assertEqual(results, {
+            (h1, h2): (1, 1, 0.06, 0.06, 0.06, 0.0),
+            (h1, h3): Mininet._pingErrorTuple,
+            (h2, h1): Mininet._pingErrorTuple})
+        _hosts, loss, rtt = net.pingMatrix(hosts)
+        self.assertEqual(loss[0], [None, 0.0, 1.0, None])
+        self.assertEqual(loss[1][0], 1.0)
+        self.assertEqual(loss[2], [None] * 4)
+        self.assertEqual(rtt[0], [None, 0.06, None, None])
+
+
+@pytest.mark.skipif(os.geteuid() != 0 or not quietRun('which ovs-vsctl'),
+                    reason='needs root and Open vSwitch')
+class testNetwork( unittest.TestCase ):
+    "Networks of plain hosts and standalone switches"
+
+    switch = OVSBridge
+
+    def setUp(self):
+        self.net = Mininet(switch=self.switch, controller=None)
+
+    def tearDown(self):
+        if self.net:
+            self.net.stop()
+
+    def star(self, nhosts):
+        "Add hosts h0, h1, ... linked to a switch s0"
+        s0 = self.net.addSwitch('s0')
+        hosts = [self.net.addHost('h%d' % i) for i in range(nhosts)]
+        for h in hosts:
+            self.net.addLink(h, s0)
+        return s0, hosts
+
+    def testCommandParallel(self):
+        _s0, hosts = self.star(3)
+        self.net.start()
+        outputs = self.net.cmdAll('echo $((1 + 1))')
+        self.assertEqual(set(outputs), set(hosts))
+        self.assertTrue(all(o.strip() == '2' for o in outputs.values()))
+        outputs = self.net.parallel({'h0': 'sleep 30', 'h1': 'echo done'},
+                                    timeout=2)
+        self.assertIn('done', outputs['h1'])
+        # the interrupted shell is usable again
+        self.assertEqual(hosts[0].cmd('echo ok').strip(), 'ok')
+        # a command that ignores the interrupt is abandoned
+        self.net.interruptGrace = 1
+        start = time.time()
+        self.net.parallel({'h2': "trap '' INT; sleep 30"}, timeout=1)
+        self.assertLess(time.time() - start, 10)
+        self.assertTrue(hosts[2].waiting)
+
+    def testCommandAsync(self):
+        _s0, hosts = self.star(2)
+        self.net.start()
+
+        async def run():
+            outputs = await asyncio.gather(
+                *(h.acmd('echo', h.name) for h in hosts))
+            self.assertEqual([o.strip() for o in outputs], ['h0', 'h1'])
+            chunks = [c async for c in hosts[0].astream('seq 1 3')]
+            self.assertEqual(''.join(chunks).split(), ['1', '2', '3'])
+            proc = await hosts[0].apopen('echo', 'popen')
+            out, _err = await proc.communicate()
+            self.assertEqual(out.strip(), b'popen')
+
+        asyncio.run(run())
+
+    def testCommandAsyncTimeout(self):
+        _s0, hosts = self.star(2)
+        self.net.start()
+        h0, h1 = hosts
+        h1.interruptGrace = 1
+
+        async def run(host, cmd):
+            start = time.time()
+            output = await host.acmd(cmd, timeout=1)
+            self.assertLess(time.time() - start, 10)
+            return output
+
+        # the interrupted command returns its output so far
+        output = asyncio.run(run(h0, 'echo started; sleep 100'))
+        self.assertIn('started', output)
+        self.assertFalse(h0.waiting)
+        self.assertEqual(h0.cmd('echo ok').strip(), 'ok')
+        # a command that ignores the interrupt is hung up on
+        output = asyncio.run(run(h1, "trap '' INT; echo started; sleep 100"))
+        self.assertIn('started', output)
+        self.assertFalse(h1.waiting)
+
+    def testAddHosts(self):
+        s0 = self.net.addSwitch('s0')
+        hosts = self.net.addHosts(['h0', 'h1', ('h2', {'ip': '10.0.0.99'})])
+        for h in hosts:
+            self.net.addLink(h, s0)
+        self.net.start()
+        self.assertEqual(hosts[2].IP(), '10.0.0.99')
+        self.assertTrue(all(not h.starting and not h.waiting for h in hosts))
+        self.assertEqual(self.net.pingAll(), 0.0)
+
+    def testAddLinks(self):
+        s0 = self.net.addSwitch('s0')
+        h0, h1 = self.net.addHost('h0'), self.net.addHost('h1')
+        links = self.net.addLinks([{'node1': 'h0', 'node2': 's0'},
+                                   {'node1': h1, 'node2': s0, 'port1': 3},
+                                   {'node1': 'h0', 'node2': 's0',
+                                    'cls': partial(TCLink, bw=10)},
+                                   {'node1': 'h0', 'node2': 's0',
+                                    'cls': OVSLink}])
+        self.assertEqual(str(links[1].intf1), 'h1-eth3')
+        self.assertEqual(s0.ports[links[1].intf2], 2)
+        self.assertEqual([str(l.intf1) for l in links[2:]],
+                         ['h0-eth1', 'h0-eth2'])
+        self.assertEqual([s0.ports[l.intf2] for l in links[2:]], [3, 4])
+        self.net.start()
+        self.assertIn('h1-eth3', h1.cmd('ip link'))
+        self.assertEqual(self.net.pingAll(), 0.0)
+
+    def testPingMatrix(self):
+        _s0, hosts = self.star(3)
+        self.net.start()
+        hosts[1].cmd('ip link set h1-eth0 down')
+        matrixHosts, loss, rtt = self.net.pingMatrix(timeout='1')
+        self.assertEqual(matrixHosts, self.net.hosts)
+        self.assertEqual(loss[0][2], 0.0)
+        self.assertEqual(loss[2][0], 0.0)
+        self.assertEqual(loss[0][1], 1.0)
+        self.assertIsNone(loss[0][0])
+        self.assertGreater(rtt[0][2], 0.0)
+        self.assertIsNone(rtt[0][1])
+
+    def testBatchedDelay(self):
+        s0 = self.net.addSwitch('s0')
+        hosts = [self.net.addHost('h%d' % i) for i in range(2)]
+        self.net.addLinks([dict(node1=s0, node2=h, cls=TCLink, delay='100ms')
+                           for h in hosts])
+        self.net.start()
+        # the switch side is configured too, and survives switch startup
+        self.assertIn('netem', s0.cmd('tc qdisc show dev s0-eth1'))
+        _, _, res = self.net.pingFull([hosts[0]], manualdestip='10.0.0.2')[0]
+        self.assertGreaterEqual(res[3], 400)
+        self.assertLessEqual(res[3], 800)
+
+    def testStopRemovesLinks(self):
+        self.star(2)
+        self.net.start()
+        self.assertEqual(self.net.pingAll(), 0.0)
+        net, self.net = self.net, None
+        net.stop()
+        self.assertNotIn('s0-eth', quietRun('ip link show'))
+
+    def testAddRemoveLinks(self):
+        s0 = self.net.addSwitch('s0')
+        h0 = self.net.addHost('h0')
+        self.net.start()
+        links = [self.net.addLink(h0, s0) for _ in range(20)]
+        self.assertEqual(self.net.linksBetween(s0, h0), links)
+        # remove the link on the highest port, then the default interface
+        self.net.delLink(links[-1])
+        self.net.removeLink(node1=s0, node2=h0)
+        self.assertEqual(self.net.linksBetween(h0, s0), links[1:-1])
+        self.assertEqual(h0.defaultIntf(), links[1].intf1)
+        # ports are reused like before
+        link = self.net.addLink(h0, s0)
+        self.assertEqual(h0.ports[link.intf1], 19)
+        self.net.delLinkBetween(h0, s0, allLinks=True)
+        self.assertEqual(self.net.links, [])
+        self.assertEqual(self.net.linkIndex, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+from time import monotonic
+from unittest.mock import patch
+
+from mininet.node import OVSSwitch
+from mininet.ovsdb import OVSDB, OVSDBError, ovsSet, ovsUUIDs
+
+
+class FakeOvsdbServer( threading.Thread ):
+    """Serves one client with the parts of RFC 7047 that OVSDB uses: an Open_vSwitch row whose cur_cfg follows
+    next_cfg, and one Controller row"""
+
+    controller = '2f0f1f5e-0000-0000-0000-000000000001'
+
+    def __init__(self, path):
+        super(FakeOvsdbServer, self).__init__(daemon=True)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(path)
+        self.listener.listen(1)
+        self.conn = None
+        self.lock = threading.Lock()
+        self.next_cfg = 0
+        self.echo_replies = 0
+
+    def send(self, msg):
+        data = json.dumps(msg).encode()
+        with self.lock:
+            # Split messages to exercise the client's framing
+            self.conn.sendall(data[:len(data) // 2])
+            self.conn.sendall(data[len(data) // 2:])
+
+    def update(self, table, uuid, row):
+        self.send({'id': None, 'method': 'update', 'params': ['monitor', {table: {uuid: {'new': row}}}]})
+
+    def result(self, op):
+        if op['op'] == 'mutate':
+            self.next_cfg += 1
+            return {'count': 1}
+        if op['op'] == 'select':
+            return {'rows': [{'next_cfg': self.next_cfg}]}
+        if op['op'] == 'abort':
+            return {'error': 'aborted'}
+        return {}
+
+    def handle(self, msg):
+        if msg.get('method') is None:
+            self.echo_replies += 1
+        elif msg['method'] == 'monitor':
+            self.send({'id': msg['id'], 'error': None, 'result': {
+                'Open_vSwitch': {'ovs': {'new': {'cur_cfg': 0}}},
+                'Controller': {self.controller: {'new': {'is_connected': False}}}}})
+        elif msg['method'] == 'transact':
+            results = [self.result(op) for op in msg['params'][1:]]
+            self.send({'id': msg['id'], 'error': None, 'result': results})
+            # ovs-vswitchd catches up after the reply
+            self.update('Open_vSwitch', 'ovs', {'cur_cfg': self.next_cfg})
+
+    def run(self):
+        self.conn, _ = self.listener.accept()
+        self.send({'id': 'echo', 'method': 'echo', 'params': []})
+        decoder, buf = json.JSONDecoder(), ''
+        while True:
+            data = self.conn.recv(65536)
+            if not data:
+                break
+            buf += data.decode()
+            while buf.strip():
+                try:
+                    msg, end = decoder.raw_decode(buf.lstrip())
+                except ValueError:
+                    break
+                buf = buf.lstrip()[end:]
+                self.handle(msg)
+
+
+class testOVSDB( unittest.TestCase ):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, 'db.sock')
+        self.server = FakeOvsdbServer(path)
+        self.server.start()
+        self.db = OVSDB(path, timeout=5)
+        self.db.monitor({'Open_vSwitch': ['cur_cfg'], 'Controller': ['is_connected']})
+
+    def tearDown(self):
+        self.db.close()
+        self.server.join(5)
+        self.server.listener.close()
+        self.directory.cleanup()
+
+    def testTransactWaitsForVswitchd(self):
+        results = self.db.transact({'op': 'comment', 'comment': 'test'}, wait=True)
+        self.assertEqual(results, [{}])
+        self.assertEqual(self.db.curCfg(), 1)
+        # The server's echo request was answered along the way
+        self.assertEqual(self.server.echo_replies, 1)
+
+    def testTransactError(self):
+        with self.assertRaises(OVSDBError):
+            self.db.transact({'op': 'abort'})
+
+    def testMonitorWakesUp(self):
+        uuid = FakeOvsdbServer.controller
+        self.assertFalse(self.db.row('Controller', uuid)['is_connected'])
+        timer = threading.Timer(0.2, self.server.update, ('Controller', uuid, {'is_connected': True}))
+        timer.start()
+        start = monotonic()
+        self.assertTrue(self.db.waitFor(lambda: self.db.row('Controller', uuid).get('is_connected'), timeout=5))
+        self.assertLess(monotonic() - start, 2)
+        timer.join()
+
+    def testSwitchFallsBackToVsctl(self):
+        switch = OVSSwitch.__new__(OVSSwitch)
+        switch.deployed_name, switch._uuids, switch.failMode = 's1', [], 'secure'
+        replies = {'ovs-vsctl -- get Bridge': '[%s]' % FakeOvsdbServer.controller,
+                   '-- get Controller': 'true'}
+        switch.cmd = lambda cmd, *args, **kwargs: replies[cmd]
+        switch.vsctl = switch.cmd
+        # ovsdb-server goes away
+        self.server.conn.shutdown(socket.SHUT_RDWR)
+        with patch.object(OVSSwitch, '_ovsdb', self.db), \
+                patch('mininet.node.OVSDB', side_effect=OSError('no server')):
+            self.assertTrue(switch.connected())
+            self.assertEqual(switch.controllerUUIDs(), [FakeOvsdbServer.controller])
+            self.assertIsNone(OVSSwitch.ovsdb())
+
+    def testHelpers(self):
+        self.assertEqual(ovsUUIDs(['uuid', 'a']), ['a'])
+        self.assertEqual(ovsUUIDs(ovsSet([['uuid', 'a'], ['uuid', 'b']])), ['a', 'b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
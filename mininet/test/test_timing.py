@@ -0,0 +1,74 @@
+import json
+import os
+import subprocess
+import tempfile
+import time
+import unittest
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from mininet.timing import Timings
+
+
+class Node( object ):
+    pass
+
+
+class testTimings( unittest.TestCase ):
+
+    def testNestedSpans(self):
+        timings = Timings()
+        with timings.span('build'):
+            with timings.span('addLinks', count=2):
+                with timings.span('addLinks', Node):
+                    subprocess.call(['true'])
+                with timings.span('addLinks', partial(Node)):
+                    pass
+        self.assertEqual(list(timings), ['build', 'addLinks'])
+        links = timings['addLinks']
+        # Inner spans of the same phase are only counted per class
+        self.assertEqual(links['count'], 2)
+        self.assertEqual(links['classes']['Node']['count'], 2)
+        self.assertGreaterEqual(links['seconds'],
+                                links['classes']['Node']['seconds'])
+        self.assertGreater(timings['build']['childSeconds'], 0)
+
+    def testSpanCountsFailures(self):
+        timings = Timings()
+        with self.assertRaises(ValueError):
+            with timings.span('addHosts', Node):
+                raise ValueError()
+        self.assertEqual(timings['addHosts']['count'], 1)
+        self.assertEqual(timings.active, [])
+
+    def testThreadedSpans(self):
+        timings = Timings()
+        with timings.span('addHosts', count=8):
+            with ThreadPoolExecutor(4) as pool:
+                for future in [pool.submit(self.span, timings)
+                               for _ in range(8)]:
+                    future.result()
+        hosts = timings['addHosts']
+        self.assertEqual(hosts['count'], 8)
+        self.assertEqual(hosts['classes']['Node']['count'], 8)
+        self.assertEqual(timings.active, [])
+
+    @staticmethod
+    def span(timings):
+        with timings.span('addHosts', Node):
+            time.sleep(0.01)
+
+    def testDump(self):
+        timings = Timings()
+        with timings.span('start'):
+            pass
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'timings.json')
+            timings.dump(filename)
+            with open(filename) as f:
+                self.assertEqual(json.load(f), timings)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+
+from mininet.topo import MultiGraph, Topo
+
+
+class testTopo( unittest.TestCase ):
+
+    def testKeys(self):
+        g = MultiGraph()
+        self.assertEqual(g.add_edge('a', 'b'), 1)
+        self.assertEqual(g.add_edge('b', 'a'), 2)
+        self.assertEqual(g.add_edge('a', 'b', key=7), 7)
+        self.assertEqual(g.add_edge('a', 'b'), 8)
+        # The same key replaces the edge
+        self.assertEqual(g.add_edge('a', 'b', key=2, attr_dict={'x': 1}), 2)
+        self.assertEqual(len(g.edges()), 4)
+        self.assertEqual(g['b']['a'][2], {'x': 1})
+        self.assertEqual(g.add_edge('a', 'c'), 1)
+
+    def testNaturalOrder(self):
+        topo = Topo()
+        for name in ('s10', 's2', 'h1'):
+            topo.addSwitch(name) if name[0] == 's' else topo.addHost(name)
+        topo.addLink('s10', 'h1')
+        topo.addLink('s2', 'h1')
+        self.assertEqual(topo.switches(), ['s2', 's10'])
+        self.assertEqual(topo.links(sort=True), [('s2', 'h1'), ('s10', 'h1')])
+        # Adding nodes and links updates the cached order
+        topo.addSwitch('s1')
+        topo.addLink('s1', 'h1')
+        self.assertEqual(topo.nodes(), ['h1', 's1', 's2', 's10'])
+        self.assertEqual(topo.links(sort=True)[0], ('s1', 'h1'))
+
+    def testLinkInfo(self):
+        topo = Topo()
+        topo.addHost('h1')
+        topo.addSwitch('s1')
+        topo.addLink('h1', 's1', bw=10)
+        topo.addLink('h1', 's1', bw=10)
+        self.assertEqual(topo.port('h1', 's1'), [(0, 1), (1, 2)])
+        info = topo.linkInfo('h1', 's1', key=2)
+        self.assertEqual(info, dict(bw=10, node1='h1', node2='s1',
+                                    port1=1, port2=2))
+        # Changes to the returned info stick, and are not shared
+        info['bw'] = 20
+        self.assertEqual([i['bw'] for _s, _d, i in
+                          topo.links(withInfo=True)], [10, 20])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+Timing of the phases of building and starting a network.
+
+Mininet.build() and Mininet.start() record how long each of their
+phases takes in net.timings, e.g.
+
+    net.timings[ 'addLinks' ] = {
+        'seconds': 1.2, 'count': 300, 'childSeconds': 0.4,
+        'classes': { 'TCLink': { 'seconds': 1.1, 'count': 300,
+                                 'childSeconds': 0.4 } } }
+
+seconds: wall clock time spent in the phase
+count: number of nodes or links it handled
+childSeconds: CPU time of the subprocesses (ip, tc, ovs-vsctl...)
+    that exited during the phase; long running processes, such as
+    node shells, only count once they exit
+classes: the same, per node or link class, for phases that handle
+    nodes or links one class at a time
+
+net.timings is a dict, so it can be saved with net.timings.dump().
+Spans may be recorded from several threads at once, e.g. by
+Containernet.addDockers(); the seconds of its classes are then the
+sum over all threads, and can exceed those of the phase.
+"""
+
+import json
+
+from contextlib import contextmanager
+from functools import partial
+from resource import getrusage, RUSAGE_CHILDREN
+from threading import Lock
+from time import monotonic
+
+
+def childSeconds():
+    "Return CPU time used by our subprocesses that have exited"
+    usage = getrusage( RUSAGE_CHILDREN )
+    return usage.ru_utime + usage.ru_stime
+
+
+def className( cls ):
+    "Return name of cls, or of the class created by a partial()"
+    while isinstance( cls, partial ):
+        cls = cls.func
+    return getattr( cls, '__name__', str( cls ) )
+
+
+class Timings( dict ):
+    "Phase name -> time spent in it (see above)"
+
+    def __init__( self ):
+        super( Timings, self ).__init__()
+        # Phases with an open span, in any thread
+        self.active = []
+        self.lock = Lock()
+
+    @staticmethod
+    def _add( entry, seconds, count, children ):
+        "Add a span to entry"
+        entry[ 'seconds' ] += seconds
+        entry[ 'count' ] += count
+        entry[ 'childSeconds' ] += children
+
+    @staticmethod
+    def _entry():
+        "Return new, empty entry"
+        return { 'seconds': 0.0, 'count': 0, 'childSeconds': 0.0 }
+
+    @contextmanager
+    def span( self, phase, cls=None, count=1 ):
+        """Time the code in a with block as part of phase. A span
+           inside another span of the same phase only adds to the
+           numbers of cls, so that the phase is not counted twice.
+           phase: phase name
+           cls: class of the nodes or links handled (optional)
+           count: number of nodes or links handled (1)"""
+        with self.lock:
+            outer = phase not in self.active
+            # Keep phases in the order in which they start
+            entry = self.setdefault( phase, self._entry() )
+            self.active.append( phase )
+        start, startChildren = monotonic(), childSeconds()
+        try:
+            yield
+        finally:
+            seconds = monotonic() - start
+            children = childSeconds() - startChildren
+            with self.lock:
+                # Spans of other threads may have started since this one
+                self.active.remove( phase )
+                if outer:
+                    self._add( entry, seconds, count, children )
+                if cls is not None:
+                    classes = entry.setdefault( 'classes', {} )
+                    self._add( classes.setdefault( className( cls ),
+                                                   self._entry() ),
+                               seconds, count, children )
+
+    def dumps( self, **kwargs ):
+        "Return timings as JSON; kwargs are passed to json.dumps()"
+        kwargs.setdefault( 'indent', 2 )
+        return json.dumps( self, **kwargs )
+
+    def dump( self, filename ):
+        "Save timings as JSON to filename"
+        with open( filename, 'w' ) as f:
+            f.write( self.dumps() + '\n' )
@@ -11,17 +11,34 @@
 setup for testing, and can even be emulated with the Mininet package.
 """
 
-from mininet.util import irange, natural, naturalSeq
+from array import array
+
+from mininet.util import irange, natural
 
 # pylint: disable=too-many-arguments
 
 
 class MultiGraph( object ):
-    "Utility class to track nodes and edges - replaces networkx.MultiGraph"
+    """Utility class to track nodes and edges - replaces networkx.MultiGraph
+       Edges are kept in flat arrays of node numbers, in the order in
+       which they were added, so that graphs with many edges stay small.
+       Their attribute dicts are stored as given, and may be shared."""
 
     def __init__( self ):
         self.node = {}
-        self.edge = {}
+        # Node name <-> number, for nodes with edges
+        self.ids = {}
+        self.names = []
+        # Edge i connects names[ srcs[ i ] ] and names[ dsts[ i ] ]
+        self.srcs = array( 'l' )
+        self.dsts = array( 'l' )
+        self.keys = []
+        self.attrs = []
+        # Edges per pair of nodes (see _pair()): the index of the edge,
+        # or, for several edges, [ next free key, index, index... ]
+        self.pairs = {}
+        # Edge indices per node number, built when needed
+        self.adjacency = None
 
     def add_node( self, node, attr_dict=None, **attrs):
         """Add node to graph
@@ -32,6 +49,36 @@ def add_node( self, node, attr_dict=None, **attrs):
         attr_dict.update( attrs )
         self.node[ node ] = attr_dict
 
+    def nodeId( self, node ):
+        "Return number of node, adding the node if necessary"
+        nid = self.ids.get( node )
+        if nid is None:
+            self.node.setdefault( node, {} )
+            nid = self.ids[ node ] = len( self.names )
+            self.names.append( node )
+        return nid
+
+    @staticmethod
+    def _pair( s, d ):
+        "Return key in pairs for node numbers s and d"
+        return ( s << 32 | d ) if s <= d else ( d << 32 | s )
+
+    @staticmethod
+    def _pairEdges( entry ):
+        "Return edge indices of pairs entry"
+        if entry is None:
+            return ()
+        return ( entry, ) if isinstance( entry, int ) else entry[ 1: ]
+
+    def _nextKey( self, entry ):
+        "Return next ordinal number for a new edge of pairs entry"
+        if entry is None:
+            return 1
+        if isinstance( entry, int ):
+            key = self.keys[ entry ]
+            return key + 1 if isinstance( key, int ) else 1
+        return entry[ 0 ]
+
     def add_edge( self, src, dst, key=None, attr_dict=None, **attrs ):
         """Add edge to graph
            key: optional key
@@ -40,18 +87,47 @@ def add_edge( self, src, dst, key=None, attr_dict=None, **attrs ):
            warning: updates attr_dict with attrs"""
         attr_dict = {} if attr_dict is None else attr_dict
         attr_dict.update( attrs )
-        self.node.setdefault( src, {} )
-        self.node.setdefault( dst, {} )
-        self.edge.setdefault( src, {} )
-        self.edge.setdefault( dst, {} )
-        self.edge[ src ].setdefault( dst, {} )
-        entry = self.edge[ dst ][ src ] = self.edge[ src ][ dst ]
-        # If no key, pick next ordinal number
+        return self.addEdge( src, dst, key, attr_dict )[ 0 ]
+
+    def addEdge( self, src, dst, key, attrs ):
+        """Add edge to graph, or replace the edge with the same key
+           key: key, or None to pick the next ordinal number
+           attrs: attribute dict, stored as is
+           returns: key, edge index"""
+        s, d = self.nodeId( src ), self.nodeId( dst )
+        pair = self._pair( s, d )
+        entry = self.pairs.get( pair )
+        nextKey = self._nextKey( entry )
         if key is None:
-            keys = [ k for k in entry.keys() if isinstance( k, int ) ]
-            key = max( [ 0 ] + keys ) + 1
-        entry[ key ] = attr_dict
-        return key
+            key = nextKey
+        for i in self._pairEdges( entry ):
+            if self.keys[ i ] == key:
+                self.srcs[ i ], self.dsts[ i ] = s, d
+                self.attrs[ i ] = attrs
+                return key, i
+        i = len( self.keys )
+        self.srcs.append( s )
+        self.dsts.append( d )
+        self.keys.append( key )
+        self.attrs.append( attrs )
+        if isinstance( key, int ):
+            nextKey = max( nextKey, key + 1 )
+        if entry is None:
+            self.pairs[ pair ] = i
+        elif isinstance( entry, int ):
+            self.pairs[ pair ] = [ nextKey, entry, i ]
+        else:
+            entry[ 0 ] = nextKey
+            entry.append( i )
+        self.adjacency = None
+        return key, i
+
+    def edgeIndices( self, src, dst ):
+        "Return indices of the edges between src and dst"
+        s, d = self.ids.get( src ), self.ids.get( dst )
+        if s is None or d is None:
+            return ()
+        return self._pairEdges( self.pairs.get( self._pair( s, d ) ) )
 
     def nodes( self, data=False):
         """Return list of graph nodes
@@ -60,30 +136,48 @@ def nodes( self, data=False):
 
     def edges_iter( self, data=False, keys=False ):
         "Iterator: return graph edges, optionally with data and keys"
-        for src, entry in self.edge.items():
-            for dst, entrykeys in entry.items():
-                if src > dst:
-                    # Skip duplicate edges
-                    continue
-                for k, attrs in entrykeys.items():
-                    if data:
-                        if keys:
-                            yield( src, dst, k, attrs )
-                        else:
-                            yield( src, dst, attrs )
-                    else:
-                        if keys:
-                            yield( src, dst, k )
-                        else:
-                            yield( src, dst )
+        names = self.names
+        for s, d, k, attrs in zip( self.srcs, self.dsts, self.keys,
+                                   self.attrs ):
+            src, dst = names[ s ], names[ d ]
+            if src > dst:
+                src, dst = dst, src
+            if data:
+                if keys:
+                    yield( src, dst, k, attrs )
+                else:
+                    yield( src, dst, attrs )
+            else:
+                if keys:
+                    yield( src, dst, k )
+                else:
+                    yield( src, dst )
 
     def edges( self, data=False, keys=False ):
         "Return list of graph edges"
         return list( self.edges_iter( data=data, keys=keys ) )
 
     def __getitem__( self, node ):
-        "Return link dict for given src node"
-        return self.edge[ node ]
+        """Return link dict { dst: { key: attrs } } for given src node;
+           it is a new dict, so use add_edge() to change edges"""
+        s = self.ids[ node ]
+        if self.adjacency is None:
+            self.adjacency = [ [] for _ in self.names ]
+            for i, ( src, dst ) in enumerate( zip( self.srcs, self.dsts ) ):
+                self.adjacency[ src ].append( i )
+                if dst != src:
+                    self.adjacency[ dst ].append( i )
+        links = {}
+        for i in self.adjacency[ s ]:
+            other = self.dsts[ i ] if self.srcs[ i ] == s else self.srcs[ i ]
+            links.setdefault( self.names[ other ],
+                              {} )[ self.keys[ i ] ] = self.attrs[ i ]
+        return links
+
+    @property
+    def edge( self ):
+        "Return dict { src: { dst: { key: attrs } } } (see __getitem__)"
+        return { node: self[ node ] for node in self.names }
 
     def __len__( self ):
         "Return the number of nodes"
@@ -100,7 +194,11 @@ def convertTo( self, cls, data=False, keys=False ):
 
 
 class Topo( object ):
-    "Data center network representation for structured multi-trees."
+    """Data center network representation for structured multi-trees.
+       Links are edges of self.g, whose attributes are the link
+       options, shared by links with the same options; their ports
+       are kept in port1s and port2s, by edge index, and their info
+       dicts are only created when needed."""
 
     def __init__( self, *args, **params ):
         """Topo object.
@@ -113,8 +211,20 @@ def __init__( self, *args, **params ):
         self.hopts = params.pop( 'hopts', {} )
         self.sopts = params.pop( 'sopts', {} )
         self.lopts = params.pop( 'lopts', {} )
-        # ports[src][dst][sport] is port on dst that connects to src
-        self.ports = {}
+        # Ports of link i (ports may be any value, so no arrays)
+        self.port1s = []
+        self.port2s = []
+        # Info dicts of links, by index, once linkInfo() returned
+        # them or setlinkInfo() set them, so that changes stick
+        self.infos = {}
+        # Link options tuple -> options dict shared by links
+        self.shared = {}
+        # Node -> set of its port numbers
+        self.usedPorts = {}
+        # Cached nodes in natural order, their ranks (see _ranks())
+        # and link indices in natural order, with and without keys
+        self.nodeOrder = self.ranks = None
+        self.linkOrder = {}
         self.build( *args, **params )
 
     def build( self, *args, **params ):
@@ -157,17 +267,54 @@ def addLink( self, node1, node2, port1=None, port2=None,
         if not opts and self.lopts:
             opts = self.lopts
         port1, port2 = self.addPort( node1, node2, port1, port2 )
-        opts = dict( opts )
-        opts.update( node1=node1, node2=node2, port1=port1, port2=port2 )
-        return self.g.add_edge(node1, node2, key, opts )
+        key, i = self.g.addEdge( node1, node2, key, self._shared( opts ) )
+        if i == len( self.port1s ):
+            self.port1s.append( port1 )
+            self.port2s.append( port2 )
+        else:
+            # Replaced the link with the same key
+            self.port1s[ i ], self.port2s[ i ] = port1, port2
+            self.infos.pop( i, None )
+        self.linkOrder = {}
+        return key
+
+    def _shared( self, opts ):
+        "Return copy of link options opts, shared with equal options"
+        try:
+            return self.shared.setdefault( tuple( sorted( opts.items() ) ),
+                                           dict( opts ) )
+        except TypeError:
+            # Unhashable option values, such as params1 dicts
+            return dict( opts )
 
     def nodes( self, sort=True ):
         "Return nodes in graph"
         if sort:
-            return self.sorted( self.g.nodes() )
+            return list( self._sortedNodes() )
         else:
             return self.g.nodes()
 
+    def _sortedNodes( self ):
+        "Return cached list of nodes in natural order"
+        if ( self.nodeOrder is None or
+             len( self.nodeOrder ) != len( self.g.node ) ):
+            self.nodeOrder = self.sorted( self.g.nodes() )
+            self.ranks = None
+        return self.nodeOrder
+
+    def _ranks( self ):
+        """Return dict of node -> rank in natural order, where nodes
+           that sort the same (e.g. h1 and h01) have the same rank"""
+        nodes = self._sortedNodes()
+        if self.ranks is None:
+            self.ranks, last, rank = {}, None, -1
+            for node in nodes:
+                key = natural( node )
+                if key != last:
+                    last, rank = key, rank + 1
+                self.ranks[ node ] = rank
+        return self.ranks
+
     def isSwitch( self, n ):
         "Returns true if node is a switch."
         return self.g.node[ n ].get( 'isSwitch', False )
@@ -176,26 +323,74 @@ def switches( self, sort=True ):
         """Return switches.
            sort: sort switches alphabetically
            returns: dpids list of dpids"""
-        return [ n for n in self.nodes( sort ) if self.isSwitch( n ) ]
+        nodes = self._sortedNodes() if sort else self.g.nodes()
+        return [ n for n in nodes if self.isSwitch( n ) ]
 
     def hosts( self, sort=True ):
         """Return hosts.
            sort: sort hosts alphabetically
            returns: list of hosts"""
-        return [ n for n in self.nodes( sort ) if not self.isSwitch( n ) ]
-
-    def iterLinks( self, withKeys=False, withInfo=False ):
+        nodes = self._sortedNodes() if sort else self.g.nodes()
+        return [ n for n in nodes if not self.isSwitch( n ) ]
+
+    def _info( self, i ):
+        "Return new info dict of link i"
+        g = self.g
+        info = dict( g.attrs[ i ] )
+        info.update( node1=g.names[ g.srcs[ i ] ],
+                     node2=g.names[ g.dsts[ i ] ],
+                     port1=self.port1s[ i ], port2=self.port2s[ i ] )
+        return info
+
+    def _linkNodes( self, i ):
+        "Return node1, node2 of link i"
+        info = self.infos.get( i )
+        if info is not None:
+            return info[ 'node1' ], info[ 'node2' ]
+        g = self.g
+        return g.names[ g.srcs[ i ] ], g.names[ g.dsts[ i ] ]
+
+    def _sortedLinks( self, withKeys=False ):
+        """Return cached list of link indices, sorted by node1 and node2
+           (and key) in natural order"""
+        order = self.linkOrder.get( withKeys )
+        if order is None:
+            ranks, keys = self._ranks(), self.g.keys
+
+            def sortKey( i ):
+                "Sort key of link i"
+                node1, node2 = self._linkNodes( i )
+                if withKeys:
+                    return ranks[ node1 ], ranks[ node2 ], natural( keys[ i ] )
+                return ranks[ node1 ], ranks[ node2 ]
+
+            order = self.linkOrder[ withKeys ] = sorted(
+                range( len( self.port1s ) ), key=sortKey )
+        return order
+
+    def iterLinks( self, withKeys=False, withInfo=False, sort=False ):
         """Return links (iterator)
            withKeys: return link keys
-           withInfo: return link info
+           withInfo: return link info; a new dict, unless linkInfo()
+               returned it before, so use setlinkInfo() to change it
+           sort: sort links alphabetically, preserving (src, dst) order
            returns: list of ( src, dst [,key, info ] )"""
-        for _src, _dst, key, info in self.g.edges_iter( data=True, keys=True ):
-            node1, node2 = info[ 'node1' ], info[ 'node2' ]
+        if sort:
+            indices = self._sortedLinks( withKeys )
+        else:
+            indices = range( len( self.port1s ) )
+        keys = self.g.keys
+        for i in indices:
+            node1, node2 = self._linkNodes( i )
+            if withInfo:
+                info = self.infos.get( i )
+                if info is None:
+                    info = self._info( i )
             if withKeys:
                 if withInfo:
-                    yield( node1, node2, key, info )
+                    yield( node1, node2, keys[ i ], info )
                 else:
-                    yield( node1, node2, key )
+                    yield( node1, node2, keys[ i ] )
             else:
                 if withInfo:
                     yield( node1, node2, info )
@@ -208,12 +403,7 @@ def links( self, sort=False, withKeys=False, withInfo=False ):
            withKeys: return link keys
            withInfo: return link info
            returns: list of ( src, dst [,key, info ] )"""
-        links = list( self.iterLinks( withKeys, withInfo ) )
-        if not sort:
-            return links
-        # Ignore info when sorting
-        tupleSize = 3 if withKeys else 2
-        return sorted( links, key=( lambda l: naturalSeq( l[ :tupleSize ] ) ) )
+        return list( self.iterLinks( withKeys, withInfo, sort ) )
 
     # This legacy port management mechanism is clunky and will probably
     # be removed at some point.
@@ -222,21 +412,29 @@ def addPort( self, src, dst, sport=None, dport=None ):
         """Generate port mapping for new edge.
             src: source switch name
             dst: destination switch name"""
-        # Initialize if necessary
-        ports = self.ports
-        ports.setdefault( src, {} )
-        ports.setdefault( dst, {} )
-        # New port: number of outlinks + base
+        # New port: number of ports + base
         if sport is None:
             src_base = 1 if self.isSwitch( src ) else 0
-            sport = len( ports[ src ] ) + src_base
+            sport = len( self.usedPorts.get( src, () ) ) + src_base
         if dport is None:
             dst_base = 1 if self.isSwitch( dst ) else 0
-            dport = len( ports[ dst ] ) + dst_base
-        ports[ src ][ sport ] = ( dst, dport )
-        ports[ dst ][ dport ] = ( src, sport )
+            dport = len( self.usedPorts.get( dst, () ) ) + dst_base
+        self.usedPorts.setdefault( src, set() ).add( sport )
+        self.usedPorts.setdefault( dst, set() ).add( dport )
         return sport, dport
 
+    @property
+    def ports( self ):
+        "Return dict: ports[ src ][ sport ] is ( dst, dport )"
+        ports = {}
+        g = self.g
+        for s, d, port1, port2 in zip( g.srcs, g.dsts, self.port1s,
+                                       self.port2s ):
+            src, dst = g.names[ s ], g.names[ d ]
+            ports.setdefault( src, {} )[ port1 ] = ( dst, port2 )
+            ports.setdefault( dst, {} )[ port2 ] = ( src, port1 )
+        return ports
+
     def port( self, src, dst ):
         """Get port numbers.
             src: source switch name
@@ -246,28 +444,41 @@ def port( self, src, dst ):
                 sport = port on source switch leading to the destination switch
                 dport = port on destination switch leading to the source switch
             Note that you can also look up ports using linkInfo()"""
-        # A bit ugly and slow vs. single-link implementation ;-(
-        ports = [ ( sport, entry[ 1 ] )
-                  for sport, entry in self.ports[ src ].items()
-                  if entry[ 0 ] == dst ]
+        g = self.g
+        # sport -> dport, where later links replace earlier ones
+        dports = {}
+        for i in g.edgeIndices( src, dst ):
+            if g.names[ g.srcs[ i ] ] == src:
+                dports[ self.port1s[ i ] ] = self.port2s[ i ]
+            if g.names[ g.dsts[ i ] ] == src:
+                dports[ self.port2s[ i ] ] = self.port1s[ i ]
+        ports = list( dports.items() )
         return ports if len( ports ) != 1 else ports[ 0 ]
 
-    def _linkEntry( self, src, dst, key=None ):
-        "Helper function: return link entry and key"
-        entry = self.g[ src ][ dst ]
+    def _linkIndex( self, src, dst, key=None ):
+        "Helper function: return index of link (default: lowest key)"
+        indices = self.g.edgeIndices( src, dst )
+        if not indices:
+            raise KeyError( ( src, dst ) )
+        keys = self.g.keys
         if key is None:
-            key = min( entry )
-        return entry, key
+            key = min( keys[ i ] for i in indices )
+        for i in indices:
+            if keys[ i ] == key:
+                return i
+        raise KeyError( key )
 
     def linkInfo( self, src, dst, key=None ):
         "Return link metadata dict"
-        entry, key = self._linkEntry( src, dst, key )
-        return entry[ key ]
+        i = self._linkIndex( src, dst, key )
+        if i not in self.infos:
+            self.infos[ i ] = self._info( i )
+        return self.infos[ i ]
 
     def setlinkInfo( self, src, dst, info, key=None ):
         "Set link metadata dict"
-        entry, key = self._linkEntry( src, dst, key )
-        entry[ key ] = info
+        self.infos[ self._linkIndex( src, dst, key ) ] = info
+        self.linkOrder = {}
 
     def nodeInfo( self, name ):
         "Return metadata (dict) for node"
@@ -281,7 +492,11 @@ def convertTo( self, cls, data=True, keys=True ):
         """Convert to a new object of networkx.MultiGraph-like class cls
            data: include node and edge data (default True)
            keys: include edge keys as well as edge data (default True)"""
-        return self.g.convertTo( cls, data=data, keys=keys )
+        g = cls()
+        g.add_nodes_from( self.g.nodes( data=data ) )
+        g.add_edges_from( self.iterLinks( withKeys=keys,
+                                          withInfo=( data or keys ) ) )
+        return g
 
     @staticmethod
     def sorted( items ):
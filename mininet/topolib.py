@@ -3,6 +3,7 @@
 from mininet.topo import Topo
 from mininet.net import Mininet, Containernet
 from mininet.node import Docker
+from mininet.util import irange
 
 # The build() method is expected to do this:
 # pylint: disable=arguments-differ
@@ -111,4 +112,39 @@ def build( self, x, y, n=1 ):
                 self.addLink( sw1, sw2 )
                 self.addLink( sw1, sw3 )
 
+
+class FatTreeTopo( Topo ):
+    """k-ary fat tree: k pods of k/2 edge and k/2 aggregation switches,
+       (k/2)^2 core switches, and k/2 hosts per edge switch (k^3/4
+       hosts in all)
+       WARNING: like TorusTopo, this topology has LOOPS and needs
+       switches with STP turned on, e.g.:
+       # mn --topo fattree,4 --switch lxbr,stp=1 --test pingall"""
+
+    def build( self, k=4 ):
+        "k: number of pods (even)"
+        if k < 2 or k % 2:
+            raise Exception( 'Please use an even number of pods' )
+        half = k // 2
+        # dpid cannot be zero for OVS, and switch names with the same
+        # digits (e.g. sa1x11 and sa11x1) must not share a dpid
+        cores = [ self.addSwitch( 'sc%d' % i, dpid='%x' % ( 0x10000 + i ) )
+                  for i in irange( 1, half * half ) ]
+        for pod in irange( 1, k ):
+            aggs = [ self.addSwitch( 'sa%dx%d' % ( pod, i ),
+                                     dpid='%x' % ( 0x20000 + pod * 256 + i ) )
+                     for i in irange( 1, half ) ]
+            # Aggregation switch i connects to the i-th group of cores
+            for i, agg in enumerate( aggs ):
+                for core in cores[ i * half: ( i + 1 ) * half ]:
+                    self.addLink( agg, core )
+            for i in irange( 1, half ):
+                edge = self.addSwitch( 'se%dx%d' % ( pod, i ),
+                                       dpid='%x' % ( 0x30000 + pod * 256 + i ) )
+                for agg in aggs:
+                    self.addLink( edge, agg )
+                for j in irange( 1, half ):
+                    host = self.addHost( 'h%dx%dx%d' % ( pod, i, j ) )
+                    self.addLink( host, edge )
+
 # pylint: enable=arguments-differ
@@ -295,6 +295,125 @@ def retry( retries, delaySecs, fn, *args, **keywords ):
         error( "*** gave up after %i retries\n" % tries )
         exit( 1 )
 
+def startBatch( cmd, lines, mncmd=None, node=None ):
+    """Start a process that reads commands from its stdin, and feed
+       it the commands.
+       cmd: command to run, e.g. [ 'ip', '-batch', '-' ]
+       lines: list of commands for it
+       mncmd: (optional) command to run cmd with, e.g. mnexec -a pid
+       node: (optional) node to run cmd in, with node.popen()
+       returns: Popen object, see finishIpBatch(), or None if
+                node could not run cmd"""
+    debug( '*** batch: %s %s (%d commands)\n' %
+           ( node or mncmd or '', cmd, len( lines ) ) )
+    if node is not None:
+        # Nodes such as Docker hosts run commands their own way
+        popen = node.popen( cmd, stdin=PIPE, stdout=PIPE, stderr=STDOUT )
+        if popen is None:
+            return None
+    else:
+        popen = Popen( ( mncmd or [] ) + cmd, stdin=PIPE, stdout=PIPE,
+                       stderr=STDOUT )
+    try:
+        popen.stdin.write( encode( '\n'.join( lines ) + '\n' ) )
+        popen.stdin.close()
+    except BrokenPipeError:
+        # cmd exited early; finishIpBatch() returns its error
+        pass
+    return popen
+
+def startIpBatch( lines, mncmd=None, node=None, force=False ):
+    """Start a single ip -batch process for many ip commands, and
+       feed it the commands. ip -batch stops at the first error, so
+       its output is short, and many of these can run at once before
+       any output is read.
+       lines: list of ip commands, without the leading 'ip'
+       mncmd: (optional) command to run ip with, e.g. mnexec -a pid
+       node: (optional) node to run ip in, with node.popen()
+       force: go on after errors (ip -force), see batchErrors()
+       returns: Popen object, see finishIpBatch(), or None"""
+    cmd = [ 'ip', '-force', '-batch', '-' ] if force else [
+        'ip', '-batch', '-' ]
+    return startBatch( cmd, lines, mncmd, node )
+
+def finishIpBatch( popen ):
+    """Wait for a batch started by startIpBatch() or startBatch()
+       returns: output, return code"""
+    out = popen.stdout.read()
+    popen.stdout.close()
+    return decode( out ), popen.wait()
+
+def batchErrors( output ):
+    """Return dict of line number -> error output of ip -force -batch
+       or tc -force -batch, which report each failed line after its
+       error messages"""
+    errors, lines = {}, []
+    for line in output.splitlines():
+        m = re.match( r'Command failed -:(\d+)', line )
+        if m:
+            errors[ int( m.group( 1 ) ) ] = '\n'.join( lines )
+            lines = []
+        else:
+            lines.append( line )
+    return errors
+
+def ipBatch( lines, mncmd=None ):
+    """Run many ip commands with a single ip -batch process.
+       lines: list of ip commands, without the leading 'ip'
+       mncmd: (optional) command to run ip with, e.g. mnexec -a pid
+       returns: output, return code"""
+    return finishIpBatch( startIpBatch( lines, mncmd ) )
+
+def deleteIntfs( names, group=0x6d6e ):
+    """Delete many interfaces in the root namespace with a single
+       ip -force -batch, which moves them into a device group and
+       deletes the group, instead of synchronizing once per interface.
+       Interfaces that are already gone are ignored.
+       names: interface names
+       group: device group to move them into
+       returns: output of other errors, return code"""
+    lines = [ 'link set dev %s group %d' % ( name, group )
+              for name in names ] + [ 'link del group %d' % group ]
+    output, returncode = finishIpBatch( startIpBatch( lines, force=True ) )
+    errors = batchErrors( output )
+    if returncode and not errors:
+        # The batch did not run at all
+        return output, returncode
+    # If all interfaces are gone, the group is empty, and deleting it
+    # fails with "No such device"
+    failed = [ '%s: %s\n' % ( lines[ n - 1 ], out )
+               for n, out in sorted( errors.items() )
+               if not ( 'Cannot find device' in out or
+                        n == len( lines ) and 'No such device' in out ) ]
+    return ''.join( failed ), 1 if failed else 0
+
+def _vethArgs( intf, addr, node ):
+    "Return the ip link arguments for one end of a veth pair"
+    args = 'name %s' % intf
+    if addr:
+        args += ' address %s' % addr
+    if node:
+        args += ' netns %s' % node.pid
+    return args
+
+def makeIntfPairs( pairs ):
+    """Make many veth pairs with a single ip -batch. Unlike
+       makeIntfPair, each interface is created directly in the
+       namespace of its node, so nothing needs to be moved.
+       pairs: list of ( intf1, intf2, addr1, addr2, node1, node2 );
+           addresses and nodes may be None
+       raises Exception on failure"""
+    lines = [ 'link add %s type veth peer %s' % (
+                  _vethArgs( intf1, addr1, node1 ),
+                  _vethArgs( intf2, addr2, node2 ) )
+              for intf1, intf2, addr1, addr2, node1, node2 in pairs ]
+    if not lines:
+        return
+    cmdOutput, returncode = ipBatch( lines )
+    if returncode:
+        raise Exception( "Error creating %d interface pairs: %s" %
+                         ( len( lines ), cmdOutput ) )
+
 def moveIntfNoRetry( intf, dstNode, printError=False ):
     """Move interface to node, without retrying.
        intf: string, interface
@@ -20,7 +20,7 @@
     description='Mininet fork that adds Container support.',
     author='Manuel Peuster',
     author_email='manuel.peuster@upb.de',
-    packages=[ 'mininet', 'mininet.examples' ],
+    packages=[ 'mininet', 'mininet.examples', 'mininet.test.bench' ],
     long_description="""
         Mininet is a network emulator which uses lightweight
         virtualization to create virtual networks for rapid